@@ -0,0 +1,281 @@
+import argparse
+import contextlib
+import csv
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import checkmygrade
+
+STUDENT_FIELDS = ["student_id", "first_name", "last_name", "email", "course_id", "grade", "marks"]
+LOGIN_FIELDS = ["email", "password", "role"]
+
+OPS_PER_RUN = 100          # lookups / mutations timed together in one run of the per-operation cases
+LOGINS_PER_RUN = 2         # logins timed together; each costs one password hash
+REGRESSION_THRESHOLD = 0.10
+
+# =================== Data ===================
+
+def write_students(path, count):
+    """Write count synthetic student rows to path"""
+    with open(path, mode='w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(STUDENT_FIELDS)
+        for i in range(count):
+            writer.writerow([i, f"Student{i}", f"Test{i}", f"student{i}@yahoo.com",
+                             f"DATA{200 + i % 50}", "ABCDF"[i % 5], i % 101])
+
+def write_logins(path, count):
+    """Write count synthetic login rows to path"""
+    password = checkmygrade.encrypt_password("password")
+    with open(path, mode='w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(LOGIN_FIELDS)
+        for i in range(count):
+            writer.writerow([f"student{i}@yahoo.com", password, "student"])
+
+# =================== Parse Benchmark ===================
+
+def bench_parse(rows, workers_list, directory):
+    """Time _parse_csv on a rows-sized file for each worker count"""
+    path = os.path.join(directory, f"students-{rows}.csv")
+    if not os.path.exists(path):
+        write_students(path, rows)
+    size = os.path.getsize(path) / (1024 * 1024)
+    print(f"{rows:,} rows ({size:.0f} MB)")
+    serial = None
+    for workers in workers_list:
+        start = time.perf_counter()
+        parsed, _ = checkmygrade._parse_csv(path, workers=workers)
+        elapsed = time.perf_counter() - start
+        serial = serial or elapsed
+        print(f"  workers={workers:<3} {elapsed:8.2f}s  {len(parsed) / elapsed:12,.0f} rows/s  x{serial / elapsed:.2f}")
+        del parsed
+
+# =================== Operation Benchmarks ===================
+
+def _case_load(rows):
+    def run():
+        checkmygrade.table_cache.invalidate()
+        checkmygrade.load_csv('students.csv')
+    return run
+
+def _case_write(rows):
+    data = checkmygrade.load_csv('students.csv')
+    return lambda: checkmygrade.write_csv('students-copy.csv', data, STUDENT_FIELDS)
+
+def _case_search(rows):
+    emails = [f"student{random.randrange(rows)}@yahoo.com" for _ in range(OPS_PER_RUN)]
+    def run():
+        for email in emails:
+            checkmygrade.Student.search(email)
+    return run
+
+def _case_sort(rows):
+    def run():
+        # Drop the memoized order so every run pays for the sort itself
+        checkmygrade.table_cache.get('students.csv').derived.clear()
+        checkmygrade.Student.sorted_records(by="marks")
+    return run
+
+def _case_median(rows):
+    courses = [checkmygrade.Course(f"DATA{200 + i % 50}", "", "", "") for i in range(OPS_PER_RUN)]
+    def run():
+        for course in courses:
+            course.get_median_score()
+    return run
+
+def _case_add(rows):
+    counter = iter(range(rows, sys.maxsize, OPS_PER_RUN))
+    def run():
+        first = next(counter)
+        for i in range(first, first + OPS_PER_RUN):
+            checkmygrade.Student(str(i), f"Student{i}", f"Test{i}", f"student{i}@yahoo.com", "DATA200", "A", "90").add_new_student()
+    return run
+
+def _case_update(rows):
+    ids = [str(random.randrange(rows)) for _ in range(OPS_PER_RUN)]
+    def run():
+        for student_id in ids:
+            checkmygrade.Student(student_id, "", "", "", "", "", "").update_student_record(new_marks=str(random.randrange(101)))
+    return run
+
+def _case_delete(rows):
+    # Deletes the rows the add case appended, one batch per run, so the table returns to its original size
+    counter = iter(range(rows, sys.maxsize, OPS_PER_RUN))
+    def run():
+        first = next(counter)
+        for i in range(first, first + OPS_PER_RUN):
+            checkmygrade.Student(str(i), "", "", f"student{i}@yahoo.com", "", "", "").delete_new_student()
+    return run
+
+def _case_login(rows):
+    # Dominated by the password hash, so only a few per run; its cost is CHECKMYGRADE_PASSWORD_COST
+    users = [checkmygrade.LoginUser(f"student{random.randrange(rows)}@yahoo.com", "password", "student") for _ in range(LOGINS_PER_RUN)]
+    def run():
+        for user in users:
+            user.login()
+    return run
+
+def _case_session(rows):
+    # Authenticated actions after login: a session token check instead of a password hash
+    tokens = [checkmygrade.sessions.open(f"student{random.randrange(rows)}@yahoo.com", "student") for _ in range(OPS_PER_RUN)]
+    def run():
+        for token in tokens:
+            checkmygrade.sessions.check(token)
+    return run
+
+# name -> (setup returning the timed callable, operations per call)
+CASES = {
+    'load_csv': (_case_load, 1),
+    'write_csv': (_case_write, 1),
+    'search': (_case_search, OPS_PER_RUN),
+    'sort': (_case_sort, 1),
+    'median': (_case_median, OPS_PER_RUN),
+    'add': (_case_add, OPS_PER_RUN),
+    'update': (_case_update, OPS_PER_RUN),
+    'delete': (_case_delete, OPS_PER_RUN),
+    'login': (_case_login, LOGINS_PER_RUN),
+    'session': (_case_session, OPS_PER_RUN),
+}
+
+def measure(run, warmup, repeat, memory):
+    """Time repeat calls of run after warmup untimed calls; return (seconds per call, peak traced bytes)"""
+    for _ in range(warmup):
+        run()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    peak = None
+    if memory:
+        # A separate traced call: tracemalloc slows allocation down too much to share with the timed runs
+        tracemalloc.start()
+        try:
+            run()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return times, peak
+
+def bench_operations(sizes, names, warmup, repeat, memory, directory):
+    """Run every named case against generated tables of each size, returning one result dict per case"""
+    results = []
+    random.seed(0)
+    with open(os.devnull, 'w') as devnull:
+        for rows in sizes:
+            work = os.path.join(directory, f"ops-{rows}")
+            os.makedirs(work, exist_ok=True)
+            write_students(os.path.join(work, 'students.csv'), rows)
+            write_logins(os.path.join(work, 'login.csv'), rows)
+            if checkmygrade.storage.name == 'sqlite':
+                checkmygrade.migrate_to_sqlite(work)
+            cwd = os.getcwd()
+            os.chdir(work)
+            try:
+                checkmygrade.table_cache.invalidate()
+                for name in names:
+                    setup, ops = CASES[name]
+                    run = setup(rows)
+                    # Menu methods print their outcome; send it nowhere so the terminal is not what gets timed
+                    with contextlib.redirect_stdout(devnull):
+                        times, peak = measure(run, warmup, repeat, memory)
+                    result = {'name': name, 'rows': rows, 'ops': ops, 'runs': len(times),
+                              'min': min(times), 'median': statistics.median(times), 'mean': statistics.fmean(times),
+                              'stdev': statistics.stdev(times) if len(times) > 1 else 0.0, 'peak_bytes': peak}
+                    results.append(result)
+                    print_result(result)
+            finally:
+                checkmygrade.table_cache.invalidate()
+                checkmygrade.storage.close()
+                os.chdir(cwd)
+    return results
+
+def print_result(result):
+    peak = f"{result['peak_bytes'] / (1024 * 1024):9.1f} MB" if result['peak_bytes'] is not None else ""
+    print(f"  {result['name']:<10} rows={result['rows']:<9,} median={result['median'] * 1000:10.3f}ms  "
+          f"per-op={result['median'] / result['ops'] * 1e6:10.1f}us  stdev={result['stdev'] * 1000:8.3f}ms{peak}")
+
+def environment():
+    return {'python': platform.python_version(), 'implementation': platform.python_implementation(),
+            'platform': platform.platform(), 'cpus': os.cpu_count(),
+            'backend': checkmygrade.storage.name,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """Return (name, rows, baseline median, current median, ratio) for every case slower than baseline by more than threshold"""
+    previous = {(r['name'], r['rows']): r for r in baseline['results']}
+    regressions = []
+    for result in results:
+        old = previous.get((result['name'], result['rows']))
+        if old is None or old['median'] <= 0:
+            continue
+        ratio = result['median'] / old['median']
+        if ratio > 1 + threshold:
+            regressions.append((result['name'], result['rows'], old['median'], result['median'], ratio))
+    return regressions
+
+def run_operations(args):
+    if args.dir:
+        results = bench_operations(args.rows, args.cases, args.warmup, args.repeat, not args.no_memory, args.dir)
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            results = bench_operations(args.rows, args.cases, args.warmup, args.repeat, not args.no_memory, directory)
+    report = {'environment': environment(), 'warmup': args.warmup, 'repeat': args.repeat, 'results': results}
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+        print(f"Results written to {args.output}")
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(results, json.load(file), args.threshold)
+        for name, rows, old, new, ratio in regressions:
+            print(f"REGRESSION {name} rows={rows:,}: {old * 1000:.3f}ms -> {new * 1000:.3f}ms (x{ratio:.2f})")
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.threshold:.0%} against {args.compare}")
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="CheckMyGrade benchmarks")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    ops = subparsers.add_parser('ops', help="time table operations at several table sizes")
+    ops.add_argument('--rows', type=int, nargs='+', default=[1_000, 100_000, 1_000_000])
+    ops.add_argument('--cases', nargs='+', choices=list(CASES), default=list(CASES))
+    ops.add_argument('--warmup', type=int, default=1)
+    ops.add_argument('--repeat', type=int, default=5)
+    ops.add_argument('--no-memory', action='store_true', help="skip the tracemalloc peak memory run")
+    ops.add_argument('--output', help="write results as JSON to this file")
+    ops.add_argument('--compare', help="baseline JSON to check for regressions (exit status 1 if any)")
+    ops.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD, help="allowed slowdown ratio (default 0.10)")
+    ops.add_argument('--dir', default=None, help="directory for generated files (default: a temp dir)")
+
+    parse = subparsers.add_parser('parse', help="time CSV parsing with different worker counts")
+    parse.add_argument('--rows', type=int, nargs='+', default=[1_000_000, 10_000_000])
+    parse.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, os.cpu_count() or 1])
+    parse.add_argument('--dir', default=None, help="directory for generated files (default: a temp dir)")
+    args = parser.parse_args(argv)
+
+    if args.command == 'ops':
+        return run_operations(args)
+
+    checkmygrade.PARALLEL_PARSE_MIN_BYTES = 0
+    workers_list = sorted(set(args.workers))
+    if args.dir:
+        for rows in args.rows:
+            bench_parse(rows, workers_list, args.dir)
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            for rows in args.rows:
+                bench_parse(rows, workers_list, directory)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
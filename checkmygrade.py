@@ -1,34 +1,2889 @@
+import argparse
+import asyncio
+import atexit
+import bisect
 import csv
+import functools
 import hashlib
+import heapq
+import hmac
+import io
+import itertools
+import json
+import keyword
+import math
+import mmap
+import operator
+import os
+import random
+import re
+import secrets
+import shutil
+import signal
+import sqlite3
+import struct
+import sys
+import tempfile
 import time
-import statistics
+import unicodedata
+import urllib.parse
+import zlib
+from array import array
+from collections import Counter, OrderedDict
+from contextlib import ExitStack, contextmanager
 
-def encrypt_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
+# =================== Instrumentation ===================
 
+METRICS_FILE = os.environ.get('CHECKMYGRADE_METRICS_FILE')   # setting it turns metrics on and dumps them there on exit
+METRICS_DEFAULT_FILE = 'checkmygrade-metrics.json'
+PROFILE_FILE = 'checkmygrade.prof'
+PROFILE_TOP = 25
+COUNTERS = ['rows_parsed', 'bytes_read', 'log_records_read', 'rows_written', 'bytes_written', 'log_records_written']
+
+class Metrics:
+    """Call counts, wall-time histograms and I/O counters for instrumented functions
+
+    While neither metrics nor a profile capture is on, an instrumented call
+    costs one attribute check. Times are inclusive: load_csv also counts the
+    _parse_csv it triggers. Histogram bucket b holds calls that took under
+    2**b microseconds.
+    """
+
+    def __init__(self, enabled=False, output=None):
+        self.enabled = enabled
+        self.output = output
+        self.profile_output = None   # set to capture the next top-level instrumented call with cProfile
+        self.active = enabled
+        self.depth = 0
+        self.reset()
+
+    def reset(self):
+        self.calls = {}   # name -> [count, total seconds, max seconds, {bucket: count}]
+        self.counters = dict.fromkeys(COUNTERS, 0)
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+        self.active = enabled or self.profile_output is not None
+
+    def profile_next(self, output=PROFILE_FILE):
+        """Run the next top-level instrumented operation under cProfile and save its stats to output"""
+        self.profile_output = output
+        self.active = True
+
+    def add(self, counter, amount):
+        self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def record(self, name, elapsed):
+        entry = self.calls.get(name)
+        if entry is None:
+            entry = self.calls[name] = [0, 0.0, 0.0, {}]
+        entry[0] += 1
+        entry[1] += elapsed
+        entry[2] = max(entry[2], elapsed)
+        bucket = int(elapsed * 1e6).bit_length()
+        entry[3][bucket] = entry[3].get(bucket, 0) + 1
+
+    def call(self, name, func, args, kwargs):
+        if self.profile_output is not None and self.depth == 0:
+            output, self.profile_output = self.profile_output, None
+            self.active = self.enabled
+            return profile_call(output, self.call, name, func, args, kwargs)
+        if not self.enabled:
+            return func(*args, **kwargs)
+        self.depth += 1
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.record(name, time.perf_counter() - start)
+            self.depth -= 1
+
+    def snapshot(self):
+        """Return every metric, plus lock and cache statistics, as a JSON-ready dict"""
+        operations = {}
+        for name, (count, total, longest, buckets) in sorted(self.calls.items()):
+            operations[name] = {'calls': count, 'total_s': round(total, 6), 'mean_ms': round(total / count * 1000, 4),
+                                'max_ms': round(longest * 1000, 4),
+                                'histogram_us': {f"<{2 ** b}": buckets[b] for b in sorted(buckets)}}
+        return {'enabled': self.enabled, 'operations': operations, 'counters': dict(self.counters),
+                'locks': dict(lock_stats), 'cache': table_cache.stats()}
+
+    def dump(self, path):
+        with open(path, mode='w') as file:
+            json.dump(self.snapshot(), file, indent=2)
+
+    def report(self):
+        """Return the Diagnostics screen as lines of text"""
+        snapshot = self.snapshot()
+        lines = [f"Metrics are {'on' if self.enabled else 'off'}."]
+        if snapshot['operations']:
+            lines.append(f"{'Operation':<40} {'Calls':>8} {'Total s':>10} {'Mean ms':>10} {'Max ms':>10}")
+            ordered = sorted(snapshot['operations'].items(), key=lambda item: -item[1]['total_s'])
+            for name, op in ordered:
+                lines.append(f"{name:<40} {op['calls']:>8} {op['total_s']:>10.4f} {op['mean_ms']:>10.3f} {op['max_ms']:>10.3f}")
+        lines.append("Counters: " + ", ".join(f"{k}={v:,}" for k, v in snapshot['counters'].items()))
+        lines.append("Locks: " + ", ".join(f"{k}={v:,}" for k, v in snapshot['locks'].items()))
+        lines.append("Cache: " + ", ".join(f"{k}={v:,}" for k, v in snapshot['cache'].items()))
+        return lines
+
+metrics = Metrics(enabled=METRICS_FILE is not None or os.environ.get('CHECKMYGRADE_METRICS') == '1',
+                  output=METRICS_FILE or METRICS_DEFAULT_FILE)
+
+def instrumented(func):
+    """Count and time calls of func in metrics under its qualified name"""
+    name = func.__qualname__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not metrics.active:
+            return func(*args, **kwargs)
+        return metrics.call(name, func, args, kwargs)
+    return wrapper
+
+def instrument_class(cls):
+    """Instrument every public method, class method and static method of cls"""
+    for name, value in list(vars(cls).items()):
+        if name.startswith('_'):
+            continue
+        if isinstance(value, (classmethod, staticmethod)):
+            setattr(cls, name, type(value)(instrumented(value.__func__)))
+        elif callable(value):
+            setattr(cls, name, instrumented(value))
+    return cls
+
+def profile_call(output, func, *args, **kwargs):
+    """Run func under cProfile, save the stats to output and print the top functions by cumulative time"""
+    import cProfile
+    import pstats
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, *args, **kwargs)
+    finally:
+        profiler.dump_stats(output)
+        stream = io.StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(PROFILE_TOP)
+        print(stream.getvalue(), file=sys.stderr)
+        print(f"Profile saved to {output} (open it with: python -m pstats {output})", file=sys.stderr)
+
+@atexit.register
+def _dump_metrics():
+    if metrics.enabled and metrics.output and metrics.calls:
+        metrics.dump(metrics.output)
+
+# =================== Passwords ===================
+# Stored as 'scheme$cost$salt$hash' (hex salt and hash). Rows holding a legacy unsalted SHA-256 digest,
+# or a cheaper scheme/cost than the current one, are re-hashed the next time their user logs in.
+
+PASSWORD_SCHEME = os.environ.get('CHECKMYGRADE_PASSWORD_SCHEME', 'pbkdf2_sha256')   # or 'scrypt'
+PASSWORD_COST = int(os.environ.get('CHECKMYGRADE_PASSWORD_COST', '0'))   # 0 = the scheme's default below
+DEFAULT_PASSWORD_COSTS = {'pbkdf2_sha256': 600_000, 'scrypt': 2 ** 14}   # PBKDF2 iterations; scrypt N (r=8, p=1)
+MIN_PASSWORD_COSTS = {'pbkdf2_sha256': 100_000, 'scrypt': 2 ** 12}
+PASSWORD_SALT_BYTES = 16
+PASSWORD_TARGET_SECONDS = 0.25   # calibrate_password_cost aims for one hash taking this long
+
+def password_cost(scheme=None):
+    scheme = scheme or PASSWORD_SCHEME
+    return PASSWORD_COST or DEFAULT_PASSWORD_COSTS[scheme]
+
+def _derive(scheme, cost, password, salt):
+    if scheme == 'pbkdf2_sha256':
+        return hashlib.pbkdf2_hmac('sha256', password.encode(), salt, cost)
+    if scheme == 'scrypt':
+        return hashlib.scrypt(password.encode(), salt=salt, n=cost, r=8, p=1, maxmem=256 * cost * 8 + 2 ** 20, dklen=32)
+    raise ValueError(f"Unknown password scheme {scheme!r}")
+
+@instrumented
+def encrypt_password(password, cost=None, salt=None):
+    """Salted hash of password with the current scheme, at cost (default: the configured cost)"""
+    salt = os.urandom(PASSWORD_SALT_BYTES) if salt is None else salt
+    cost = cost or password_cost()
+    return f"{PASSWORD_SCHEME}${cost}${salt.hex()}${_derive(PASSWORD_SCHEME, cost, password, salt).hex()}"
+
+@instrumented
 def decrypt_password(encrypted, original):
-    return encrypt_password(original) == encrypted
+    """True if original is the password behind encrypted, a salted hash or a legacy SHA-256 digest"""
+    parts = encrypted.split('$')
+    if len(parts) != 4:
+        return hmac.compare_digest(hashlib.sha256(original.encode()).hexdigest(), encrypted)
+    scheme, cost, salt, digest = parts
+    try:
+        derived = _derive(scheme, int(cost), original, bytes.fromhex(salt))
+    except ValueError:
+        return False
+    return hmac.compare_digest(derived.hex(), digest)
+
+def needs_rehash(encrypted):
+    """True for legacy digests and hashes made with another scheme or a lower cost than the current one"""
+    parts = encrypted.split('$')
+    return len(parts) != 4 or parts[0] != PASSWORD_SCHEME or not parts[1].isdigit() or int(parts[1]) < password_cost()
+
+def calibrate_password_cost(target=PASSWORD_TARGET_SECONDS, scheme=None):
+    """The highest cost (never below the scheme's minimum) at which one hash takes about target seconds here"""
+    scheme = scheme or PASSWORD_SCHEME
+    salt = os.urandom(PASSWORD_SALT_BYTES)
+    if scheme == 'scrypt':
+        # scrypt's N must be a power of two; time grows linearly with it
+        cost = MIN_PASSWORD_COSTS[scheme]
+        while True:
+            start = time.perf_counter()
+            _derive(scheme, cost * 2, 'calibrate', salt)
+            if time.perf_counter() - start > target:
+                return cost
+            cost *= 2
+    probe = 50_000
+    start = time.perf_counter()
+    _derive(scheme, probe, 'calibrate', salt)
+    per_iteration = (time.perf_counter() - start) / probe
+    return max(MIN_PASSWORD_COSTS[scheme], int(target / per_iteration) // 10_000 * 10_000)
+
+# =================== Compact Rows ===================
+
+COMPACT_ROWS = os.environ.get('CHECKMYGRADE_COMPACT_ROWS', '1') != '0'
+# Low-cardinality columns whose values are interned, so 1M rows share a few hundred strings
+INTERNED_COLUMNS = {'course_id', 'grade', 'marks', 'credits', 'rank', 'role'}
+
+_row_factories = {}
+
+def row_factory(fieldnames):
+    """Return a function building a row dict from column values, or None to fall back to dict(zip(...))
+
+    The rows are the __dict__ of instances of one class per header, so CPython
+    stores them as key-sharing dicts: every row of a table shares a single
+    keys table and only holds its values, about half the memory of a plain
+    dict. They are ordinary dicts to every caller.
+    """
+    key = tuple(fieldnames)
+    if key in _row_factories:
+        return _row_factories[key]
+    factory = None
+    if COMPACT_ROWS and key and len(set(key)) == len(key) and all(
+            isinstance(f, str) and f.isidentifier() and not keyword.iskeyword(f) for f in key):
+        holder = type('Row', (), {'__module__': __name__})
+        # Generated like namedtuple's __new__: one attribute store per column, no loop
+        code = (f"def make(__values):\n    row = __holder()\n    {', '.join('row.' + f for f in key)}, = __values\n"
+                f"    return row.__dict__\n")
+        namespace = {'__holder': holder}
+        exec(code, namespace)
+        factory = namespace['make']
+    _row_factories[key] = factory
+    return factory
+
+def make_rows(fieldnames, value_lists):
+    """Build rows from lists of column values (short ones padded to the header), interning repeated values
+
+    A row with more values than the header has columns raises ValueError rather than losing the extra values.
+    """
+    make = row_factory(fieldnames)
+    width = len(fieldnames)
+    interned = [i for i, f in enumerate(fieldnames) if f in INTERNED_COLUMNS]
+    intern = sys.intern
+    rows = []
+    for values in value_lists:
+        if len(values) != width:
+            if len(values) > width:
+                raise ValueError(f"row {len(rows) + 1} has {len(values)} values but the header has {width} columns: {values}")
+            values = values + [None] * (width - len(values))
+        for i in interned:
+            if values[i] is not None:
+                values[i] = intern(values[i])
+        rows.append(make(values) if make else dict(zip(fieldnames, values)))
+    return rows
+
+def _parse_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def _format_number(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+class TypedRecord:
+    """Slotted view of a table row with numeric columns converted once; built with from_row"""
+    __slots__ = ()
+    converters = {}
+
+    @classmethod
+    def from_row(cls, row):
+        record = cls.__new__(cls)
+        for field in cls.__slots__:
+            value = row.get(field)
+            convert = cls.converters.get(field)
+            object.__setattr__(record, field, convert(value) if convert is not None else value)
+        return record
+
+    def as_row(self):
+        """Return the record as a row dict of strings; whole-number marks are written without '.0'"""
+        return {f: _format_number(getattr(self, f)) if f in self.converters else getattr(self, f) for f in self.__slots__}
+
+    def __eq__(self, other):
+        return type(other) is type(self) and all(getattr(self, f) == getattr(other, f) for f in self.__slots__)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(f'{f}={getattr(self, f)!r}' for f in self.__slots__)})"
+
+class StudentRecord(TypedRecord):
+    __slots__ = ('student_id', 'first_name', 'last_name', 'email', 'course_id', 'grade', 'marks')
+    converters = {'marks': lambda value: parse_marks(value)}
+
+class CourseRecord(TypedRecord):
+    __slots__ = ('course_id', 'course_name', 'credits', 'description')
+    converters = {'credits': _parse_int}
+
+class ProfessorRecord(TypedRecord):
+    __slots__ = ('professor_id', 'name', 'email', 'rank', 'course_id')
+
+class GradeRecord(TypedRecord):
+    __slots__ = ('grade_id', 'grade', 'marks_range')
+
+    @property
+    def bounds(self):
+        """(low, high) marks of the range, or None if it does not parse"""
+        return parse_marks_range(self.marks_range)
+
+def typed_records(table, record_class):
+    """Return a table's rows as typed records, converted once per version of the table"""
+    records = table.derived.get(record_class)
+    if records is None:
+        records = table.derived[record_class] = [record_class.from_row(row) for row in table.rows]
+    return records
+
+# =================== Table Cache ===================
+
+DATA_FILES = ['students.csv', 'courses.csv', 'professors.csv', 'grades.csv', 'login.csv']
+TABLE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+LOG_COMPACT_BYTES = 4 * 1024 * 1024
+
+def _file_stamp(path):
+    """Return (inode, size, mtime) for a file, or None if it does not exist"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+def _log_path(path):
+    """Return the delta log that holds updates/deletes not yet compacted into path"""
+    return path + '.log'
+
+def _table_stamp(path):
+    return (_file_stamp(path), _file_stamp(_log_path(path)), _table_version(path))
+
+def _estimate_bytes(rows):
+    """Estimate the in-memory size of parsed rows from a small sample"""
+    if not rows:
+        return sys.getsizeof(rows)
+    sample = rows[:100]
+    per_row = sum(sys.getsizeof(r) + sum(sys.getsizeof(v) for v in r.values()) for r in sample) / len(sample)
+    return sys.getsizeof(rows) + int(per_row * len(rows))
+
+class HashIndex:
+    """Hash index from a column value to the row(s) holding it"""
+
+    def __init__(self, column, unique=True):
+        self.column = column
+        self.columns = (column,)
+        self.unique = unique
+        self._map = {}
+        # Unique indexes keep rows that share a key here, in insertion order
+        self._extra = {}
+
+    def build(self, rows):
+        for row in rows:
+            self.add(row)
+        return self
+
+    def add(self, row):
+        key = row.get(self.column)
+        if not self.unique:
+            self._map.setdefault(key, {})[id(row)] = row
+        elif key in self._map:
+            self._extra.setdefault(key, [self._map[key]]).append(row)
+        else:
+            self._map[key] = row
+
+    def remove(self, row):
+        key = row.get(self.column)
+        if not self.unique:
+            bucket = self._map.get(key)
+            if bucket is not None:
+                bucket.pop(id(row), None)
+                if not bucket:
+                    del self._map[key]
+            return
+
+        extra = self._extra.get(key)
+        if extra is not None:
+            extra = [r for r in extra if r is not row]
+            self._map[key] = extra[0]
+            if len(extra) > 1:
+                self._extra[key] = extra
+            else:
+                del self._extra[key]
+        elif self._map.get(key) is row:
+            del self._map[key]
+
+    def get(self, key):
+        """Return the first row with this key, or None"""
+        if not self.unique:
+            bucket = self._map.get(key)
+            return next(iter(bucket.values())) if bucket else None
+        return self._map.get(key)
+
+    def get_all(self, key):
+        """Return every row with this key"""
+        if not self.unique:
+            return list(self._map.get(key, {}).values())
+        if key in self._extra:
+            return list(self._extra[key])
+        return [self._map[key]] if key in self._map else []
+
+    def __len__(self):
+        return len(self._map)
+
+class RankIndex:
+    """Sorted marks per group (e.g. course) for O(log n) median, percentile and rank queries"""
+
+    def __init__(self, group_column, value_column):
+        self.group_column = group_column
+        self.value_column = value_column
+        self.columns = (group_column, value_column)
+        self._groups = {}
+
+    def build(self, rows):
+        grouped = {}
+        for row in rows:
+            value = parse_marks(row.get(self.value_column))
+            if value is not None:
+                grouped.setdefault(row.get(self.group_column), []).append(value)
+        self._groups = {group: array('d', sorted(values)) for group, values in grouped.items()}
+        return self
+
+    def add(self, row):
+        value = parse_marks(row.get(self.value_column))
+        if value is not None:
+            group = row.get(self.group_column)
+            values = self._groups.get(group)
+            if values is None:
+                values = self._groups[group] = array('d')
+            bisect.insort(values, value)
+
+    def remove(self, row):
+        value = parse_marks(row.get(self.value_column))
+        values = self._groups.get(row.get(self.group_column))
+        if value is None or values is None:
+            return
+        position = bisect.bisect_left(values, value)
+        if position < len(values) and values[position] == value:
+            del values[position]
+            if not values:
+                del self._groups[row.get(self.group_column)]
+
+    def count(self, group):
+        return len(self._groups.get(group, ()))
+
+    def percentile(self, group, p):
+        """Return the p-th percentile (0-100) of a group, interpolating between ranks"""
+        values = self._groups.get(group)
+        if not values:
+            return None
+        position = (len(values) - 1) * min(max(p, 0), 100) / 100
+        low = int(position)
+        high = min(low + 1, len(values) - 1)
+        return values[low] + (values[high] - values[low]) * (position - low)
+
+    def median(self, group):
+        return self.percentile(group, 50)
+
+    def rank(self, group, value):
+        """Return (rank, class size, percentile) of value, rank 1 being the highest marks"""
+        values = self._groups.get(group)
+        value = parse_marks(value)
+        if not values or value is None:
+            return None
+        n = len(values)
+        return n - bisect.bisect_right(values, value) + 1, n, 100 * bisect.bisect_right(values, value) / n
+
+class RangeIndex:
+    """Rows ordered by a numeric column, for fetching every row with a value in [low, high]"""
+
+    def __init__(self, column):
+        self.column = column
+        self.columns = (column,)
+        self._keys = array('d')
+        self._rows = []
+
+    def build(self, rows):
+        pairs = [(value, row) for value, row in ((parse_marks(row.get(self.column)), row) for row in rows) if value is not None]
+        pairs.sort(key=lambda pair: pair[0])
+        self._keys = array('d', (value for value, _ in pairs))
+        self._rows = [row for _, row in pairs]
+        return self
+
+    def add(self, row):
+        value = parse_marks(row.get(self.column))
+        if value is not None:
+            position = bisect.bisect_right(self._keys, value)
+            self._keys.insert(position, value)
+            self._rows.insert(position, row)
+
+    def remove(self, row):
+        value = parse_marks(row.get(self.column))
+        if value is None:
+            return
+        for position in range(bisect.bisect_left(self._keys, value), bisect.bisect_right(self._keys, value)):
+            if self._rows[position] is row:
+                del self._keys[position]
+                del self._rows[position]
+                return
+
+    def between(self, low, high):
+        return self._rows[bisect.bisect_left(self._keys, low):bisect.bisect_right(self._keys, high)]
+
+class Table:
+    """Parsed rows of one table together with the storage stamp they were read at"""
+
+    def __init__(self, path, rows, fieldnames, stamp, base_rows=None):
+        self.path = path
+        self.rows = rows
+        self.fieldnames = fieldnames
+        self.stamp = stamp
+        self.nbytes = _estimate_bytes(rows)
+        self.indexes = {}
+        # Number of data rows physically in the CSV file, including ones the log deleted
+        self.base_rows = len(rows) if base_rows is None else base_rows
+        # SQLite rowid of each row, keyed by id(row); unused by the CSV backend
+        self.rowids = {}
+        self._discarded = set()
+        # Values computed from the rows (sort orders, grade scale), dropped on any write
+        self.derived = {}
+
+    def index(self, column, unique=True):
+        """Return the hash index on column, building it on first use"""
+        index = self.indexes.get(column)
+        if index is None:
+            index = self.indexes[column] = HashIndex(column, unique).build(self.live_rows())
+        return index
+
+    def ranking(self, group_column, value_column):
+        """Return the per-group order-statistics index, building it on first use"""
+        name = f"{group_column}:{value_column}"
+        index = self.indexes.get(name)
+        if index is None:
+            index = self.indexes[name] = RankIndex(group_column, value_column).build(self.live_rows())
+        return index
+
+    def range_index(self, column):
+        """Return the rows ordered by a numeric column, building it on first use"""
+        name = f"range:{column}"
+        index = self.indexes.get(name)
+        if index is None:
+            index = self.indexes[name] = RangeIndex(column).build(self.live_rows())
+        return index
+
+    def name_index(self, columns):
+        """Return the name search index over columns, building it on first use"""
+        name = "names:" + ",".join(columns)
+        index = self.indexes.get(name)
+        if index is None:
+            index = self.indexes[name] = NameIndex(columns).build(self.live_rows())
+        return index
+
+    def live_rows(self):
+        """The rows without those discarded but not yet purged (as during log replay)"""
+        if not self._discarded:
+            return self.rows
+        return [row for row in self.rows if id(row) not in self._discarded]
+
+    def insert(self, row):
+        self.derived.clear()
+        self.rows.append(row)
+        for index in self.indexes.values():
+            index.add(row)
+
+    def update(self, row, changes):
+        """Apply changes to a row in place, keeping indexes on changed columns correct"""
+        self.derived.clear()
+        touched = [index for index in self.indexes.values() if any(c in changes for c in index.columns)]
+        for index in touched:
+            index.remove(row)
+        row.update(changes)
+        for index in touched:
+            index.add(row)
+
+    def delete(self, rows):
+        self.discard(rows)
+        self.purge()
+
+    def discard(self, rows):
+        """Drop rows from the indexes now and from the row list on the next purge"""
+        self.derived.clear()
+        for row in rows:
+            self._discarded.add(id(row))
+            for index in self.indexes.values():
+                index.remove(row)
+
+    def purge(self):
+        if self._discarded:
+            self.rows[:] = [row for row in self.rows if id(row) not in self._discarded]
+            self._discarded.clear()
+
+class TableCache:
+    """Process-wide LRU cache of parsed tables, invalidated when the storage stamp changes"""
+
+    def __init__(self, max_bytes=TABLE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._tables = OrderedDict()
+        self._sizes = {}
+        self._used = 0
+
+    def get(self, file_name):
+        """Return the cached Table for file_name, re-parsing only if the file changed"""
+        path = os.path.abspath(file_name)
+        if _active_transaction is not None:
+            # Pin the version a transaction read first: its commit is checked against it
+            table = _active_transaction.snapshots.get(path)
+            if table is None:
+                table = _active_transaction.snapshots[path] = self._get(path)
+            return table
+        return self._get(path)
+
+    def _get(self, path):
+        if _active_buffer is not None and path in _active_buffer.tables:
+            # Changes not yet flushed live only in this copy, so it must not be reloaded
+            return _active_buffer.tables[path]
+        stamp = storage.stamp(path)
+        table = self._tables.get(path)
+        if table is not None and table.stamp == stamp:
+            self._tables.move_to_end(path)
+            self.hits += 1
+            return table
+
+        # Stamp and contents must come from the same moment, so no writer may run in between
+        with table_lock(path):
+            stamp = storage.stamp(path)
+            table = self._tables.get(path)
+            if table is not None and (table.stamp == stamp or storage.catch_up(table, stamp)):
+                self.hits += 1
+                table.nbytes = _estimate_bytes(table.rows)
+                return self._store(table)
+            self.misses += 1
+            return self._store(storage.read(path, stamp))
+
+    def peek(self, file_name):
+        """Return the cached Table for file_name if it is loaded and current, without loading it"""
+        path = os.path.abspath(file_name)
+        if _active_transaction is not None and path in _active_transaction.snapshots:
+            return _active_transaction.snapshots[path]
+        if _active_buffer is not None and path in _active_buffer.tables:
+            return _active_buffer.tables[path]
+        table = self._tables.get(path)
+        if table is not None and table.stamp == storage.stamp(path):
+            self._tables.move_to_end(path)
+            self.hits += 1
+            return table
+        return None
+
+    def put(self, table):
+        """Replace the cached copy of a table after we wrote it ourselves"""
+        return self._store(table)
+
+    def refresh(self, table):
+        """Re-stamp a table we mutated in place and just saved"""
+        table.stamp = storage.stamp(table.path)
+        table.nbytes = _estimate_bytes(table.rows)
+        return self._store(table)
+
+    def invalidate(self, file_name=None):
+        """Drop one table (or every table) from the cache"""
+        if file_name is None:
+            self._tables.clear()
+            self._sizes.clear()
+            self._used = 0
+            return
+        path = os.path.abspath(file_name)
+        self._tables.pop(path, None)
+        self._used -= self._sizes.pop(path, 0)
+
+    def stats(self):
+        """Return hit/miss counters and current memory use"""
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'tables': len(self._tables), 'bytes': self._used, 'max_bytes': self.max_bytes}
+
+    def _store(self, table):
+        # Sizes are remembered per path: a table refreshed in place has already changed its nbytes
+        self._tables.pop(table.path, None)
+        self._used -= self._sizes.pop(table.path, 0)
+        self._tables[table.path] = table
+        self._sizes[table.path] = table.nbytes
+        self._used += table.nbytes
+
+        # Evict least recently used tables, but always keep the one just stored
+        while self._used > self.max_bytes and len(self._tables) > 1:
+            path, _ = self._tables.popitem(last=False)
+            self._used -= self._sizes.pop(path)
+            self.evictions += 1
+        return table
+
+table_cache = TableCache()
+
+# =================== Locking ===================
+
+try:
+    import fcntl
+except ImportError:  # no advisory locks on Windows: single-process use only
+    fcntl = None
+
+LOCK_TIMEOUT = float(os.environ.get('CHECKMYGRADE_LOCK_TIMEOUT') or 30)
+WRITE_RETRIES = 8
+lock_stats = {'waits': 0, 'conflicts': 0, 'retries': 0, 'catch_ups': 0}
+# Locks this process holds: table path -> (lock file descriptor, exclusive)
+_held_locks = {}
+
+class ConcurrentUpdateError(RuntimeError):
+    """Another process changed a table between this process reading it and committing a write"""
+
+def _lock_path(path):
+    """Return the lock file for a table; the CSV itself is replaced on rewrite, so it cannot carry the lock"""
+    return path + '.lock'
+
+def _flock(fd, operation, path):
+    """Take an flock, polling with backoff up to LOCK_TIMEOUT while another process holds it"""
+    deadline = None
+    delay = 0.0005
+    while True:
+        try:
+            fcntl.flock(fd, operation | fcntl.LOCK_NB)
+            return
+        except BlockingIOError:
+            if deadline is None:
+                lock_stats['waits'] += 1
+                deadline = time.monotonic() + LOCK_TIMEOUT
+            elif time.monotonic() > deadline:
+                raise TimeoutError(f"Timed out waiting for a lock on {os.path.basename(path)}")
+        time.sleep(delay)
+        delay = min(delay * 2, 0.02)
+
+@contextmanager
+def table_lock(file_name, exclusive=False):
+    """Hold a cross-process advisory lock on a table: shared for readers, exclusive for writers
+
+    Re-entrant: asking again for a lock this process already holds (or a
+    shared lock under an exclusive one) is a no-op.
+    """
+    path = os.path.abspath(file_name)
+    held = _held_locks.get(path)
+    if fcntl is None or not storage.file_locks or (held is not None and (held[1] or not exclusive)):
+        yield
+        return
+    if held is not None:
+        # Two processes upgrading shared locks would deadlock; writers take exclusive up front
+        raise RuntimeError(f"Cannot upgrade a shared lock on {os.path.basename(path)}")
+
+    try:
+        fd = os.open(_lock_path(path), os.O_RDWR | os.O_CREAT, 0o644)
+    except OSError:
+        # Read-only data directory: nobody can write, so there is nothing to coordinate
+        yield
+        return
+    try:
+        _flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH, path)
+        _held_locks[path] = (fd, exclusive)
+        try:
+            yield
+        finally:
+            del _held_locks[path]
+    finally:
+        os.close(fd)
+
+_VERSION = struct.Struct('<QQ')   # rewrite generation, write count
+
+def _table_version(path):
+    """Return (rewrite generation, write count), kept in the table's lock file and bumped by every writer
+
+    File stats alone can repeat: a rewrite may reuse the old inode number and
+    size within one mtime tick, and the cache would then keep stale rows.
+    """
+    if fcntl is None:
+        return (0, 0)
+    try:
+        fd = os.open(_lock_path(path), os.O_RDONLY)
+    except OSError:
+        return (0, 0)
+    try:
+        data = os.pread(fd, _VERSION.size, 0)
+    finally:
+        os.close(fd)
+    return _VERSION.unpack(data) if len(data) == _VERSION.size else (0, 0)
+
+def _bump_version(path, rewrite=False):
+    """Count a write (and, for whole-file rewrites, a new generation); called under the exclusive lock"""
+    if fcntl is None:
+        return
+    try:
+        fd = os.open(_lock_path(path), os.O_RDWR | os.O_CREAT, 0o644)
+    except OSError:
+        return
+    try:
+        data = os.pread(fd, _VERSION.size, 0)
+        generation, count = _VERSION.unpack(data) if len(data) == _VERSION.size else (0, 0)
+        os.pwrite(fd, _VERSION.pack(generation + rewrite, count + 1), 0)
+    finally:
+        os.close(fd)
+
+def retry_on_conflict(func, *args, retries=WRITE_RETRIES, **kwargs):
+    """Call func (which must re-read what it changes) until it commits without a ConcurrentUpdateError"""
+    for attempt in range(retries + 1):
+        try:
+            return func(*args, **kwargs)
+        except ConcurrentUpdateError:
+            if attempt == retries:
+                raise
+            lock_stats['retries'] += 1
+            # Randomized backoff so conflicting processes stop colliding in lockstep
+            time.sleep(random.uniform(0, 0.001 * 2 ** min(attempt, 6)))
+
+# =================== CSV Storage ===================
+
+PARSE_WORKERS = int(os.environ.get('CHECKMYGRADE_PARSE_WORKERS') or 1)
+PARALLEL_PARSE_MIN_BYTES = 32 * 1024 * 1024
+PARSE_CHUNKS_PER_WORKER = 4
+_QUOTE_SCAN_BLOCK = 16 * 1024 * 1024
+
+def _normalize_header(values):
+    return [f.strip().lower() for f in values]
+
+def _rows_from_reader(reader, fieldnames):
+    """Build row dicts the way csv.DictReader would: blank lines skipped, short rows padded with None"""
+    return make_rows(fieldnames, (values for values in reader if values))
+
+def _count_quotes(mm, start, end):
+    quotes = 0
+    for block in range(start, end, _QUOTE_SCAN_BLOCK):
+        quotes += mm[block:min(end, block + _QUOTE_SCAN_BLOCK)].count(b'"')
+    return quotes
+
+def _split_offsets(mm, start, parts):
+    """Cut mm[start:] into at most parts byte ranges that each end on a record boundary"""
+    size = len(mm)
+    offsets = [start]
+    position, quotes = start, 0
+    for part in range(1, parts):
+        target = start + (size - start) * part // parts
+        if target < position:
+            continue
+        newline = mm.find(b'\n', target)
+        while newline != -1:
+            # An even quote count up to the newline means it is not inside a quoted field
+            quotes += _count_quotes(mm, position, newline + 1)
+            position = newline + 1
+            if quotes % 2 == 0:
+                break
+            newline = mm.find(b'\n', position)
+        if newline == -1:
+            break
+        offsets.append(position)
+    if offsets[-1] < size:
+        offsets.append(size)
+    return offsets
+
+def _parse_chunk(task):
+    """Worker: parse the records in one byte range of a CSV file"""
+    path, start, end, fieldnames = task
+    with open(path, mode='rb') as file:
+        file.seek(start)
+        text = file.read(end - start).decode('utf-8')
+    return _rows_from_reader(csv.reader(io.StringIO(text, newline='')), fieldnames)
+
+def parse_csv_parallel(path, workers):
+    """Parse a CSV file in byte-range chunks across a process pool, keeping file order"""
+    from concurrent.futures import ProcessPoolExecutor
+    with open(path, mode='rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return [], []
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            header_end, raw = next(_iter_records(mm, 0))
+            header_end += len(raw)
+            fieldnames = _normalize_header(_parse_record(raw))
+            offsets = _split_offsets(mm, header_end, workers * PARSE_CHUNKS_PER_WORKER)
+    tasks = [(path, offsets[i], offsets[i + 1], fieldnames) for i in range(len(offsets) - 1)]
+    rows = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for chunk in pool.map(_parse_chunk, tasks):
+            rows.extend(chunk)
+    return rows, fieldnames
+
+@instrumented
+def _parse_csv(path, workers=None):
+    """Parse a CSV file into normalized rows and header"""
+    workers = PARSE_WORKERS if workers is None else workers
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    try:
+        if workers > 1 and os.path.getsize(path) >= PARALLEL_PARSE_MIN_BYTES:
+            return parse_csv_parallel(path, workers)
+        with open(path, mode='r', newline='') as file:
+            reader = csv.reader(file)
+            fieldnames = _normalize_header(next(reader, []))
+            return _rows_from_reader(reader, fieldnames), fieldnames
+    except FileNotFoundError:
+        return [], []
+    except ValueError as e:
+        raise ValueError(f"{os.path.basename(path)}: {e}") from None
+
+@instrumented
+def _read_log(path, start=0):
+    """Return the records of a table's delta log from byte offset start, ignoring a torn last line"""
+    records = []
+    try:
+        with open(_log_path(path), mode='r') as file:
+            file.seek(start)
+            for line in file:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    break
+    except FileNotFoundError:
+        pass
+    return records
+
+def _apply_record(table, record):
+    """Replay one update/delete log record against a table"""
+    index = table.index(record['key'])
+    if record['op'] == 'update':
+        row = index.get(record['value'])
+        if row is not None:
+            table.update(row, record['changes'])
+    elif record['op'] == 'delete':
+        table.discard(index.get_all(record['value']))
+
+@instrumented
+def _read_table(path, stamp):
+    """Parse a CSV file and fold its delta log into a merged Table"""
+    base_rows, fieldnames = _parse_csv(path)
+    # Records logged against an older copy of the CSV were already folded into it
+    inode = stamp[0][0] if stamp[0] else None
+    records = [r for r in _read_log(path) if r.get('base', inode) == inode]
+    if metrics.enabled:
+        metrics.add('rows_parsed', len(base_rows))
+        metrics.add('log_records_read', len(records))
+        metrics.add('bytes_read', sum(s[1] for s in stamp[:2] if s))
+    if not records:
+        return Table(path, base_rows, fieldnames, stamp)
+
+    table = Table(path, [], fieldnames, stamp, base_rows=0)
+    _merge_log(table, base_rows, records)
+    table.nbytes = _estimate_bytes(table.rows)
+    return table
+
+def _merge_log(table, rows, records):
+    """Append rows read from the CSV after table.base_rows, replaying log records in between"""
+    # A record only applies to rows that were already in the file when it was logged
+    start = table.base_rows
+    end = start + len(rows)
+    position = start
+    for record in records:
+        upto = min(record.get('upto', end), end)
+        while position < upto:
+            table.insert(rows[position - start])
+            position += 1
+        _apply_record(table, record)
+    for row in rows[position - start:]:
+        table.insert(row)
+    table.base_rows = end
+    table.purge()
+
+def _grew(old, new):
+    """True if file stamp new is old with bytes appended (same inode, not shorter, not edited in place)"""
+    return new[0] == old[0] and (new[1] > old[1] or new == old)
+
+def _remove_log(path):
+    try:
+        os.remove(_log_path(path))
+    except FileNotFoundError:
+        pass
+
+def _fsync_dir(path):
+    """Flush a directory entry change (rename/unlink) to disk where the OS allows it"""
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+@instrumented
+def _write_temp(file_name, rows, fieldnames):
+    """Write rows to a fsynced temp file next to file_name and return its path"""
+    path = os.path.abspath(file_name)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.' + os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode='w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=fieldnames)
+            writer.writeheader()
+            writer.writerows(rows)
+            file.flush()
+            os.fsync(file.fileno())
+            if metrics.enabled:
+                metrics.add('rows_written', len(rows))
+                metrics.add('bytes_written', file.tell())
+        if os.path.exists(path):
+            shutil.copymode(path, tmp)
+        else:
+            os.chmod(tmp, 0o644)
+    except BaseException:
+        os.remove(tmp)
+        raise
+    return tmp
+
+def _write_rows(file_name, rows, fieldnames):
+    """Atomically replace file_name, so a crash leaves either the old or the new file"""
+    tmp = _write_temp(file_name, rows, fieldnames)
+    os.replace(tmp, file_name)
+    _fsync_dir(file_name)
+
+def _ends_with_newline(path):
+    with open(path, mode='rb') as file:
+        file.seek(-1, os.SEEK_END)
+        return file.read(1) in (b'\n', b'\r')
+
+@instrumented
+def _append_rows(path, fieldnames, rows):
+    """Append rows to a CSV file, writing the header if the file is new"""
+    with open(path, mode='a', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=fieldnames)
+        if file.tell() == 0:
+            writer.writeheader()
+        elif not _ends_with_newline(path):
+            file.write('\r\n')
+        start = file.tell()
+        writer.writerows(rows)
+        if metrics.enabled:
+            metrics.add('rows_written', len(rows))
+            metrics.add('bytes_written', file.tell() - start)
+
+@instrumented
+def _append_records(path, records):
+    text = ''.join(json.dumps(record) + '\n' for record in records)
+    with open(_log_path(path), mode='a') as file:
+        file.write(text)
+    if metrics.enabled:
+        metrics.add('log_records_written', len(records))
+        metrics.add('bytes_written', len(text))
+
+def _truncate_appends(stamps):
+    """Cut files back to the (path, stamp) they had before a failed append, removing ones it created"""
+    for path, stamp in stamps:
+        if stamp is None:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        else:
+            os.truncate(path, stamp[1])
+
+JOURNAL_NAME = '.checkmygrade-journal.json'
+_recovered_dirs = set()
+
+def _read_journal(journal):
+    try:
+        with open(journal, mode='r') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+def _recover_journal(directory, force=False):
+    """Finish the renames of a transaction that crashed after it was committed"""
+    if directory in _recovered_dirs and not force:
+        return
+    _recovered_dirs.add(directory)
+    journal = os.path.join(directory, JOURNAL_NAME)
+    pending = _read_journal(journal)
+    if pending is None:
+        return
+
+    with ExitStack() as locks:
+        # A process still committing holds these locks until it has finished the journal itself
+        for target in sorted(target for _, target in pending['renames']):
+            locks.enter_context(table_lock(target, exclusive=True))
+        pending = _read_journal(journal)
+        if pending is None:
+            return
+        for tmp, target in pending['renames']:
+            if os.path.exists(tmp):
+                os.replace(tmp, target)
+                _bump_version(target, rewrite=True)
+        for target in pending['logs']:
+            _remove_log(target)
+        _fsync_dir(journal)
+        os.remove(journal)
+        _fsync_dir(journal)
+
+class CsvStorage:
+    """Flat CSV files: inserts append a row, updates/deletes go to a delta log"""
+
+    name = 'csv'
+    file_locks = True
+
+    def stamp(self, path):
+        _recover_journal(os.path.dirname(path))
+        return _table_stamp(path)
+
+    def read(self, path, stamp):
+        return _read_table(path, stamp)
+
+    def catch_up(self, table, stamp):
+        """Fold in rows and log records other processes appended since table.stamp; False if a file was rewritten"""
+        (old_csv, old_log, old_version), (new_csv, new_log, new_version) = table.stamp, stamp
+        if old_version[0] != new_version[0]:
+            return False
+        if not old_csv or not new_csv or not table.fieldnames or not _grew(old_csv, new_csv):
+            return False
+        if old_log is not None and (new_log is None or not _grew(old_log, new_log)):
+            return False
+
+        with open(table.path, mode='rb') as file:
+            file.seek(old_csv[1])
+            text = file.read(new_csv[1] - old_csv[1]).decode('utf-8')
+        rows = _rows_from_reader(csv.reader(io.StringIO(text, newline='')), table.fieldnames)
+        records = [r for r in _read_log(table.path, old_log[1] if old_log else 0) if r.get('base', new_csv[0]) == new_csv[0]]
+        if metrics.enabled:
+            metrics.add('rows_parsed', len(rows))
+            metrics.add('log_records_read', len(records))
+            metrics.add('bytes_read', len(text) + (new_log[1] - (old_log[1] if old_log else 0) if new_log else 0))
+        _merge_log(table, rows, records)
+        table.stamp = stamp
+        lock_stats['catch_ups'] += 1
+        return True
+
+    def replace(self, path, rows, fieldnames):
+        if _active_transaction is not None:
+            table = _active_transaction.tables[path] = Table(path, rows, fieldnames, None)
+            return table
+        _write_rows(path, rows, fieldnames)
+        _remove_log(path)
+        _bump_version(path, rewrite=True)
+        _forget_buffered(path)
+        return Table(path, rows, fieldnames, self.stamp(path))
+
+    def insert(self, table, rows):
+        if _active_transaction is not None:
+            _active_transaction.tables[table.path] = table
+            return
+        table.base_rows += len(rows)
+        if _active_buffer is not None:
+            _active_buffer.add(table, ('rows', rows))
+            return
+        _append_rows(table.path, table.fieldnames, rows)
+        _bump_version(table.path)
+        table_cache.refresh(table)
+
+    def update(self, table, row, changes, key, value):
+        self._append_log(table, {'op': 'update', 'key': key, 'value': value, 'changes': changes})
+
+    def delete(self, table, rows, key, value):
+        self._append_log(table, {'op': 'delete', 'key': key, 'value': value})
+
+    def _append_log(self, table, record):
+        if _active_transaction is not None:
+            _active_transaction.tables[table.path] = table
+            return
+        record['upto'] = table.base_rows
+        record['base'] = table.stamp[0][0] if table.stamp[0] else None
+        if _active_buffer is not None:
+            _active_buffer.add(table, ('record', record))
+            return
+        _append_records(table.path, [record])
+        _bump_version(table.path)
+        table_cache.refresh(table)
+        if table.stamp[1][1] > LOG_COMPACT_BYTES:
+            self.compact(table)
+
+    def flush(self, table, entries):
+        """Write a table's buffered rows and log records with one append each"""
+        with table_lock(table.path, exclusive=True):
+            if self.stamp(table.path) != table.stamp:
+                table = self._replay(table.path, entries)
+            rows = [row for kind, item in entries if kind == 'rows' for row in item]
+            records = [item for kind, item in entries if kind == 'record']
+            stamps = [(path, _file_stamp(path)) for path in (table.path, _log_path(table.path))]
+            try:
+                if rows:
+                    _append_rows(table.path, table.fieldnames, rows)
+                if records:
+                    _append_records(table.path, records)
+                _bump_version(table.path)
+            except BaseException:
+                # The entries stay buffered for a retry, so none of them may stay written
+                _truncate_appends(stamps)
+                table_cache.invalidate(table.path)
+                raise
+            table_cache.refresh(table)
+            if table.stamp[1] is not None and table.stamp[1][1] > LOG_COMPACT_BYTES:
+                try:
+                    self.compact(table)
+                except OSError as e:
+                    # The entries are saved; the next write that finds the log too long compacts it
+                    print(f"Could not compact {os.path.basename(table.path)}: {e}", file=sys.stderr)
+
+    def _replay(self, path, entries):
+        """Another process wrote the table since we buffered: redo our changes on top of its version"""
+        table_cache.invalidate(path)
+        table = table_cache.get(path)
+        inode = table.stamp[0][0] if table.stamp[0] else None
+        for kind, item in entries:
+            if kind == 'rows':
+                for row in item:
+                    table.insert(row)
+                table.base_rows += len(item)
+            else:
+                item['upto'] = table.base_rows
+                item['base'] = inode
+                _apply_record(table, item)
+        table.purge()
+        return table
+
+    @instrumented
+    def compact(self, table):
+        if table.stamp[1] is None:
+            return False
+        _write_rows(table.path, table.rows, table.fieldnames)
+        _remove_log(table.path)
+        table.base_rows = len(table.rows)
+        _bump_version(table.path, rewrite=True)
+        _forget_buffered(table.path)
+        table_cache.refresh(table)
+        return True
+
+    def commit(self, tables):
+        """Rewrite every touched table once; all files switch over or none do"""
+        renames = []
+        try:
+            for table in tables:
+                renames.append([_write_temp(table.path, table.rows, table.fieldnames), table.path])
+        except BaseException:
+            for tmp, _ in renames:
+                os.remove(tmp)
+            raise
+
+        # The journal is the commit point: once it exists, recovery rolls the renames forward
+        directory = os.path.dirname(tables[0].path)
+        journal = os.path.join(directory, JOURNAL_NAME)
+        fd, journal_tmp = tempfile.mkstemp(dir=directory, prefix=JOURNAL_NAME + '.', suffix='.tmp')
+        with os.fdopen(fd, mode='w') as file:
+            json.dump({'renames': renames, 'logs': [t.path for t in tables]}, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(journal_tmp, journal)
+        _fsync_dir(journal)
+        _recover_journal(directory, force=True)
+
+        for table in tables:
+            table.base_rows = len(table.rows)
+            _bump_version(table.path, rewrite=True)
+            _forget_buffered(table.path)
+            table_cache.refresh(table)
+
+    def lookup(self, path, column, value):
+        """Point lookup through the sidecar offset index, or None if the table has to be loaded"""
+        if not OFFSET_INDEX_ENABLED or column not in OFFSET_INDEX_COLUMNS.get(os.path.basename(path), ()):
+            return None
+        return offset_lookup(path, column, value)
+
+    def rollback(self, tables):
+        pass
+
+    def close(self):
+        pass
+
+# =================== Offset Index ===================
+
+# Opt-in sidecar <table>.csv.idx files mapping key columns to byte offsets in the CSV
+OFFSET_INDEX_ENABLED = os.environ.get('CHECKMYGRADE_OFFSET_INDEX') == '1'
+OFFSET_INDEX_COLUMNS = {'students.csv': ('email', 'student_id'), 'login.csv': ('email',)}
+_OFFSET_HEADER = struct.Struct('<8sQQQQ8sI')   # magic, csv inode, size, mtime, rows, tail digest, columns
+_OFFSET_SECTION = struct.Struct('<32sQ')       # column name, entry count
+_OFFSET_ENTRY_SIZE = 18                        # big-endian key hash (8), byte offset (6), row number (4)
+_OFFSET_MAGIC = b'CMGOIX1\n'
+
+def _index_path(path):
+    return path + '.idx'
+
+def _key_hash(value):
+    """Stable 64-bit hash of a key; collisions are resolved by checking the decoded row"""
+    if isinstance(value, str):
+        value = value.encode()
+    return zlib.crc32(value) << 32 | zlib.crc32(value, 0x5bd1e995)
+
+def _pack_entry(key_hash, offset, row_number):
+    # One int per entry sorts far faster than tuples and orders by hash first
+    return key_hash << 80 | offset << 32 | row_number
+
+def _unpack_entry(entry):
+    return entry >> 80, (entry >> 32) & 0xFFFFFFFFFFFF, entry & 0xFFFFFFFF
+
+def _tail_digest(mm, end):
+    """Fingerprint the bytes just before end, to tell an append from an in-place edit"""
+    return hashlib.blake2b(mm[max(0, end - 4096):end], digest_size=8).digest()
+
+def _iter_records(mm, start):
+    """Yield (offset, raw bytes) for each CSV record from start, keeping quoted newlines in one record"""
+    pos, size = start, len(mm)
+    while pos < size:
+        end, quotes = pos, 0
+        while True:
+            newline = mm.find(b'\n', end)
+            stop = size if newline == -1 else newline + 1
+            quotes += mm[end:stop].count(b'"')
+            end = stop
+            if quotes % 2 == 0 or end >= size:
+                break
+        yield pos, mm[pos:end]
+        pos = end
+
+def _parse_record(raw):
+    return next(csv.reader(io.StringIO(raw.decode('utf-8'), newline='')), [])
+
+def _scan_offsets(mm, start, first_row, positions, entries):
+    """Add (hash, offset, row number) entries for records from start; returns rows seen"""
+    row_number = first_row
+    offset = start
+    pending = None
+    mm.seek(start)
+    for line in iter(mm.readline, b''):
+        if pending is None and b'"' not in line:
+            # Fast path: an unquoted single-line record splits on commas directly
+            record_start = offset
+            values = line.rstrip(b'\r\n').split(b',')
+            offset += len(line)
+            if values == [b'']:
+                continue
+        else:
+            if pending is None:
+                pending, record_start = [], offset
+            pending.append(line)
+            offset += len(line)
+            if b''.join(pending).count(b'"') % 2:
+                continue
+            values = _parse_record(b''.join(pending))
+            pending = None
+            if not values:
+                continue
+
+        for column, position in positions.items():
+            if position < len(values):
+                entries[column].append(_pack_entry(_key_hash(values[position]), record_start, row_number))
+        row_number += 1
+    return row_number
+
+class OffsetIndex:
+    """Read-only view of a sidecar offset index, binary-searched through mmap"""
+
+    def __init__(self, index_file):
+        self._file = open(index_file, mode='rb')
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.inode, self.size, self.mtime, self.rows, self.digest, count = _OFFSET_HEADER.unpack_from(self._mm, 0)
+        if magic != _OFFSET_MAGIC:
+            self.close()
+            raise ValueError(f"{index_file} is not an offset index")
+        self.sections = {}
+        position = _OFFSET_HEADER.size
+        for _ in range(count):
+            name, entries = _OFFSET_SECTION.unpack_from(self._mm, position)
+            position += _OFFSET_SECTION.size
+            self.sections[name.rstrip(b'\0').decode()] = (position, entries)
+            position += entries * _OFFSET_ENTRY_SIZE
+
+    def _entry(self, start, i):
+        position = start + i * _OFFSET_ENTRY_SIZE
+        return int.from_bytes(self._mm[position:position + _OFFSET_ENTRY_SIZE], 'big')
+
+    def entries(self, column):
+        """Return every packed entry of a column, in sorted order"""
+        start, count = self.sections[column]
+        return [self._entry(start, i) for i in range(count)]
+
+    def find(self, column, value):
+        """Return [(byte offset, row number)] of records whose column may equal value"""
+        start, count = self.sections[column]
+        key = _key_hash(value)
+        low, high = 0, count
+        while low < high:
+            mid = (low + high) // 2
+            if _unpack_entry(self._entry(start, mid))[0] < key:
+                low = mid + 1
+            else:
+                high = mid
+        found = []
+        while low < count:
+            entry_key, offset, row_number = _unpack_entry(self._entry(start, low))
+            if entry_key != key:
+                break
+            found.append((offset, row_number))
+            low += 1
+        return sorted(found)
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+def _write_offset_index(path, stamp, rows, digest, entries):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.' + os.path.basename(path) + '.', suffix='.tmp')
+    with os.fdopen(fd, mode='wb') as file:
+        file.write(_OFFSET_HEADER.pack(_OFFSET_MAGIC, stamp[0], stamp[1], stamp[2], rows, digest, len(entries)))
+        for column, column_entries in entries.items():
+            column_entries.sort()
+            file.write(_OFFSET_SECTION.pack(column.encode(), len(column_entries)))
+            file.write(b''.join(entry.to_bytes(_OFFSET_ENTRY_SIZE, 'big') for entry in column_entries))
+    shutil.copymode(path, tmp)
+    os.replace(tmp, _index_path(path))
+
+def refresh_offset_index(path, columns):
+    """Bring the sidecar index up to date: extend it after appends, rebuild it after rewrites"""
+    stamp = _file_stamp(path)
+    if stamp is None or stamp[1] == 0:
+        return None
+    try:
+        index = OffsetIndex(_index_path(path))
+    except (OSError, ValueError, struct.error):
+        index = None
+    if index is not None and (index.inode, index.size, index.mtime) == stamp and all(c in index.sections for c in columns):
+        return index
+
+    with open(path, mode='rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        header_offset, header_raw = next(_iter_records(mm, 0))
+        header = [f.strip().lower() for f in _parse_record(header_raw)]
+        positions = {c: header.index(c) for c in columns if c in header}
+        entries = {c: [] for c in positions}
+        start, first_row = header_offset + len(header_raw), 0
+
+        # Only the new tail needs scanning if the file just grew by appends
+        if (index is not None and index.inode == stamp[0] and index.size < stamp[1]
+                and set(index.sections) == set(positions) and _tail_digest(mm, index.size) == index.digest):
+            for column in positions:
+                entries[column] = index.entries(column)
+            start, first_row = index.size, index.rows
+        rows = _scan_offsets(mm, start, first_row, positions, entries)
+        digest = _tail_digest(mm, stamp[1])
+
+    if index is not None:
+        index.close()
+    _write_offset_index(path, stamp, rows, digest, entries)
+    return OffsetIndex(_index_path(path))
+
+def offset_lookup(path, column, value):
+    """Return the merged rows whose column equals value, decoding only the matching CSV lines
+
+    Returns None when the delta log may have changed column itself, in which
+    case the caller has to load the table.
+    """
+    stamp = storage.stamp(path)
+    inode = stamp[0][0] if stamp[0] else None
+    records = [r for r in _read_log(path) if r.get('base', inode) == inode]
+    if any(r['op'] == 'update' and column in r['changes'] for r in records):
+        return None
+
+    index = refresh_offset_index(path, OFFSET_INDEX_COLUMNS.get(os.path.basename(path), (column,)))
+    if index is None:
+        return []
+    try:
+        matches = index.find(column, value)
+        if not matches:
+            return []
+        with open(path, mode='rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            header = [f.strip().lower() for f in _parse_record(next(_iter_records(mm, 0))[1])]
+            candidates = [(dict(zip(header, _parse_record(next(_iter_records(mm, offset))[1]))), row_number)
+                          for offset, row_number in matches]
+    finally:
+        index.close()
+
+    rows = []
+    for row, row_number in candidates:
+        if row.get(column) != value:
+            continue
+        for record in records:
+            # A record only reaches rows that were already in the file when it was logged
+            if record.get('upto', row_number + 1) <= row_number or row.get(record['key']) != record['value']:
+                continue
+            if record['op'] == 'delete':
+                break
+            row.update(record['changes'])
+        else:
+            rows.append(row)
+    return rows
+
+# =================== SQLite Storage ===================
+
+SQLITE_DB_NAME = 'checkmygrade.db'
+# Primary key and secondary indexes per table, applied when the table has those columns
+SQLITE_SCHEMA = {
+    'students': ('student_id', ['email', 'course_id']),
+    'courses': ('course_id', []),
+    'professors': ('professor_id', ['email', 'course_id']),
+    'grades': ('grade_id', []),
+    'login': ('email', []),
+}
+
+def _quote(identifier):
+    return '"' + identifier.replace('"', '""') + '"'
+
+class SqliteStorage:
+    """One SQLite database per data directory, one table per CSV file name
+
+    Rows are still served from the in-memory table cache; SQLite replaces
+    whole-file rewrites with row-level statements. Statements are built
+    once per table/column set and reused through sqlite3's statement cache.
+    """
+
+    name = 'sqlite'
+    # SQLite serializes writers itself; taking table locks as well would invert lock order inside transactions
+    file_locks = False
+
+    def __init__(self):
+        self._connections = {}
+
+    def _locate(self, path):
+        """Return (database path, table name) for a CSV-style table path"""
+        directory, base = os.path.split(path)
+        return os.path.join(directory, SQLITE_DB_NAME), os.path.splitext(base)[0]
+
+    def connect(self, path):
+        db_path, _ = self._locate(path)
+        conn = self._connections.get(db_path)
+        if conn is None:
+            conn = sqlite3.connect(db_path, cached_statements=256)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._connections[db_path] = conn
+        return conn
+
+    def _columns(self, conn, name):
+        return [row[1] for row in conn.execute(f'PRAGMA table_info({_quote(name)})')]
+
+    def _create(self, conn, name, fieldnames):
+        key, indexed = SQLITE_SCHEMA.get(name, (None, []))
+        columns = [f'{_quote(f)} TEXT' + (' PRIMARY KEY' if f == key else '') for f in fieldnames]
+        conn.execute(f'CREATE TABLE IF NOT EXISTS {_quote(name)} ({", ".join(columns)})')
+        for column in indexed:
+            if column in fieldnames:
+                conn.execute(f'CREATE INDEX IF NOT EXISTS {_quote(f"{name}_{column}")} ON {_quote(name)} ({_quote(column)})')
+
+    def _finish(self, conn, table):
+        if _active_transaction is not None:
+            _active_transaction.tables[table.path] = table
+        else:
+            conn.commit()
+
+    def _buffered(self, table, entry):
+        """Hold a write for the active buffer's flush; False if it must run now"""
+        if _active_buffer is None or _active_transaction is not None:
+            return False
+        # Statements wait in memory rather than in an open transaction, which would lock out other processes
+        _active_buffer.add(table, entry)
+        return True
+
+    def stamp(self, path):
+        db_path, _ = self._locate(path)
+        db_stamp = _file_stamp(db_path)
+        if db_stamp is None:
+            return None
+        # data_version changes whenever another connection commits to the database
+        return (db_stamp[0], self.connect(path).execute('PRAGMA data_version').fetchone()[0])
+
+    @instrumented
+    def read(self, path, stamp):
+        if stamp is None:
+            return Table(path, [], [], stamp)
+        conn = self.connect(path)
+        _, name = self._locate(path)
+        fieldnames = self._columns(conn, name)
+        if not fieldnames:
+            return Table(path, [], [], stamp)
+
+        records = conn.execute(f'SELECT rowid, * FROM {_quote(name)} ORDER BY rowid').fetchall()
+        rows = make_rows(fieldnames, [['' if v is None else v for v in record[1:]] for record in records])
+        rowids = {id(row): record[0] for row, record in zip(rows, records)}
+        if metrics.enabled:
+            metrics.add('rows_parsed', len(rows))
+        table = Table(path, rows, fieldnames, stamp)
+        table.rowids = rowids
+        return table
+
+    def catch_up(self, table, stamp):
+        return False
+
+    def replace(self, path, rows, fieldnames, skip_duplicates=False):
+        conn = self.connect(path)
+        _, name = self._locate(path)
+        verb = 'INSERT OR IGNORE' if skip_duplicates else 'INSERT'
+        if not conn.in_transaction:
+            # DDL does not open a transaction implicitly, and the drop must roll back with the rest
+            conn.execute('BEGIN')
+        if _active_transaction is not None:
+            self._fill(conn, name, verb, rows, fieldnames)
+            table = self.read(path, self.stamp(path))
+            _active_transaction.tables[path] = table
+            return table
+        try:
+            self._fill(conn, name, verb, rows, fieldnames)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        _forget_buffered(path)
+        return self.read(path, self.stamp(path))
+
+    def _fill(self, conn, name, verb, rows, fieldnames):
+        conn.execute(f'DROP TABLE IF EXISTS {_quote(name)}')
+        self._create(conn, name, fieldnames)
+        placeholders = ', '.join('?' * len(fieldnames))
+        conn.executemany(f'{verb} INTO {_quote(name)} VALUES ({placeholders})',
+                         ([row[f] for f in fieldnames] for row in rows))
+
+    def insert(self, table, rows):
+        if self._buffered(table, ('insert', rows)):
+            return
+        conn = self.connect(table.path)
+        self._insert(conn, table, rows)
+        self._finish(conn, table)
+
+    def _insert(self, conn, table, rows):
+        _, name = self._locate(table.path)
+        if not self._columns(conn, name):
+            self._create(conn, name, table.fieldnames)
+        sql = f'INSERT INTO {_quote(name)} ({", ".join(map(_quote, table.fieldnames))}) VALUES ({", ".join("?" * len(table.fieldnames))})'
+        for row in rows:
+            table.rowids[id(row)] = conn.execute(sql, [row[f] for f in table.fieldnames]).lastrowid
+        if metrics.enabled:
+            metrics.add('rows_written', len(rows))
+
+    def update(self, table, row, changes, key, value):
+        if self._buffered(table, ('update', (row, dict(changes)))):
+            return
+        conn = self.connect(table.path)
+        self._update(conn, table, row, changes)
+        self._finish(conn, table)
+
+    def _update(self, conn, table, row, changes):
+        _, name = self._locate(table.path)
+        columns = sorted(changes)
+        assignments = ', '.join(f'{_quote(c)} = ?' for c in columns)
+        conn.execute(f'UPDATE {_quote(name)} SET {assignments} WHERE rowid = ?',
+                     [changes[c] for c in columns] + [table.rowids[id(row)]])
+
+    def delete(self, table, rows, key, value):
+        if self._buffered(table, ('delete', rows)):
+            return
+        conn = self.connect(table.path)
+        self._delete(conn, table, rows)
+        self._finish(conn, table)
+
+    def _delete(self, conn, table, rows):
+        _, name = self._locate(table.path)
+        conn.executemany(f'DELETE FROM {_quote(name)} WHERE rowid = ?', [(table.rowids.pop(id(row)),) for row in rows])
+
+    def compact(self, table):
+        return False
+
+    def lookup(self, path, column, value):
+        """Point lookup through the database's own indexes"""
+        if self.stamp(path) is None:
+            return []
+        conn = self.connect(path)
+        _, name = self._locate(path)
+        fieldnames = self._columns(conn, name)
+        if column not in fieldnames:
+            return []
+        cursor = conn.execute(f'SELECT * FROM {_quote(name)} WHERE {_quote(column)} = ? ORDER BY rowid', (value,))
+        return [{f: '' if v is None else v for f, v in zip(fieldnames, record)} for record in cursor]
+
+    def commit(self, tables):
+        for conn in {self.connect(table.path) for table in tables}:
+            conn.commit()
+        for table in tables:
+            _forget_buffered(table.path)
+
+    def flush(self, table, entries):
+        """Run a table's buffered statements in one short transaction"""
+        conn = self.connect(table.path)
+        rowids = dict(table.rowids)
+        try:
+            for kind, item in entries:
+                if kind == 'insert':
+                    self._insert(conn, table, item)
+                elif kind == 'update':
+                    self._update(conn, table, *item)
+                else:
+                    self._delete(conn, table, item)
+            conn.commit()
+        except BaseException:
+            # The entries stay buffered for a retry, which must see the rowids as they were
+            conn.rollback()
+            table.rowids = rowids
+            raise
+
+    def rollback(self, tables):
+        for conn in {self.connect(table.path) for table in tables}:
+            conn.rollback()
+
+    def close(self):
+        for conn in self._connections.values():
+            conn.close()
+        self._connections.clear()
+
+def migrate_to_sqlite(directory='.'):
+    """Copy every CSV table (with its delta log folded in) into the directory's SQLite database"""
+    csv_storage, sqlite_storage = CsvStorage(), SqliteStorage()
+    report = {}
+    try:
+        for file_name in DATA_FILES:
+            path = os.path.abspath(os.path.join(directory, file_name))
+            table = csv_storage.read(path, csv_storage.stamp(path))
+            if not table.fieldnames:
+                continue
+            migrated = sqlite_storage.replace(path, table.rows, table.fieldnames, skip_duplicates=True)
+            report[file_name] = {'rows': len(migrated.rows), 'skipped': len(table.rows) - len(migrated.rows)}
+    finally:
+        sqlite_storage.close()
+    if storage.name == 'sqlite':
+        table_cache.invalidate()
+    return report
+
+# =================== Storage Selection ===================
+
+STORAGE_BACKENDS = {'csv': CsvStorage, 'sqlite': SqliteStorage}
+storage = STORAGE_BACKENDS[os.environ.get('CHECKMYGRADE_BACKEND', 'csv')]()
+
+def use_storage(name):
+    """Switch every table to the 'csv' or 'sqlite' backend"""
+    global storage
+    if name not in STORAGE_BACKENDS:
+        raise ValueError(f"Unknown storage backend {name!r}")
+    storage.close()
+    storage = STORAGE_BACKENDS[name]()
+    table_cache.invalidate()
+    return storage
+
+@instrumented
+def load_table(file_name):
+    """Return the shared cached rows of a table (callers must not mutate them)"""
+    return table_cache.get(file_name).rows
+
+@instrumented
+def load_csv(file_name):
+    """Loads CSV file data into a list of dictionaries"""
+    return [dict(row) for row in load_table(file_name)]
+
+def _csv_rows(rows, fieldnames):
+    """Return rows the way a fresh parse of the written file would yield them"""
+    return make_rows(fieldnames, [['' if row.get(f) is None else str(row.get(f)) for f in fieldnames] for row in rows])
+
+@instrumented
+def write_csv(file_name, data, fieldnames):
+    """Writes data into CSV file """
+    fieldnames = [f.lower() for f in fieldnames]
+    normalized_data = [{k.strip().lower(): v for k, v in row.items()} for row in data]
+    for row in normalized_data:
+        extra = set(row) - set(fieldnames)
+        if extra:
+            raise ValueError(f"dict contains fields not in fieldnames: {', '.join(map(repr, sorted(extra)))}")
+
+    # Keep the cache in step with what a fresh read of the table would return
+    rows = _csv_rows(normalized_data, fieldnames)
+    path = os.path.abspath(file_name)
+    if _active_transaction is not None:
+        # Staged like the transaction's other writes: later reads see the new rows, the commit writes them
+        old = table_cache.get(path)
+        table = storage.replace(path, rows, fieldnames)
+        table.stamp = old.stamp
+        _active_transaction.snapshots[path] = table
+        return
+    with table_lock(file_name, exclusive=True):
+        table_cache.put(storage.replace(path, rows, fieldnames))
+
+def _write_locked(file_name, apply):
+    """Run apply(table) against the table's current contents while holding its exclusive lock"""
+    if _active_transaction is not None:
+        # Checked against the stamp it was read at when the transaction commits
+        return apply(table_cache.get(file_name))
+    # Any full reparse happens here, so other writers only wait for the cheap catch-up below
+    table_cache.get(file_name)
+    with table_lock(file_name, exclusive=True):
+        return apply(table_cache.get(file_name))
+
+def compact_table(file_name):
+    """Fold a table's delta log back into a clean CSV file"""
+    return _write_locked(file_name, storage.compact)
+
+def insert_row(file_name, row, fieldnames, unique=None):
+    """Append one row to the end of a table without rewriting it; None if its unique column value exists"""
+    rows = insert_rows(file_name, [row], fieldnames, unique)
+    return rows[0] if rows else None
+
+def insert_rows(file_name, rows, fieldnames, unique=None):
+    """Append rows to the end of a table in a single write, skipping rows whose unique column value exists"""
+    def apply(table):
+        if not table.fieldnames:
+            table.fieldnames = [f.lower() for f in fieldnames]
+        new_rows = _csv_rows(rows, table.fieldnames)
+        if unique is not None:
+            # Checked under the lock, so two processes cannot both add the same key
+            existing = table.index(unique)
+            new_rows = [row for row in new_rows if existing.get(row[unique]) is None]
+        if not new_rows:
+            return new_rows
+
+        for row in new_rows:
+            table.insert(row)
+        storage.insert(table, new_rows)
+        return new_rows
+    return _write_locked(file_name, apply)
+
+def update_rows(file_name, updates):
+    """Apply many (row, changes) pairs to a table's rows and persist them in one transaction"""
+    changed = 0
+    with transaction():
+        table = table_cache.get(file_name)
+        for row, changes in updates:
+            table.update(row, changes)
+            storage.update(table, row, changes, None, None)
+            changed += 1
+    return changed
+
+def update_row(file_name, key, value, changes):
+    """Apply changes to the first row whose key column equals value, and persist it"""
+    changes = {k: '' if v is None else str(v) for k, v in changes.items()}
+
+    def apply(table):
+        row = table.index(key).get(value)
+        if row is None or not changes:
+            return row
+        table.update(row, changes)
+        storage.update(table, row, changes, key, value)
+        return row
+    return _write_locked(file_name, apply)
+
+def delete_rows(file_name, key, value):
+    """Delete every row whose key column equals value"""
+    def apply(table):
+        rows = table.index(key).get_all(value)
+        if rows:
+            table.delete(rows)
+            storage.delete(table, rows, key, value)
+        return rows
+    return _write_locked(file_name, apply)
+
+def iter_csv(file_name):
+    """Stream rows of a CSV file with the header normalized once"""
+    with open(file_name, mode='r', newline='') as file:
+        reader = csv.reader(file)
+        header = [f.strip().lower() for f in next(reader, [])]
+        for values in reader:
+            yield dict(zip(header, values))
+
+def bulk_insert(file_name, key, rows, fieldnames):
+    """Insert many rows in one pass, rejecting duplicate keys, with a single append"""
+    start_time = time.perf_counter()
+    accepted = []
+    rejected = []
+
+    def apply(table):
+        existing = table.index(key)
+        seen = set()
+        for position, row in enumerate(rows, start=1):
+            value = row.get(key)
+            if not value:
+                rejected.append((position, row, f"missing {key}"))
+            elif value in seen or existing.get(value) is not None:
+                rejected.append((position, row, f"duplicate {key}"))
+            else:
+                seen.add(value)
+                accepted.append(row)
+        insert_rows(file_name, accepted, fieldnames)
+    _write_locked(file_name, apply)
+    seconds = time.perf_counter() - start_time
+    return {'added': len(accepted), 'rejected': rejected, 'seconds': seconds,
+            'rows_per_second': (len(accepted) + len(rejected)) / seconds if seconds else 0.0}
+
+def _entity_row(cls, record, fieldnames):
+    """Turn an entity instance or a loose dict into a row, via the constructor's normalization"""
+    if not isinstance(record, cls):
+        record = cls(**{f: record.get(f, '') for f in fieldnames})
+    return record.__dict__
+
+def _print_bulk_result(result, label):
+    print(f"{result['added']} {label} added, {len(result['rejected'])} rejected "
+          f"({result['rows_per_second']:.0f} rows/sec).")
+
+# =================== Transactions ===================
+
+_active_transaction = None
+
+class Transaction:
+    """Mutations to several tables that are persisted together on commit"""
+
+    def __init__(self):
+        # Tables written in this transaction, and every table it read (at the version it read)
+        self.tables = OrderedDict()
+        self.snapshots = {}
+
+    @instrumented
+    def commit(self):
+        """Persist every touched table, unless another process changed one since this transaction read it"""
+        if not self.tables:
+            return
+        tables = list(self.tables.values())
+        with ExitStack() as locks:
+            # A fixed lock order keeps two committing processes from deadlocking
+            for path in sorted(self.snapshots):
+                locks.enter_context(table_lock(path, exclusive=True))
+            for table in self.snapshots.values():
+                if storage.stamp(table.path) != table.stamp:
+                    lock_stats['conflicts'] += 1
+                    raise ConcurrentUpdateError(f"{os.path.basename(table.path)} was changed by another process")
+            storage.commit(tables)
+
+    def rollback(self):
+        """Undo storage changes and forget in-memory ones so the next read reloads"""
+        storage.rollback(list(self.tables.values()))
+        for path in self.snapshots:
+            table_cache.invalidate(path)
+
+def _reset_after_fork():
+    """A forked child starts outside the parent's transaction and holds none of its locks"""
+    global _active_transaction, _active_buffer
+    _active_transaction = None
+    _active_buffer = None
+    _held_locks.clear()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+@contextmanager
+def transaction():
+    """Group mutations, possibly across tables, into one atomic commit (one rewrite per touched CSV file)"""
+    global _active_transaction
+    if _active_transaction is not None:
+        yield _active_transaction
+        return
+
+    if _active_buffer is not None:
+        # Start from flushed tables, so a rollback can only discard this transaction's own changes
+        _active_buffer.flush()
+    txn = _active_transaction = Transaction()
+    try:
+        yield txn
+    except BaseException:
+        _active_transaction = None
+        txn.rollback()
+        raise
+    _active_transaction = None
+    try:
+        txn.commit()
+    except BaseException:
+        txn.rollback()
+        raise
+
+# =================== Write Batching ===================
+
+_active_buffer = None
+
+class WriteBuffer:
+    """Row appends and log records held in memory, then written per table in one go on flush
+
+    Tables with unflushed changes are pinned, so reads see those changes
+    until the flush lands; a transaction or compaction that rewrites a
+    table makes its buffered entries redundant.
+    """
+
+    def __init__(self):
+        self.tables = OrderedDict()
+        self.entries = {}
+        self.pending = 0
+        self.added = 0
+        self.flushes = 0
+
+    def add(self, table, entry):
+        self.tables[table.path] = table
+        self.entries.setdefault(table.path, []).append(entry)
+        self.pending += 1
+        self.added += 1
+
+    def forget(self, path):
+        self.tables.pop(path, None)
+        self.pending -= len(self.entries.pop(path, []))
+
+    @instrumented
+    def flush(self):
+        """Write every table's pending changes; returns how many buffered writes were flushed"""
+        flushed = self.pending
+        while self.tables:
+            # Entries stay buffered until their write succeeds, so a failed flush can be retried
+            path, table = next(iter(self.tables.items()))
+            storage.flush(table, self.entries[path])
+            del self.tables[path]
+            self.pending -= len(self.entries.pop(path))
+        if flushed:
+            self.flushes += 1
+        return flushed
+
+def _forget_buffered(path):
+    if _active_buffer is not None:
+        _active_buffer.forget(path)
+
+@contextmanager
+def buffered_writes(buffer=None):
+    """Hold inserts, updates and deletes in a WriteBuffer and flush them when the block exits"""
+    global _active_buffer
+    if _active_buffer is not None:
+        yield _active_buffer
+        return
+    buffer = _active_buffer = buffer or WriteBuffer()
+    try:
+        yield buffer
+    finally:
+        try:
+            buffer.flush()
+        finally:
+            _active_buffer = None
+
+WRITE_BEHIND = os.environ.get('CHECKMYGRADE_WRITE_BEHIND') == '1'
+WRITE_BEHIND_INTERVAL = 5.0     # seconds between timed saves
+WRITE_BEHIND_MAX_OPS = 100      # buffered writes that trigger a save after the operation making them
+
+class WriteBehind:
+    """Opt-in write-behind for the interactive menu: edits stay in a WriteBuffer and only changed files are saved
+
+    Saves happen on a timer (SIGALRM while the menu is idle, or after the next operation where there is no
+    SIGALRM), after WRITE_BEHIND_MAX_OPS buffered writes, on save(), on exit and on SIGTERM. A SIGTERM
+    during an operation or a save exits once it has finished.
+    """
+
+    def __init__(self, interval=WRITE_BEHIND_INTERVAL, max_ops=WRITE_BEHIND_MAX_OPS):
+        self.interval = interval
+        self.max_ops = max_ops
+        self.buffer = WriteBuffer()
+        self.busy = False
+        self.last_save = time.monotonic()
+        self._signals = {}
+        self._exit_code = None
+
+    @property
+    def active(self):
+        return _active_buffer is self.buffer
+
+    @property
+    def pending(self):
+        return self.buffer.pending
+
+    def dirty_files(self):
+        return [os.path.relpath(path) for path in self.buffer.tables]
+
+    def start(self):
+        global _active_buffer
+        if _active_buffer is not None:
+            raise RuntimeError("Writes are already being buffered")
+        _active_buffer = self.buffer
+        self.last_save = time.monotonic()
+        self._exit_code = None
+        atexit.register(self.stop)
+        # Signal handlers run on the main thread, between operations' statements: _tick checks busy
+        if hasattr(signal, 'SIGTERM'):
+            self._signals[signal.SIGTERM] = signal.signal(signal.SIGTERM, self._terminate)
+        if hasattr(signal, 'setitimer') and self.interval > 0:
+            self._signals[signal.SIGALRM] = signal.signal(signal.SIGALRM, self._tick)
+            signal.setitimer(signal.ITIMER_REAL, self.interval, self.interval)
+        return self
+
+    def stop(self):
+        """Save pending changes and leave write-behind mode; returns how many were saved"""
+        global _active_buffer
+        if not self.active:
+            return 0
+        atexit.unregister(self.stop)
+        if hasattr(signal, 'SIGALRM') and signal.SIGALRM in self._signals:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+        for signum, handler in self._signals.items():
+            signal.signal(signum, handler)
+        self._signals.clear()
+        try:
+            saved = self.save()
+        finally:
+            _active_buffer = None
+        # A SIGTERM deferred during the operation that turned write-behind off exits now
+        self._exit_if_terminated()
+        return saved
+
+    def save(self):
+        """Write every changed file now; returns how many buffered writes were saved"""
+        busy, self.busy = self.busy, True
+        try:
+            saved = self.buffer.flush()
+        finally:
+            self.busy = busy
+        self.last_save = time.monotonic()
+        if not busy:
+            self._exit_if_terminated()
+        return saved
+
+    def idle(self):
+        """Called between operations: saves if enough writes are pending or the interval has passed"""
+        self.busy = False
+        self._exit_if_terminated()
+        if self.pending and (self.pending >= self.max_ops or time.monotonic() - self.last_save >= self.interval):
+            self.save()
+
+    def _exit_if_terminated(self):
+        if self._exit_code is not None:
+            exit_code, self._exit_code = self._exit_code, None
+            raise SystemExit(exit_code)
+
+    def _tick(self, signum, frame):
+        if self.busy or not self.pending:
+            return
+        try:
+            self.save()
+        except Exception as e:
+            # Still buffered; the next tick, save or exit retries
+            print(f"Background save failed: {e}", file=sys.stderr)
+
+    def _terminate(self, signum, frame):
+        if self.busy:
+            # Cutting an operation or a save in half could save half an edit, or an append twice
+            print("Exiting after the current operation.", file=sys.stderr)
+            self._exit_code = 128 + signum
+            return
+        # Unwind normally, so the atexit hook saves what was buffered
+        raise SystemExit(128 + signum)
+
+write_behind = WriteBehind()
+
+# =================== Sorting ===================
+
+class _Descending:
+    """Sort key wrapper that inverts ordering, so mixed-direction keys share one tuple"""
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+def _typed_value(field, value):
+    """Return (group, value): marks and numeric IDs compare as numbers and anything unparsable sorts last"""
+    # Short CSV rows carry None for their missing columns
+    value = value or ''
+    if field == 'marks':
+        marks = parse_marks(value)
+        return (0, marks) if marks is not None else (1, value)
+    if field.endswith('_id'):
+        return (0, int(value)) if value.isdigit() else (1, value)
+    return (0, value)
+
+def parse_sort_spec(by, descending=False):
+    """Turn 'course_id,-marks' (or a list of keys) into [(field, descending), ...]"""
+    keys = by.split(',') if isinstance(by, str) else by
+    spec = []
+    for key in keys:
+        key = key.strip().lower()
+        reverse = key.startswith('-')
+        spec.append((key.lstrip('-'), reverse != descending))
+    return tuple(spec)
+
+def sort_key(spec):
+    def key(row):
+        values = []
+        for field, reverse in spec:
+            group, value = _typed_value(field, row.get(field, ''))
+            values.append((group, _Descending(value) if reverse else value))
+        return tuple(values)
+    return key
+
+def sorted_rows(table, spec, limit=None):
+    """Return a new list of table rows in spec order; limit selects the first k with a heap instead of a full sort"""
+    # The memoized order is copied out, so callers cannot reorder it for the next caller
+    order = table.derived.get(spec)
+    if order is None:
+        if limit is not None and limit < len(table.rows):
+            return heapq.nsmallest(limit, table.rows, key=sort_key(spec))
+        order = table.derived[spec] = sorted(table.rows, key=sort_key(spec))
+    return order[:limit]
+
+# =================== Student Shards ===================
+# Optional layout (CSV backend): one students file per course under SHARD_DIR plus a small
+# directory table mapping student_id and email to the course shard holding the row.
+
+SHARD_DIR = 'students.shards'
+SHARD_DIRECTORY = os.path.join(SHARD_DIR, 'directory.csv')
+
+def students_sharded():
+    """True when students live in per-course shard files instead of students.csv"""
+    return os.path.isdir(SHARD_DIR)
+
+def shard_file(course_id):
+    return os.path.join(SHARD_DIR, 'course-' + urllib.parse.quote(course_id or '', safe='') + '.csv')
+
+def shard_files():
+    """Every shard on disk plus those only held by the open transaction or write buffer so far"""
+    names = set(os.listdir(SHARD_DIR))
+    for pending in (_active_transaction, _active_buffer):
+        if pending is not None:
+            names.update(os.path.basename(path) for path in pending.tables
+                         if os.path.dirname(path) == os.path.abspath(SHARD_DIR))
+    return sorted(os.path.join(SHARD_DIR, name) for name in names
+                  if name.startswith('course-') and name.endswith('.csv'))
+
+def students_file(course_id):
+    """The file holding a course's students: its shard, or students.csv in the flat layout"""
+    return shard_file(course_id) if students_sharded() else 'students.csv'
+
+def students_table():
+    """Every student as one Table: students.csv, or a read-only view merging all shards"""
+    if not students_sharded():
+        return table_cache.get('students.csv')
+    shards = [table_cache.get(path) for path in shard_files()]
+    view = shards[0].derived.get('merged') if shards else None
+    # Writes clear a shard's derived values, so a view every shard still holds is current
+    if view is None or view.shards != len(shards) or any(s.derived.get('merged') is not view for s in shards):
+        fieldnames = next((s.fieldnames for s in shards if s.fieldnames), [])
+        view = Table(os.path.abspath(SHARD_DIR), [row for s in shards for row in s.rows], fieldnames, None)
+        view.shards = len(shards)
+        for s in shards:
+            s.derived['merged'] = view
+    return view
+
+def table_files():
+    """DATA_FILES plus, in the sharded layout, the directory and every shard file"""
+    if not students_sharded():
+        return list(DATA_FILES)
+    return [f for f in DATA_FILES if f != 'students.csv'] + [SHARD_DIRECTORY] + shard_files()
+
+def _directory():
+    return table_cache.get(SHARD_DIRECTORY)
+
+def find_student_row(key, value):
+    """The first student row whose key column ('student_id' or 'email') equals value, or None"""
+    if not students_sharded():
+        return table_cache.get('students.csv').index(key).get(value)
+    entry = _directory().index(key).get(value)
+    if entry is None:
+        return None
+    return table_cache.get(shard_file(entry['course_id'])).index('student_id').get(entry['student_id'])
+
+def insert_student(row):
+    """Add one student row; None if its student_id exists"""
+    fieldnames = ['student_id', 'first_name', 'last_name', 'email', 'course_id', 'grade', 'marks']
+    if not students_sharded():
+        return insert_row('students.csv', row, fieldnames, unique='student_id')
+    # The directory claims the student_id first, under its lock, so concurrent adds cannot both succeed
+    if insert_row(SHARD_DIRECTORY, row, ['student_id', 'email', 'course_id'], unique='student_id') is None:
+        return None
+    return insert_row(shard_file(row.get('course_id')), row, fieldnames)
+
+def bulk_insert_students(rows):
+    """bulk_insert for students: rejects duplicate student_ids and appends once per touched file"""
+    fieldnames = ['student_id', 'first_name', 'last_name', 'email', 'course_id', 'grade', 'marks']
+    if not students_sharded():
+        return bulk_insert('students.csv', 'student_id', rows, fieldnames)
+    start_time = time.perf_counter()
+    rows = list(rows)
+    result = bulk_insert(SHARD_DIRECTORY, 'student_id', rows, ['student_id', 'email', 'course_id'])
+    rejected = {position for position, _, _ in result['rejected']}
+    by_course = {}
+    for position, row in enumerate(rows, start=1):
+        if position not in rejected:
+            by_course.setdefault(row.get('course_id'), []).append(row)
+    for course_id, course_rows in by_course.items():
+        insert_rows(shard_file(course_id), course_rows, fieldnames)
+    result['seconds'] = seconds = time.perf_counter() - start_time
+    result['rows_per_second'] = len(rows) / seconds if seconds else 0.0
+    return result
+
+def update_student(student_id, changes):
+    """Apply changes to a student, moving the row to another shard when course_id changes; None if not found"""
+    if not students_sharded():
+        return update_row('students.csv', 'student_id', student_id, changes)
+    entry = _directory().index('student_id').get(student_id)
+    if entry is None:
+        return None
+    source = shard_file(entry['course_id'])
+    course_id = changes.get('course_id')
+    if not course_id or course_id == entry['course_id']:
+        row = update_row(source, 'student_id', student_id, changes)
+        if row is not None and changes.get('email'):
+            update_row(SHARD_DIRECTORY, 'student_id', student_id, {'email': changes['email']})
+        return row
+
+    def move():
+        # One transaction over both shards and the directory, so a crash cannot leave the student in two shards
+        with transaction():
+            entry = _directory().index('student_id').get(student_id)
+            source = shard_file(entry['course_id']) if entry is not None else None
+            row = table_cache.get(source).index('student_id').get(student_id) if source else None
+            if row is None:
+                return None
+            fieldnames = ['student_id', 'first_name', 'last_name', 'email', 'course_id', 'grade', 'marks']
+            moved = insert_row(shard_file(course_id), dict(row, **{k: '' if v is None else str(v) for k, v in changes.items()}), fieldnames)
+            update_row(SHARD_DIRECTORY, 'student_id', student_id, {'course_id': moved['course_id'], 'email': moved['email']})
+            delete_rows(source, 'student_id', student_id)
+            return moved
+    return retry_on_conflict(move)
+
+def delete_student(key, value):
+    """Delete every student whose key column ('student_id' or 'email') equals value; returns the deleted rows"""
+    if not students_sharded():
+        return delete_rows('students.csv', key, value)
+    deleted = []
+    for entry in list(_directory().index(key).get_all(value)):
+        deleted += delete_rows(shard_file(entry['course_id']), 'student_id', entry['student_id'])
+    delete_rows(SHARD_DIRECTORY, key, value)
+    return deleted
+
+def update_student_rows(updates):
+    """update_rows for (row, changes) pairs taken from students_table(), routed to each row's shard"""
+    if _active_buffer is not None and _active_transaction is None:
+        # Keyed updates join the buffered edits; update_rows would open a transaction, which saves them all
+        return sum(update_student(row['student_id'], changes) is not None for row, changes in updates)
+    if not students_sharded():
+        return update_rows('students.csv', updates)
+    by_shard = {}
+    for row, changes in updates:
+        by_shard.setdefault(shard_file(row['course_id']), []).append((row, changes))
+    with transaction():
+        return sum(update_rows(path, shard_updates) for path, shard_updates in by_shard.items())
+
+def shard_students():
+    """Split students.csv into per-course shard files and a directory; returns the number of shards"""
+    if storage.name != 'csv':
+        raise ValueError("Sharded students are only supported by the CSV backend")
+    if students_sharded():
+        raise ValueError(f"Students are already sharded in {SHARD_DIR}")
+    with table_lock('students.csv', exclusive=True):
+        table = table_cache.get('students.csv')
+        fieldnames = table.fieldnames or ['student_id', 'first_name', 'last_name', 'email', 'course_id', 'grade', 'marks']
+        by_course = {}
+        for row in table.rows:
+            by_course.setdefault(row.get('course_id'), []).append(row)
+        # Built in a temp directory and renamed into place, so readers see all shards or none
+        tmp = tempfile.mkdtemp(dir='.', prefix='.' + SHARD_DIR + '.')
+        try:
+            for course_id, rows in by_course.items():
+                _write_rows(os.path.join(tmp, os.path.basename(shard_file(course_id))), rows, fieldnames)
+            entries = [{'student_id': r['student_id'], 'email': r['email'], 'course_id': r['course_id']} for r in table.rows]
+            _write_rows(os.path.join(tmp, os.path.basename(SHARD_DIRECTORY)), entries, ['student_id', 'email', 'course_id'])
+            os.replace(tmp, SHARD_DIR)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        os.remove('students.csv')
+        _remove_log(os.path.abspath('students.csv'))
+        _bump_version(os.path.abspath('students.csv'), rewrite=True)
+    table_cache.invalidate()
+    return len(by_course)
+
+def unshard_students():
+    """Merge the shard files back into students.csv and remove the shard directory; returns the row count"""
+    if not students_sharded():
+        raise ValueError(f"Students are not sharded (no {SHARD_DIR} directory)")
+    view = students_table()
+    fieldnames = view.fieldnames or ['student_id', 'first_name', 'last_name', 'email', 'course_id', 'grade', 'marks']
+    write_csv('students.csv', view.rows, fieldnames)
+    shutil.rmtree(SHARD_DIR)
+    table_cache.invalidate()
+    return len(view.rows)
+
+# =================== Joins ===================
+# Joins probe the hash indexes each cached table keeps up to date on insert, update
+# and delete, so a view costs O(result size) rather than a scan of the joined tables.
+
+def course_by_id(course_id):
+    return table_cache.get('courses.csv').index('course_id').get(course_id)
+
+def professors_of_course(course_id):
+    return table_cache.get('professors.csv').index('course_id', unique=False).get_all(course_id)
+
+def students_of_course(course_id):
+    return table_cache.get(students_file(course_id)).index('course_id', unique=False).get_all(course_id)
+
+def courses_of_professor(email):
+    """Course rows taught by the professor with this email (courses missing from courses.csv are skipped)"""
+    courses = table_cache.get('courses.csv').index('course_id')
+    rows = table_cache.get('professors.csv').index('email', unique=False).get_all(email.lower())
+    return [course for course in (courses.get(p['course_id']) for p in rows) if course is not None]
+
+def students_of_professor(email):
+    """Student rows enrolled in any course the professor with this email teaches"""
+    course_ids = dict.fromkeys(p['course_id'] for p in table_cache.get('professors.csv').index('email', unique=False).get_all(email.lower()))
+    return [s for course_id in course_ids for s in students_of_course(course_id)]
+
+def course_roster(course_id):
+    """The course row (None if it does not exist), its professors and its students"""
+    return {'course': course_by_id(course_id), 'professors': professors_of_course(course_id),
+            'students': students_of_course(course_id)}
+
+def find_orphans():
+    """Students and professors whose course_id is not in courses.csv, in one pass over each table"""
+    courses = table_cache.get('courses.csv').index('course_id')
+    return {'students': [s for s in students_table().rows if courses.get(s['course_id']) is None],
+            'professors': [p for p in load_table('professors.csv') if courses.get(p['course_id']) is None]}
+
+# =================== Queries ===================
+# A where clause is predicates joined by 'and':
+#   course_id = DATA200 and marks between 80 and 90 and grade in {A, B} and email prefix jo
+# Operators: = != < <= > >= between in prefix (or ^=); values may be quoted. marks and credits compare as numbers.
+
+QUERY_ENTITIES = {
+    'students': ['student_id', 'first_name', 'last_name', 'email', 'course_id', 'grade', 'marks'],
+    'courses': ['course_id', 'course_name', 'credits', 'description'],
+    'professors': ['professor_id', 'name', 'email', 'rank', 'course_id'],
+}
+NUMERIC_COLUMNS = {'marks', 'credits'}
+OUTPUT_CHUNK_LINES = 1000   # lines joined into one write by write_lines
+QUERY_PAGE_ROWS = 20        # rows per page in the Query Records menu
+
+_QUERY_TOKEN = re.compile(r"""\s*(?:"([^"]*)"|'([^']*)'|(<=|>=|!=|\^=|[=<>{}(),])|([^\s=<>!^{}(),'"]+))""")
+_COMPARISONS = {'=': operator.eq, '!=': operator.ne, '<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge}
+
+def _query_tokens(where):
+    """Split a where clause into (kind, text) tokens; kind is 'value' for quoted strings, 'op' or 'word'"""
+    tokens = []
+    position = 0
+    where = where.rstrip()
+    while position < len(where):
+        match = _QUERY_TOKEN.match(where, position)
+        if match is None or match.end() == position:
+            raise ValueError(f"Unexpected character {where[position:].lstrip()[:1]!r} in query")
+        double, single, op, word = match.groups()
+        if op is not None:
+            tokens.append(('op', op))
+        elif word is not None:
+            tokens.append(('word', word))
+        else:
+            tokens.append(('value', double if double is not None else single))
+        position = match.end()
+    return tokens
+
+def parse_query(where, fieldnames):
+    """Parse a where clause into [(field, op, value), ...]; between takes (low, high) and in a frozenset"""
+    tokens = _query_tokens(where or '')
+    predicates = []
+    position = 0
+
+    def take(expected=None):
+        nonlocal position
+        if position >= len(tokens):
+            raise ValueError("Incomplete query")
+        kind, text = tokens[position]
+        if expected is not None and (kind == 'value' or text.lower() != expected):
+            raise ValueError(f"Expected {expected!r} but found {text!r} in query")
+        position += 1
+        return kind, text
+
+    def value(field):
+        kind, text = take()
+        if kind == 'op':
+            raise ValueError(f"Expected a value but found {text!r} in query")
+        if field in NUMERIC_COLUMNS:
+            number = parse_marks(text)
+            if number is None:
+                raise ValueError(f"{field} needs a number, got {text!r}")
+            return number
+        return text
+
+    while position < len(tokens):
+        if predicates:
+            take('and')
+        kind, field = take()
+        field = field.lower()
+        if kind != 'word' or field not in fieldnames:
+            raise ValueError(f"Unknown field {field!r} in query")
+        _, op = take()
+        op = op.lower()
+        if op in _COMPARISONS:
+            predicates.append((field, op, value(field)))
+        elif op == 'between':
+            low = value(field)
+            take('and')
+            predicates.append((field, op, (low, value(field))))
+        elif op == 'in':
+            _, bracket = take()
+            if bracket not in ('{', '('):
+                raise ValueError(f"Expected '{{' or '(' after in, found {bracket!r}")
+            values = [value(field)]
+            while take()[1] == ',':
+                values.append(value(field))
+            if tokens[position - 1][1] != {'{': '}', '(': ')'}[bracket]:
+                raise ValueError(f"Unclosed {bracket!r} in query")
+            predicates.append((field, op, frozenset(values)))
+        elif op in ('prefix', '^='):
+            kind, text = take()
+            if kind == 'op':
+                raise ValueError(f"Expected a value but found {text!r} in query")
+            predicates.append((field, 'prefix', text))
+        else:
+            raise ValueError(f"Unknown operator {op!r} in query")
+    return predicates
+
+def _predicate_test(field, op, value):
+    """Return a function row -> bool for one parsed predicate"""
+    # Short CSV rows carry None for their missing columns, which match as ''
+    if op == 'prefix':
+        return lambda row: (row.get(field) or '').startswith(value)
+    if field not in NUMERIC_COLUMNS:
+        if op == 'in':
+            return lambda row: (row.get(field) or '') in value
+        if op in ('=', '!='):
+            compare = _COMPARISONS[op]
+            return lambda row: compare(row.get(field) or '', value)
+        # Ordering follows _typed_value, so numeric IDs compare as numbers just as order= sorts them
+        if op == 'between':
+            low, high = (_typed_value(field, v) for v in value)
+            return lambda row: low <= _typed_value(field, row.get(field)) <= high
+        compare = _COMPARISONS[op]
+        value = _typed_value(field, value)
+        return lambda row: compare(_typed_value(field, row.get(field)), value)
+
+    # Unparsable numbers match no numeric predicate
+    def get(row):
+        return parse_marks(row.get(field))
+    if op == 'between':
+        low, high = value
+
+        def test(row):
+            v = get(row)
+            return v is not None and low <= v <= high
+    elif op == 'in':
+        def test(row):
+            return get(row) in value
+    else:
+        compare = _COMPARISONS[op]
+
+        def test(row):
+            v = get(row)
+            return v is not None and compare(v, value)
+    return test
+
+def _indexed_rows(table, predicates):
+    """The smallest candidate row list an existing index yields for one of the predicates, or None"""
+    best = None
+    for field, op, value in predicates:
+        rows = None
+        if field in NUMERIC_COLUMNS and f"range:{field}" in table.indexes:
+            bounds = {'=': (value, value), '<': (-math.inf, value), '<=': (-math.inf, value),
+                      '>': (value, math.inf), '>=': (value, math.inf), 'between': value}.get(op)
+            if bounds is not None:
+                rows = table.indexes[f"range:{field}"].between(*bounds)
+        elif field not in NUMERIC_COLUMNS and isinstance(table.indexes.get(field), HashIndex):
+            index = table.indexes[field]
+            if op == '=':
+                rows = index.get_all(value)
+            elif op == 'in':
+                rows = [row for v in sorted(value) for row in index.get_all(v)]
+        if rows is not None and (best is None or len(rows) < len(best)):
+            best = rows
+    return best
+
+def query(entity, where='', fields=None, order=None, limit=None, offset=0):
+    """Stream rows of 'students', 'courses' or 'professors' matching where, projected to fields, one page of them"""
+    # Invalid queries raise ValueError here, before any row is read. Without an order, rows come in
+    # storage order, or in index order when an existing index answers one of the predicates.
+    if entity not in QUERY_ENTITIES:
+        raise ValueError(f"Unknown table {entity!r}; choose {', '.join(QUERY_ENTITIES)}")
+    fieldnames = QUERY_ENTITIES[entity]
+    predicates = parse_query(where, fieldnames)
+    if isinstance(fields, str):
+        fields = [f.strip().lower() for f in fields.split(',') if f.strip()]
+    fields = list(fields or fieldnames)
+    unknown = [f for f in fields if f not in fieldnames]
+    if unknown:
+        raise ValueError(f"Unknown field {unknown[0]!r}")
+    spec = parse_sort_spec(order) if order else ()
+    if any(field not in fieldnames for field, _ in spec):
+        raise ValueError(f"Invalid sorting key {order!r}")
+    if offset < 0 or (limit is not None and limit < 0):
+        raise ValueError("limit and offset must not be negative")
+
+    table = students_table() if entity == 'students' else table_cache.get(entity + '.csv')
+    if spec:
+        # With no predicates only the first offset + limit rows need ordering
+        top = offset + limit if limit is not None and not predicates else None
+        rows = sorted_rows(table, spec, top)
+    else:
+        rows = _indexed_rows(table, predicates)
+        if rows is None:
+            rows = table.rows
+    matching = iter(rows)
+    # Chained filters stop at the first failing test; string tests are cheaper than parsing numbers, so go first
+    for predicate in sorted(predicates, key=lambda p: p[0] in NUMERIC_COLUMNS):
+        matching = filter(_predicate_test(*predicate), matching)
+    page = itertools.islice(matching, offset, None if limit is None else offset + limit)
+    return ({f: row.get(f, '') for f in fields} for row in page)
+
+def format_fields(row, fields=None):
+    return " | ".join(f"{field}: {row.get(field) or ''}" for field in (fields or row))
+
+def write_lines(lines, file=None):
+    """Write lines OUTPUT_CHUNK_LINES at a time instead of one print() each; returns the number written"""
+    file = file or sys.stdout
+    lines = iter(lines)
+    written = 0
+    while True:
+        chunk = list(itertools.islice(lines, OUTPUT_CHUNK_LINES))
+        if not chunk:
+            return written
+        file.write("\n".join(chunk) + "\n")
+        written += len(chunk)
+
+# =================== Name Search ===================
+# Names are split into lower-case, accent-free words. A prefix trie finds the words a search term starts,
+# and a trigram index finds near misses when too few rows match by prefix. Rows score per search term:
+# exact word > prefix (shorter completions first) > one or two typos; the top N are returned.
+
+NAME_SEARCH_LIMIT = 10
+NAME_COLUMNS = {'students': ('first_name', 'last_name'), 'professors': ('name',)}
+_WORD = re.compile(r'\w+')
+
+def name_words(text):
+    """Lower-case, accent-free words of a name ("Zoë O'Brien" -> ['zoe', 'o', 'brien'])"""
+    text = (text or '').casefold()
+    if not text.isascii():
+        text = ''.join(c for c in unicodedata.normalize('NFKD', text) if not unicodedata.combining(c))
+    return _WORD.findall(text)
+
+def _trigrams(word):
+    padded = '  ' + word + ' '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def _max_edits(term):
+    return 0 if len(term) < 3 else 1 if len(term) <= 4 else 2
+
+def _edit_distance(a, b, limit):
+    """Edit distance (insert, delete, substitute, swap adjacent) between a and b, or None if above limit"""
+    if abs(len(a) - len(b)) > limit:
+        return None
+    before = None
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i] + [0] * len(b)
+        for j, cb in enumerate(b, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                current[j] = min(current[j], before[j - 2] + 1)
+        if min(current) > limit:
+            return None
+        before, previous = previous, current
+    return previous[-1] if previous[-1] <= limit else None
+
+def _word_score(term, word, fuzzy):
+    """3 for an exact word, 2-3 for a prefix (closer completions higher), below 1 for a typo, 0 for no match"""
+    if word == term:
+        return 3.0
+    if word.startswith(term):
+        return 2.0 + len(term) / len(word)
+    if fuzzy:
+        distance = _edit_distance(term, word, _max_edits(term))
+        if distance is not None:
+            return 1.0 - distance / (len(term) + 1)
+    return 0.0
+
+class _TrieNode:
+    __slots__ = ('children', 'count', 'word')
+
+    def __init__(self):
+        self.children = {}
+        self.count = 0      # rows holding a word under this node
+        self.word = None    # set while some row holds exactly this word
+
+class NameIndex:
+    """Prefix trie plus trigram index over the words of name columns, for ranked, typo-tolerant name search"""
+
+    def __init__(self, columns):
+        self.columns = tuple(columns)
+        self._root = _TrieNode()
+        self._postings = {}   # word -> rows holding it
+        self._trigrams = {}   # trigram -> words containing it
+        self._words = {}      # name text -> its words, shared by every row with that name
+
+    def words(self, row):
+        """The distinct words of a row's name columns"""
+        words = ()
+        for column in self.columns:
+            text = row.get(column) or ''
+            cached = self._words.get(text)
+            if cached is None:
+                cached = self._words[text] = tuple(name_words(text))
+            words += cached
+        if len(words) < 2 or len(words) == 2 and words[0] != words[1]:
+            return words
+        return tuple(dict.fromkeys(words))
+
+    def build(self, rows):
+        # Postings first, then one trie insert per distinct word
+        postings = self._postings
+        for row in rows:
+            for word in self.words(row):
+                bucket = postings.get(word)
+                if bucket is None:
+                    bucket = postings[word] = []
+                bucket.append(row)
+        for word, bucket in postings.items():
+            self._add_word(word, len(bucket))
+        return self
+
+    def _add_word(self, word, count):
+        node = self._root
+        node.count += count
+        for char in word:
+            node = node.children.get(char) or node.children.setdefault(char, _TrieNode())
+            node.count += count
+        if node.word is None:
+            node.word = word
+            for trigram in _trigrams(word):
+                self._trigrams.setdefault(trigram, set()).add(word)
+
+    def add(self, row):
+        for word in self.words(row):
+            self._postings.setdefault(word, []).append(row)
+            self._add_word(word, 1)
+
+    def remove(self, row):
+        for word in self.words(row):
+            bucket = self._postings.get(word, [])
+            position = next((i for i, r in enumerate(bucket) if r is row), None)
+            if position is None:
+                continue
+            del bucket[position]
+            node = self._root
+            node.count -= 1
+            for char in word:
+                node = node.children[char]
+                node.count -= 1
+            if not bucket:
+                del self._postings[word]
+                node.word = None
+                for trigram in _trigrams(word):
+                    self._trigrams[trigram].discard(word)
+
+    def _node(self, prefix):
+        node = self._root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None or not node.count:
+                return None
+        return node
+
+    def _prefix_words(self, node):
+        """Words under a trie node, shortest first, so their prefix scores only decrease"""
+        level = [node]
+        while level:
+            for n in level:
+                if n.word is not None:
+                    yield n.word
+            level = [child for n in level for child in n.children.values() if child.count]
+
+    def _fuzzy_words(self, term):
+        """Words within a typo or two of term that do not start with it, best first"""
+        limit = _max_edits(term)
+        if not limit:
+            return []
+        shared = Counter(word for trigram in _trigrams(term) for word in self._trigrams.get(trigram, ()))
+        scored = []
+        for word in shared:
+            if not word.startswith(term):
+                score = _word_score(term, word, True)
+                if score:
+                    scored.append((score, word))
+        scored.sort(key=lambda pair: (-pair[0], pair[1]))
+        return scored
+
+    def _candidates(self, term, node, fuzzy):
+        """(score, word) for every word matching term, in non-increasing score order"""
+        if node is not None:
+            for word in self._prefix_words(node):
+                yield _word_score(term, word, False), word
+        if fuzzy:
+            yield from self._fuzzy_words(term)
 
-def load_csv(file_name):
-    """Loads CSV file data into a list of dictionaries"""
-    try:
-        with open(file_name, mode='r', newline='') as file:
-            reader = csv.DictReader(file)
-            return [{k.strip().lower(): v for k, v in row.items()} for row in reader]
-    except FileNotFoundError:
-        return []
+    def search(self, text, limit=NAME_SEARCH_LIMIT):
+        """Return up to limit (score, row) pairs for rows matching every word of text, best first"""
+        terms = list(dict.fromkeys(name_words(text)))
+        if not terms or limit <= 0:
+            return []
+        results = self._search(terms, limit, False)
+        if len(results) < limit:
+            results = self._search(terms, limit, True)
+        return results
 
-def write_csv(file_name, data, fieldnames):
-    """Writes data into CSV file """
-    normalized_data = [{k.strip().lower(): v for k, v in row.items()} for row in data]
+    def _search(self, terms, limit, fuzzy):
+        nodes = [self._node(term) for term in terms]
+        if not fuzzy and None in nodes:
+            return []
+        # Upper bound on each term's score, from its best possible word
+        best = [_word_score(term, next(self._prefix_words(node)), False) if node is not None else 1.0
+                for term, node in zip(terms, nodes)]
+        # Walk the words of the term matching the fewest rows; rows are scored against every term
+        driver = min(range(len(terms)), key=lambda i: nodes[i].count if nodes[i] is not None else 0)
+        rest = sum(best) - best[driver]
+        # Word scores per term, computed once per distinct word met
+        scores = [(term, {}) for term in terms]
+        seen = set()
+        top = []
+        for score, word in self._candidates(terms[driver], nodes[driver], fuzzy):
+            if len(top) == limit and top[0][0] >= score + rest:
+                break
+            for row in self._postings[word]:
+                if id(row) in seen:
+                    continue
+                seen.add(id(row))
+                words = self.words(row)
+                total = 0.0
+                for term, cache in scores:
+                    term_score = 0.0
+                    for w in words:
+                        s = cache.get(w)
+                        if s is None:
+                            s = cache[w] = _word_score(term, w, fuzzy)
+                        if s > term_score:
+                            term_score = s
+                    if not term_score:
+                        break
+                    total += term_score
+                else:
+                    # Ties rank in the order rows were found: via better words first, then table order
+                    item = (total, -len(seen), row)
+                    if len(top) < limit:
+                        heapq.heappush(top, item)
+                    elif item[:2] > top[0][:2]:
+                        heapq.heapreplace(top, item)
+                    if len(top) == limit and top[0][0] >= score + rest:
+                        break
+        return [(total, row) for total, _, row in sorted(top, key=lambda item: item[:2], reverse=True)]
 
-    with open(file_name, mode='w', newline='') as file:
-        writer = csv.DictWriter(file, fieldnames=[f.lower() for f in fieldnames])
-        writer.writeheader()
-        writer.writerows(normalized_data)
+def name_search(entity, text, limit=NAME_SEARCH_LIMIT):
+    """Return up to limit (score, row) pairs of 'students' or 'professors' whose names best match text"""
+    if entity not in NAME_COLUMNS:
+        raise ValueError(f"Unknown table {entity!r}; choose {', '.join(NAME_COLUMNS)}")
+    table = students_table() if entity == 'students' else table_cache.get('professors.csv')
+    return table.name_index(NAME_COLUMNS[entity]).search(text, limit)
 
 # =================== Student Class ===================
 
+@instrument_class
 class Student:
     def __init__(self, student_id, first_name, last_name, email, course_id, grade, marks):
         self.student_id = student_id
@@ -39,48 +2894,46 @@ class Student:
         self.grade = grade
         self.marks = marks
 
+    @classmethod
+    def records(cls):
+        """Return every student as a typed, slotted StudentRecord"""
+        return typed_records(students_table(), StudentRecord)
+
     def add_new_student(self):
         """Add a new student to the system"""
-        students = load_csv('students.csv')
-
-        for s in students:
-            if s['student_id'] == self.student_id:
-                print("Student ID already exists!")
-                return
-
-        students.append(self.__dict__)
-        write_csv('students.csv', students, ['student_id', 'first_name', 'last_name', 'email', 'course_id', 'grade', 'marks'])
+        if insert_student(self.__dict__) is None:
+            print("Student ID already exists!")
+            return
         print("Student Added Successfully!")
 
+    @classmethod
+    def bulk_add(cls, records):
+        """Add many students (Student objects or dicts) with one duplicate check and one write"""
+        fieldnames = ['student_id', 'first_name', 'last_name', 'email', 'course_id', 'grade', 'marks']
+        result = bulk_insert_students(_entity_row(cls, r, fieldnames) for r in records)
+        _print_bulk_result(result, "students")
+        return result
+
     def delete_new_student(self):
         """Delete a student by email"""
-        students = load_csv('students.csv')
-        students = [s for s in students if s['email'] != self.email]
-        write_csv('students.csv', students, ['student_id', 'first_name', 'last_name', 'email', 'course_id', 'grade', 'marks'])
+        delete_student('email', self.email)
         print(f"Student {self.email} deleted successfully!")
 
     def update_student_record(self, new_first_name=None, new_last_name=None, new_course_id=None, new_grade=None, new_marks=None):
         """Modify an existing student record"""
-        students = load_csv('students.csv')
-        student_found = False
-
-        for s in students:
-            if s['student_id'] == self.student_id:
-                if new_first_name:
-                    s['first_name'] = new_first_name
-                if new_last_name:
-                    s['last_name'] = new_last_name
-                if new_course_id:
-                    s['course_id'] = new_course_id
-                if new_grade:
-                    s['grade'] = new_grade
-                if new_marks:
-                    s['marks'] = new_marks
-                student_found = True
-                break
+        changes = {}
+        if new_first_name:
+            changes['first_name'] = new_first_name
+        if new_last_name:
+            changes['last_name'] = new_last_name
+        if new_course_id:
+            changes['course_id'] = new_course_id
+        if new_grade:
+            changes['grade'] = new_grade
+        if new_marks:
+            changes['marks'] = new_marks
 
-        if student_found:
-            write_csv('students.csv', students, ['student_id', 'first_name', 'last_name', 'email', 'course_id', 'grade', 'marks'])
+        if update_student(self.student_id, changes) is not None:
             print("Student record updated successfully!")
         else:
             print("Student not found!")
@@ -93,44 +2946,119 @@ class Student:
         """Retrieve student's marks"""
         print(f"Student {self.first_name} {self.last_name} has {self.marks} marks.")
 
+    def class_rank(self):
+        """Return (rank, class size, percentile) of this student's marks within their course"""
+        return table_cache.get(students_file(self.course_id)).ranking('course_id', 'marks').rank(self.course_id, self.marks)
+
     @classmethod
     def display_records(cls):
         """Display all student records"""
-        students = load_csv('students.csv')
+        students = students_table().rows
         if not students:
             print("No students found!")
         else:
             print("\n===== Student Records =====")
-            for s in students:
-                print(f"ID: {s['student_id']} | Name: {s['first_name']} {s['last_name']} | Email: {s['email']} | Course: {s['course_id']} | Grade: {s['grade']} | Marks: {s['marks']}")
+            write_lines(f"ID: {s['student_id']} | Name: {s['first_name']} {s['last_name']} | Email: {s['email']} | Course: {s['course_id']} | Grade: {s['grade']} | Marks: {s['marks']}"
+                        for s in students)
 
     @classmethod
     def search(cls, email):
         """Search for a student by email"""
-        students = load_csv('students.csv')
-        for s in students:
-            if s['email'] == email:
-                return Student(s['student_id'], s['first_name'], s['last_name'], s['email'], s['course_id'], s['grade'], s['marks'])
-        return None
+        students = table_cache.peek('students.csv')
+        if students_sharded():
+            s = find_student_row('email', email)
+        elif students is None:
+            # Cold path: let the backend fetch just this row instead of loading the whole table
+            matches = storage.lookup(os.path.abspath('students.csv'), 'email', email)
+            if matches is not None:
+                s = matches[0] if matches else None
+            else:
+                s = table_cache.get('students.csv').index('email').get(email)
+        else:
+            s = students.index('email').get(email)
+        if s is None:
+            return None
+        return Student(s['student_id'], s['first_name'], s['last_name'], s['email'], s['course_id'], s['grade'], s['marks'])
 
     @classmethod
-    def display_sorted(cls, by="marks"):
-        """Display students sorted by marks or email"""
-        students = load_csv('students.csv')
+    def search_by_name(cls, text, limit=NAME_SEARCH_LIMIT):
+        """Return up to limit student rows whose first/last names best match text, e.g. 'Jon Smi'"""
+        return [dict(s) for _, s in name_search('students', text, limit)]
 
-        if by not in ["marks", "email"]:
-            print("Invalid sorting key! Choose 'marks' or 'email'.")
-            return
+    @classmethod
+    def sorted_records(cls, by="marks", descending=False, limit=None):
+        """Return student rows sorted by one or more keys ('-' prefix for descending), optionally only the first limit"""
+        spec = parse_sort_spec(by, descending)
+        fieldnames = ['student_id', 'first_name', 'last_name', 'email', 'course_id', 'grade', 'marks']
+        if not spec or any(field not in fieldnames for field, _ in spec):
+            raise ValueError(f"Invalid sorting key {by!r}")
+        return sorted_rows(students_table(), spec, limit)
 
-        students = sorted(students, key=lambda x: x[by])
+    @classmethod
+    def display_sorted(cls, by="marks", descending=False, limit=None):
+        """Display students sorted by marks, email or any other student field"""
+        try:
+            students = cls.sorted_records(by, descending, limit)
+        except ValueError:
+            print("Invalid sorting key! Choose 'marks', 'email' or another student field.")
+            return
 
         print("\n===== Sorted Student Records =====")
-        for s in students:
-            print(f"ID: {s['student_id']} | Name: {s['first_name']} {s['last_name']} | Email: {s['email']} | Marks: {s['marks']} | Grade: {s['grade']}")
+        write_lines(f"ID: {s['student_id']} | Name: {s['first_name']} {s['last_name']} | Email: {s['email']} | Marks: {s['marks']} | Grade: {s['grade']}"
+                    for s in students)
 
    
+# =================== Course Statistics ===================
+
+MARKS_HISTOGRAM_BINS = 10
+MAX_MARKS = 100
+
+def parse_marks(value):
+    """Return marks as a float, or None if the value is not a finite number"""
+    try:
+        marks = float(value)
+    except (TypeError, ValueError):
+        return None
+    return marks if math.isfinite(marks) else None
+
+def _histogram(marks, bins):
+    """Count marks into equal-width bins over 0..MAX_MARKS, clamping outliers to the end bins"""
+    counts = [0] * bins
+    width = MAX_MARKS / bins
+    for m in marks:
+        counts[min(max(int(m // width), 0), bins - 1)] += 1
+    return counts
+
+def _summarize(marks, bins):
+    n = len(marks)
+    ordered = array('d', sorted(marks))
+    mid = n // 2
+    mean = math.fsum(ordered) / n
+    return {
+        'count': n,
+        'mean': mean,
+        'median': ordered[mid] if n % 2 else (ordered[mid - 1] + ordered[mid]) / 2,
+        'min': ordered[0],
+        'max': ordered[-1],
+        'stdev': math.sqrt(math.fsum((m - mean) ** 2 for m in ordered) / n),
+        'histogram': _histogram(ordered, bins),
+    }
+
+def course_statistics(students, bins=MARKS_HISTOGRAM_BINS):
+    """Per-course marks statistics for every course, computed in a single pass over students"""
+    marks_by_course = {}
+    for s in students:
+        marks = parse_marks(s.get('marks'))
+        if marks is not None:
+            course_marks = marks_by_course.get(s['course_id'])
+            if course_marks is None:
+                course_marks = marks_by_course[s['course_id']] = array('d')
+            course_marks.append(marks)
+    return {course_id: _summarize(marks, bins) for course_id, marks in sorted(marks_by_course.items())}
+
 # =================== Course Class ===================
 
+@instrument_class
 class Course:
     def __init__(self, course_id, course_name, credits, description):
         self.course_id = course_id
@@ -138,53 +3066,108 @@ class Course:
         self.credits = credits
         self.description = description
 
+    @classmethod
+    def records(cls):
+        """Return every course as a typed, slotted CourseRecord"""
+        return typed_records(table_cache.get('courses.csv'), CourseRecord)
+
     def add_new_course(self):
         """Add a new course to the system"""
-        courses = load_csv('courses.csv')
-
-        for c in courses:
-            if c['course_id'] == self.course_id:
-                print("Course ID already exists!")
-                return
-
-        courses.append(self.__dict__)
-        write_csv('courses.csv', courses, ['course_id', 'course_name', 'credits', 'description'])
+        if insert_row('courses.csv', self.__dict__, ['course_id', 'course_name', 'credits', 'description'], unique='course_id') is None:
+            print("Course ID already exists!")
+            return
         print("Course Added Successfully!")
 
+    @classmethod
+    def bulk_add(cls, records):
+        """Add many courses (Course objects or dicts) with one duplicate check and one write"""
+        fieldnames = ['course_id', 'course_name', 'credits', 'description']
+        result = bulk_insert('courses.csv', 'course_id', (_entity_row(cls, r, fieldnames) for r in records), fieldnames)
+        _print_bulk_result(result, "courses")
+        return result
+
     def delete_new_course(self):
         """Delete a course by course ID"""
-        courses = load_csv('courses.csv')
-        courses = [c for c in courses if c['course_id'] != self.course_id]
-        write_csv('courses.csv', courses, ['course_id', 'course_name', 'credits', 'description'])
+        delete_rows('courses.csv', 'course_id', self.course_id)
         print(f"Course {self.course_id} deleted successfully!")
     
     def get_students(self):
         """Retrieve all students in this course"""
-        students = load_csv('students.csv')
-        return [s for s in students if s['course_id'] == self.course_id]
+        return [dict(s) for s in students_of_course(self.course_id)]
+
+    def get_professors(self):
+        """Retrieve all professors teaching this course"""
+        return [dict(p) for p in professors_of_course(self.course_id)]
+
+    @classmethod
+    def display_roster(cls, course_id):
+        """Display a course with its instructors and enrolled students"""
+        roster = course_roster(course_id)
+        if roster['course'] is None and not roster['students']:
+            print("Course not found!")
+            return
+        course = roster['course']
+        print(f"\n===== Roster for {course_id} =====")
+        if course is None:
+            print("Course details not found!")
+        else:
+            print(f"Course Name: {course['course_name']} | Credits: {course['credits']} | Description: {course['description']}")
+        instructors = ", ".join(f"{p['name']} ({p['email']})" for p in roster['professors'])
+        print(f"Instructor(s): {instructors or 'none assigned'}")
+        print(f"Students ({len(roster['students'])}):")
+        for s in roster['students']:
+            print(f"ID: {s['student_id']} | Name: {s['first_name']} {s['last_name']} | Email: {s['email']} | Grade: {s['grade']} | Marks: {s['marks']}")
     
     def get_median_score(self):
         """Calculate and return the median marks of students in this course"""
-        students = self.get_students()
-        if not students:
+        students = table_cache.get(students_file(self.course_id))
+        if students.index('course_id', unique=False).get(self.course_id) is None:
             print("No students enrolled in this course.")
             return 0
 
-        all_marks = [float(s['marks']) for s in students if s['marks'].isdigit()]
-        return statistics.median(all_marks) if all_marks else 0
+        median = students.ranking('course_id', 'marks').median(self.course_id)
+        return median if median is not None else 0
+
+    def get_percentile(self, p):
+        """Return the p-th percentile (0-100) of marks in this course, or None without marks"""
+        return table_cache.get(students_file(self.course_id)).ranking('course_id', 'marks').percentile(self.course_id, p)
+
+    @classmethod
+    def statistics(cls, bins=MARKS_HISTOGRAM_BINS):
+        """Return count, mean, median, min/max, stdev and a marks histogram for every course"""
+        students = students_table()
+        name = f"statistics:{bins}"
+        report = students.derived.get(name)
+        if report is None:
+            report = students.derived[name] = course_statistics(students.rows, bins)
+        return report
+
+    @classmethod
+    def display_statistics(cls):
+        """Display marks statistics for all courses"""
+        report = cls.statistics()
+        if not report:
+            print("No marks recorded!")
+            return
+        print("\n===== Course Statistics =====")
+        for course_id, s in report.items():
+            print(f"Course: {course_id} | Students: {s['count']} | Mean: {s['mean']:.2f} | Median: {s['median']:.2f} | "
+                  f"Min: {s['min']:.2f} | Max: {s['max']:.2f} | Std Dev: {s['stdev']:.2f}")
+            print(f"    Histogram ({MAX_MARKS // MARKS_HISTOGRAM_BINS}-mark bins): {s['histogram']}")
     
     @classmethod
     def display_courses(cls):
         """Display all available courses"""
-        courses = load_csv('courses.csv')
+        courses = load_table('courses.csv')
         if not courses:
             print("No courses found!")
         else:
             print("\n===== Course List =====")
-            for c in courses:
-                print(f"Course ID: {c.get('course_id', 'N/A')} | Name: {c.get('course_name', 'N/A')} | Credits: {c.get('credits', 'N/A')} | Description: {c.get('description', 'N/A')}")
+            write_lines(f"Course ID: {c.get('course_id', 'N/A')} | Name: {c.get('course_name', 'N/A')} | Credits: {c.get('credits', 'N/A')} | Description: {c.get('description', 'N/A')}"
+                        for c in courses)
 # =================== Professor Class ===================
 
+@instrument_class
 class Professor:
     def __init__(self, professor_id, name, email, rank, course_id):
         self.professor_id = professor_id
@@ -193,110 +3176,234 @@ class Professor:
         self.rank = rank
         self.course_id = course_id.upper()
 
+    @classmethod
+    def records(cls):
+        """Return every professor as a typed, slotted ProfessorRecord"""
+        return typed_records(table_cache.get('professors.csv'), ProfessorRecord)
+
     def add_new_professor(self):
         """Add a new professor to the system"""
-        professors = load_csv('professors.csv')
-
         # Ensure professor ID is unique
-        for prof in professors:
-            if prof['professor_id'] == self.professor_id:
-                print("Professor ID already exists!")
-                return
-
-        professors.append(self.__dict__)
-        write_csv('professors.csv', professors, ['professor_id', 'name', 'email', 'rank', 'course_id'])
+        if insert_row('professors.csv', self.__dict__, ['professor_id', 'name', 'email', 'rank', 'course_id'], unique='professor_id') is None:
+            print("Professor ID already exists!")
+            return
         print("Professor Added Successfully!")
 
+    @classmethod
+    def bulk_add(cls, records):
+        """Add many professors (Professor objects or dicts) with one duplicate check and one write"""
+        fieldnames = ['professor_id', 'name', 'email', 'rank', 'course_id']
+        result = bulk_insert('professors.csv', 'professor_id', (_entity_row(cls, r, fieldnames) for r in records), fieldnames)
+        _print_bulk_result(result, "professors")
+        return result
+
     def delete_professor(self):
         """Delete a professor by email"""
-        professors = load_csv('professors.csv')
-        professors = [p for p in professors if p['email'] != self.email]
-        write_csv('professors.csv', professors, ['professor_id', 'name', 'email', 'rank', 'course_id'])
+        delete_rows('professors.csv', 'email', self.email)
         print(f"Professor {self.email} deleted successfully!")
 
     def modify_professor_details(self, new_name=None, new_rank=None, new_course_id=None):
         """Modify an existing professor's details"""
-        professors = load_csv('professors.csv')
-        professor_found = False
-
-        for prof in professors:
-            if prof['professor_id'] == self.professor_id:
-                if new_name:
-                    prof['name'] = new_name
-                if new_rank:
-                    prof['rank'] = new_rank
-                if new_course_id:
-                    prof['course_id'] = new_course_id
-                professor_found = True
-                break
+        changes = {}
+        if new_name:
+            changes['name'] = new_name
+        if new_rank:
+            changes['rank'] = new_rank
+        if new_course_id:
+            changes['course_id'] = new_course_id
 
-        if professor_found:
-            write_csv('professors.csv', professors, ['professor_id', 'name', 'email', 'rank', 'course_id'])
+        if update_row('professors.csv', 'professor_id', self.professor_id, changes) is not None:
             print("Professor details updated successfully!")
         else:
             print("Professor not found!")
 
+    @classmethod
+    def search_by_name(cls, text, limit=NAME_SEARCH_LIMIT):
+        """Return up to limit professor rows whose names best match text"""
+        return [dict(p) for _, p in name_search('professors', text, limit)]
+
     @classmethod
     def professors_details(cls):
         """Display all professors' details"""
-        professors = load_csv('professors.csv')
+        professors = load_table('professors.csv')
         if not professors:
             print("No professors found!")
         else:
             print("\n===== Professors Details =====")
-            for prof in professors:
-                print(f"ID: {prof['professor_id']} | Name: {prof['name']} | Email: {prof['email']} | Rank: {prof['rank']} | Course: {prof['course_id']}")
+            write_lines(f"ID: {prof['professor_id']} | Name: {prof['name']} | Email: {prof['email']} | Rank: {prof['rank']} | Course: {prof['course_id']}"
+                        for prof in professors)
+
+    def get_courses(self):
+        """Retrieve all courses this professor teaches"""
+        return [dict(c) for c in courses_of_professor(self.email)]
+
+    def get_students(self):
+        """Retrieve all students enrolled in this professor's courses"""
+        return [dict(s) for s in students_of_professor(self.email)]
 
     @classmethod
     def show_course_details_by_professor(cls, email):
         """Show course details for a given professor"""
-        professors = load_csv('professors.csv')
-        courses = load_csv('courses.csv')
-
-        professor = next((p for p in professors if p['email'] == email.lower()), None)
+        professor = table_cache.get('professors.csv').index('email', unique=False).get(email.lower())
         if not professor:
             print("Professor not found!")
             return
 
-        course = next((c for c in courses if c['course_id'] == professor['course_id']), None)
-        if course:
-            print(f"\nProfessor {professor['name']} teaches:\nCourse ID: {course['course_id']}, Course Name: {course['course_name']}, Description: {course['description']}")
+        courses = courses_of_professor(email)
+        if courses:
+            print(f"\nProfessor {professor['name']} teaches:")
+            for course in courses:
+                print(f"Course ID: {course['course_id']}, Course Name: {course['course_name']}, Description: {course['description']}")
         else:
             print("Course details not found!")
 
+    @classmethod
+    def display_students(cls, email):
+        """Display every student taught by a given professor"""
+        if table_cache.get('professors.csv').index('email', unique=False).get(email.lower()) is None:
+            print("Professor not found!")
+            return
+        students = students_of_professor(email)
+        if not students:
+            print("No students enrolled in this professor's courses.")
+            return
+        print(f"\n===== Students of {email.lower()} =====")
+        for s in students:
+            print(f"ID: {s['student_id']} | Name: {s['first_name']} {s['last_name']} | Email: {s['email']} | Course: {s['course_id']} | Grade: {s['grade']} | Marks: {s['marks']}")
+
+# =================== Grade Scale ===================
+
+def parse_marks_range(marks_range):
+    """Parse a marks range like '80-85' into (80.0, 85.0), or None if it is malformed"""
+    low, sep, high = (marks_range or '').partition('-')
+    low, high = parse_marks(low), parse_marks(high)
+    if not sep or low is None or high is None or low > high:
+        return None
+    return low, high
+
+class GradeScale:
+    """Marks intervals from grades.csv, sorted for bisect lookup from marks to grade"""
+
+    def __init__(self, grades):
+        self.problems = []
+        intervals = []
+        for g in grades:
+            bounds = parse_marks_range(g.get('marks_range'))
+            if bounds is None:
+                self.problems.append(f"Grade ID {g.get('grade_id')}: invalid marks range {g.get('marks_range')!r}")
+            else:
+                intervals.append((bounds[0], bounds[1], g.get('grade'), g.get('grade_id')))
+        intervals.sort()
+
+        for (low, high, _, grade_id), (next_low, _, _, next_id) in zip(intervals, intervals[1:]):
+            if next_low < high:
+                self.problems.append(f"Grade ID {grade_id} ({low:g}-{high:g}) overlaps grade ID {next_id} from {next_low:g}")
+            elif next_low > high:
+                self.problems.append(f"No grade covers marks between {high:g} and {next_low:g}")
+
+        self.intervals = intervals
+        self.lows = [low for low, _, _, _ in intervals]
+
+    def lookup(self, marks):
+        """Return the grade for marks, or None if no interval covers them
+
+        Intervals are half-open [low, high) so shared bounds like 70-80/80-85
+        are unambiguous; the highest interval also includes its upper bound.
+        """
+        marks = parse_marks(marks)
+        if marks is None:
+            return None
+        position = bisect.bisect_right(self.lows, marks) - 1
+        if position < 0:
+            return None
+        _, high, grade, _ = self.intervals[position]
+        if marks < high or (marks == high and position == len(self.intervals) - 1):
+            return grade
+        return None
+
+def regrade_students(students, scale):
+    """Reassign grades to the given student rows from their marks with one write; returns a summary"""
+    cache = {}
+    pending = []
+    ungraded = 0
+    for s in students:
+        marks = s['marks']
+        if marks not in cache:
+            cache[marks] = scale.lookup(marks)
+        grade = cache[marks]
+        if grade is None:
+            ungraded += 1
+        elif grade != s['grade']:
+            pending.append((s, {'grade': grade}))
+    update_student_rows(pending)
+    return {'checked': len(students), 'changed': len(pending), 'ungraded': ungraded}
+
 # =================== Grade Class ===================
+@instrument_class
 class Grade:
     def __init__(self, grade_id, grade, marks_range):
         self.grade_id = grade_id
         self.grade = grade
         self.marks_range = marks_range
 
+    @classmethod
+    def records(cls):
+        """Return every grade as a typed, slotted GradeRecord"""
+        return typed_records(table_cache.get('grades.csv'), GradeRecord)
+
     def add_grade(self):
         """Add a grade to the CSV file"""
-        grades = load_csv('grades.csv')
-        grades.append(self.__dict__)
-        write_csv('grades.csv', grades, ['grade_id', 'grade', 'marks_range'])
+        if insert_row('grades.csv', self.__dict__, ['grade_id', 'grade', 'marks_range'], unique='grade_id') is None:
+            print("Grade ID already exists!")
+            return False
+        return True
 
     def delete_grade(self):
         """Delete a grade based on grade_id"""
-        grades = load_csv('grades.csv')
-        grades = [g for g in grades if g['grade_id'] != self.grade_id]
-        write_csv('grades.csv', grades, ['grade_id', 'grade', 'marks_range'])
+        delete_rows('grades.csv', 'grade_id', self.grade_id)
 
     def modify_grade(self, new_grade, new_marks_range):
-        """Modify an existing grade"""
-        grades = load_csv('grades.csv')
-        for g in grades:
-            if g['grade_id'] == self.grade_id:
-                g['grade'] = new_grade
-                g['marks_range'] = new_marks_range
-                break
-        write_csv('grades.csv', grades, ['grade_id', 'grade', 'marks_range'])
+        """Modify an existing grade and regrade the students whose marks fall in its old or new range"""
+        return retry_on_conflict(self._modify_grade, new_grade, new_marks_range)
+
+    def _modify_grade(self, new_grade, new_marks_range):
+        # With writes being buffered (write-behind, the server) the change and the regrade join the pending
+        # edits, where a transaction would first save every one of them
+        with buffered_writes() if _active_buffer is not None else transaction():
+            old = table_cache.get('grades.csv').index('grade_id').get(self.grade_id)
+            old_range = parse_marks_range(old['marks_range']) if old else None
+            if update_row('grades.csv', 'grade_id', self.grade_id, {'grade': new_grade, 'marks_range': new_marks_range}) is None:
+                return None
+
+            scale = Grade.scale()
+            marks_index = students_table().range_index('marks')
+            affected = {}
+            for bounds in (old_range, parse_marks_range(new_marks_range)):
+                if bounds is not None:
+                    affected.update((id(s), s) for s in marks_index.between(*bounds))
+            return regrade_students(list(affected.values()), scale)
+
+    @classmethod
+    def scale(cls):
+        """Return the compiled grade scale, rebuilt only when grades.csv changes"""
+        grades = table_cache.get('grades.csv')
+        scale = grades.derived.get('scale')
+        if scale is None:
+            scale = grades.derived['scale'] = GradeScale(grades.rows)
+        return scale
+
+    @classmethod
+    def regrade_all(cls):
+        """Reassign every student's grade from their marks in one pass and one write"""
+        def regrade():
+            with transaction():
+                return regrade_students(students_table().rows, cls.scale())
+        return retry_on_conflict(regrade)
 
     @classmethod
     def display_grade_report(cls):
         """Display all grades in the system"""
-        grades = load_csv('grades.csv')
+        grades = load_table('grades.csv')
         if not grades:
             print("No grades found!")
         else:
@@ -305,74 +3412,766 @@ class Grade:
                 print(f"Grade ID: {g['grade_id']} | Grade: {g['grade']} | Marks Range: {g['marks_range']}")
 
 
+# =================== Authentication ===================
+
+SESSION_TTL = 30 * 60        # seconds an unused session token stays valid
+SESSION_MAX = 10_000         # sessions kept; the least recently used are dropped beyond this
+
+class SessionCache:
+    """In-process session tokens, so repeat authenticated actions skip the password hash"""
+
+    def __init__(self, ttl=SESSION_TTL, max_sessions=SESSION_MAX):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()   # token -> [email, role, expiry]
+
+    def open(self, email, role):
+        """Start a session and return its token"""
+        token = secrets.token_urlsafe(32)
+        self._sessions[token] = [email, role, time.monotonic() + self.ttl]
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        return token
+
+    def check(self, token):
+        """Return (email, role) of a live session, extending it, or None"""
+        session = self._sessions.get(token or '')
+        if session is None:
+            return None
+        now = time.monotonic()
+        if session[2] < now:
+            del self._sessions[token]
+            return None
+        session[2] = now + self.ttl
+        self._sessions.move_to_end(token)
+        return session[0], session[1]
+
+    def close(self, token):
+        self._sessions.pop(token, None)
+
+    def close_user(self, email, keep=None):
+        """End every session of a user except keep (e.g. after a password change)"""
+        for token in [t for t, s in self._sessions.items() if s[0] == email and t != keep]:
+            del self._sessions[token]
+
+    def __len__(self):
+        return len(self._sessions)
+
+sessions = SessionCache()
+_dummy_hashes = {}
+
+def credential(email):
+    """The login row for email through the credential index, without loading login.csv when it is cold"""
+    table = table_cache.peek('login.csv')
+    if table is None:
+        matches = storage.lookup(os.path.abspath('login.csv'), 'email', email)
+        if matches is not None:
+            return matches[0] if matches else None
+        table = table_cache.get('login.csv')
+    return table.index('email').get(email)
+
+# Password work is written as steps: generators that yield each (hash function, arguments) and get its
+# result back, so the HTTP server can hash in a worker thread while table access stays on its event loop
+
+def run_steps(steps):
+    """Run password steps to their result, hashing in this thread"""
+    try:
+        call = next(steps)
+        while True:
+            func, args = call
+            call = steps.send(func(*args))
+    except StopIteration as stop:
+        return stop.value
+
+async def run_steps_async(steps):
+    """Run password steps to their result, hashing in the loop's default executor"""
+    loop = asyncio.get_running_loop()
+    try:
+        call = next(steps)
+        while True:
+            func, args = call
+            call = steps.send(await loop.run_in_executor(None, func, *args))
+    except StopIteration as stop:
+        return stop.value
+
+def authenticate_steps(email, password):
+    """Steps of authenticate()"""
+    email = email.lower()
+    user = credential(email)
+    if user is None:
+        # Hash anyway, so the response time does not tell which emails are registered
+        key = (PASSWORD_SCHEME, password_cost())
+        if key not in _dummy_hashes:
+            _dummy_hashes[key] = yield encrypt_password, ('',)
+        yield decrypt_password, (_dummy_hashes[key], password)
+        return None
+    stored = user['password']
+    if not (yield decrypt_password, (stored, password)):
+        return None
+    if needs_rehash(stored):
+        upgraded = yield encrypt_password, (password,)
+        # Unless the password was changed while this login was hashing
+        current = credential(email)
+        if current is not None and current['password'] == stored:
+            update_row('login.csv', 'email', email, {'password': upgraded})
+    return user
+
+def authenticate(email, password):
+    """Return the login row if password is right, upgrading a legacy or weaker hash; None otherwise"""
+    return run_steps(authenticate_steps(email, password))
+
+def login_session(email, password):
+    """Authenticate and open a session; returns its token, or None for a wrong email or password"""
+    user = authenticate(email, password)
+    return sessions.open(user['email'], user['role']) if user is not None else None
+
 # =================== Login Class ===================
 
+@instrument_class
 class LoginUser:
     def __init__(self, email, password, role):
         self.email = email.lower()
-        self.password = encrypt_password(password)  # Store encrypted password
+        self.password = password  # Plain text until register_user hashes it; never stored as given
         self.role = role
+        self.session = None
 
     def register_user(self):
-        """Registers a new user and stores encrypted password in CSV"""
-        users = load_csv('login.csv')
-
-        for user in users:
-            if user['email'] == self.email:
-                print("User already exists!")
-                return
-
-        users.append({'email': self.email, 'password': self.password, 'role': self.role})
-        write_csv('login.csv', users, ['email', 'password', 'role'])
+        """Registers a new user and stores a salted hash of the password in CSV"""
+        if insert_row('login.csv', {'email': self.email, 'password': encrypt_password(self.password), 'role': self.role},
+                      ['email', 'password', 'role'], unique='email') is None:
+            print("User already exists!")
+            return
         print("User Registered Successfully!")
 
     def login(self):
-        """Authenticate user by checking email and password"""
-        users = load_csv('login.csv')
-        for user in users:
-            if user['email'] == self.email and decrypt_password(user['password'], self.password):
-                print(f"Login Successful! Welcome, {self.email}")
-                return True
-        print("Invalid email or password!")
-        return False
+        """Authenticate user by checking email and password, and start a session"""
+        self.session = login_session(self.email, self.password)
+        if self.session is None:
+            print("Invalid email or password!")
+            return False
+        self.role = sessions.check(self.session)[1]
+        print(f"Login Successful! Welcome, {self.email}")
+        return True
 
     def logout(self):
-        """Simulate user logout"""
+        """End the user's session"""
+        sessions.close(self.session)
+        self.session = None
         print(f"{self.email} has logged out.")
 
     def change_password(self, new_password):
-        """Change the password for an existing user"""
-        users = load_csv('login.csv')
-        user_found = False
-
-        for user in users:
-            if user['email'] == self.email:
-                user['password'] = encrypt_password(new_password)
-                user_found = True
-                break
-
-        if user_found:
-            write_csv('login.csv', users, ['email', 'password', 'role'])
+        """Change the password of the logged-in user and end their other sessions"""
+        if sessions.check(self.session) is None:
+            print("Session expired! Please log in again.")
+            return
+        if update_row('login.csv', 'email', self.email, {'password': encrypt_password(new_password)}) is not None:
+            sessions.close_user(self.email, keep=self.session)
             print("Password changed successfully!")
         else:
             print("User not found!")
 
     @staticmethod
     def encrypt_password(password):
-        """Encrypt password using SHA256"""
-        return hashlib.sha256(password.encode()).hexdigest()
+        """Salted PBKDF2 (or scrypt) hash of password"""
+        return encrypt_password(password)
 
     @staticmethod
     def decrypt_password(encrypted_password, original_password):
-        """Simulated password decryption (checking hash match)"""
-        return encrypt_password(original_password) == encrypted_password
+        """Check a password against its stored hash"""
+        return decrypt_password(encrypted_password, original_password)
+
+# =================== Batch Mode ===================
+
+BATCH_FLUSH_EVERY = 0   # 0 = commit once at the end of the batch
+
+def _changes(args, columns):
+    """Non-empty new values for columns, the way the menus treat blank answers as 'no change'"""
+    return {c: args[c] for c in columns if args.get(c)}
+
+def _added(row, what):
+    return {'ok': True} if row is not None else {'ok': False, 'error': f"{what} already exists"}
+
+def _updated(row, what):
+    return {'ok': True} if row is not None else {'ok': False, 'error': f"{what} not found"}
+
+def _deleted(rows):
+    return {'ok': True, 'deleted': len(rows)}
+
+def _batch_add_student(args):
+    fieldnames = ['student_id', 'first_name', 'last_name', 'email', 'course_id', 'grade', 'marks']
+    return _added(insert_student(_entity_row(Student, args, fieldnames)), "Student ID")
+
+def _batch_update_student(args):
+    changes = _changes(args, ['first_name', 'last_name', 'course_id', 'grade', 'marks'])
+    return _updated(update_student(args['student_id'], changes), "Student")
+
+def _batch_delete_student(args):
+    if args.get('student_id'):
+        return _deleted(delete_student('student_id', args['student_id']))
+    if args.get('email'):
+        return _deleted(delete_student('email', args['email']))
+    return {'ok': False, 'error': "missing student_id or email"}
+
+def _batch_get_student(args):
+    student = Student.search(args['email'])
+    if student is None:
+        return {'ok': False, 'error': "Student not found"}
+    return {'ok': True, 'student': student.__dict__}
+
+def _batch_class_rank(args):
+    student = Student.search(args['email'])
+    standing = student.class_rank() if student else None
+    if standing is None:
+        return {'ok': False, 'error': "Student not found" if student is None else "Student has no numeric marks"}
+    rank, size, percentile = standing
+    return {'ok': True, 'rank': rank, 'size': size, 'percentile': percentile}
+
+def _batch_list_students(args):
+    limit = int(args['limit']) if args.get('limit') else None
+    descending = args.get('descending', '').lower() in ('1', 'true', 'yes', 'desc')
+    return {'ok': True, 'students': [dict(s) for s in Student.sorted_records(args.get('by') or 'marks', descending, limit)]}
+
+def _batch_query(args):
+    limit = int(args['limit']) if args.get('limit') else None
+    offset = int(args['offset']) if args.get('offset') else 0
+    rows = query(args['table'], args.get('where', ''), args.get('fields'), args.get('order'), limit, offset)
+    return {'ok': True, 'rows': list(rows)}
+
+def _batch_name_search(args):
+    limit = int(args['limit']) if args.get('limit') else NAME_SEARCH_LIMIT
+    matches = name_search(args['table'], args['name'], limit)
+    return {'ok': True, 'rows': [dict(row, score=round(score, 3)) for score, row in matches]}
+
+def _batch_add_course(args):
+    fieldnames = ['course_id', 'course_name', 'credits', 'description']
+    return _added(insert_row('courses.csv', _entity_row(Course, args, fieldnames), fieldnames, unique='course_id'), "Course ID")
+
+def _batch_delete_course(args):
+    return _deleted(delete_rows('courses.csv', 'course_id', args['course_id']))
+
+def _batch_course_median(args):
+    median = table_cache.get(students_file(args['course_id'])).ranking('course_id', 'marks').median(args['course_id'])
+    if median is None:
+        return {'ok': False, 'error': "No students with marks in this course"}
+    return {'ok': True, 'median': median}
+
+def _batch_course_statistics(args):
+    report = Course.statistics()
+    if args.get('course_id'):
+        report = {c: s for c, s in report.items() if c == args['course_id']}
+    return {'ok': True, 'courses': report}
+
+def _batch_course_roster(args):
+    roster = course_roster(args['course_id'])
+    if roster['course'] is None and not roster['students']:
+        return {'ok': False, 'error': "Course not found"}
+    return {'ok': True, 'course': dict(roster['course']) if roster['course'] else None,
+            'professors': [dict(p) for p in roster['professors']], 'students': [dict(s) for s in roster['students']]}
+
+def _batch_professor_students(args):
+    if table_cache.get('professors.csv').index('email', unique=False).get(args['email'].lower()) is None:
+        return {'ok': False, 'error': "Professor not found"}
+    return {'ok': True, 'courses': [dict(c) for c in courses_of_professor(args['email'])],
+            'students': [dict(s) for s in students_of_professor(args['email'])]}
+
+def _batch_orphans(args):
+    orphans = find_orphans()
+    return {'ok': True, 'students': [dict(s) for s in orphans['students']], 'professors': [dict(p) for p in orphans['professors']]}
+
+def _batch_add_professor(args):
+    fieldnames = ['professor_id', 'name', 'email', 'rank', 'course_id']
+    return _added(insert_row('professors.csv', _entity_row(Professor, args, fieldnames), fieldnames, unique='professor_id'), "Professor ID")
+
+def _batch_update_professor(args):
+    changes = _changes(args, ['name', 'rank', 'course_id'])
+    return _updated(update_row('professors.csv', 'professor_id', args['professor_id'], changes), "Professor")
+
+def _batch_delete_professor(args):
+    return _deleted(delete_rows('professors.csv', 'email', args['email'].lower()))
+
+def _batch_add_grade(args):
+    fieldnames = ['grade_id', 'grade', 'marks_range']
+    return _added(insert_row('grades.csv', _entity_row(Grade, args, fieldnames), fieldnames, unique='grade_id'), "Grade ID")
+
+def _batch_update_grade(args):
+    regraded = Grade(args['grade_id'], "", "").modify_grade(args['grade'], args['marks_range'])
+    if regraded is None:
+        return {'ok': False, 'error': "Grade not found"}
+    return {'ok': True, 'regraded': regraded}
+
+def _batch_delete_grade(args):
+    return _deleted(delete_rows('grades.csv', 'grade_id', args['grade_id']))
+
+def _batch_grade_report(args):
+    return {'ok': True, 'grades': [dict(g) for g in load_table('grades.csv')]}
+
+def _batch_regrade(args):
+    return {'ok': True, 'regraded': Grade.regrade_all()}
+
+def _batch_register(args):
+    password = yield encrypt_password, (args['password'],)
+    row = {'email': args['email'].lower(), 'password': password, 'role': args['role']}
+    return _added(insert_row('login.csv', row, ['email', 'password', 'role'], unique='email'), "User")
+
+def _check_password(args):
+    """A live session token for the email skips the password hash; otherwise the password is checked"""
+    session = sessions.check(args.get('token'))
+    if session is not None:
+        return session[0] == args['email'].lower()
+    if not args.get('password'):
+        return False
+    return (yield from authenticate_steps(args['email'], args['password'])) is not None
+
+def _batch_login(args):
+    user = yield from authenticate_steps(args['email'], args['password'])
+    if user is None:
+        return {'ok': False, 'error': "Invalid email or password"}
+    return {'ok': True, 'token': sessions.open(user['email'], user['role'])}
+
+def _batch_logout(args):
+    sessions.close(args['token'])
+    return {'ok': True}
+
+def _batch_change_password(args):
+    if not (yield from _check_password(args)):
+        return {'ok': False, 'error': "Invalid email, password or session"}
+    email = args['email'].lower()
+    password = yield encrypt_password, (args['new_password'],)
+    update_row('login.csv', 'email', email, {'password': password})
+    sessions.close_user(email, keep=args.get('token'))
+    return {'ok': True}
+
+# Operation name -> (handler, required arguments, optional arguments)
+BATCH_OPERATIONS = {
+    'add_student': (_batch_add_student, ['student_id'], ['first_name', 'last_name', 'email', 'course_id', 'grade', 'marks']),
+    'update_student': (_batch_update_student, ['student_id'], ['first_name', 'last_name', 'course_id', 'grade', 'marks']),
+    'delete_student': (_batch_delete_student, [], ['student_id', 'email']),
+    'get_student': (_batch_get_student, ['email'], []),
+    'class_rank': (_batch_class_rank, ['email'], []),
+    'list_students': (_batch_list_students, [], ['by', 'descending', 'limit']),
+    'query': (_batch_query, ['table'], ['where', 'fields', 'order', 'limit', 'offset']),
+    'name_search': (_batch_name_search, ['table', 'name'], ['limit']),
+    'add_course': (_batch_add_course, ['course_id'], ['course_name', 'credits', 'description']),
+    'delete_course': (_batch_delete_course, ['course_id'], []),
+    'course_median': (_batch_course_median, ['course_id'], []),
+    'course_statistics': (_batch_course_statistics, [], ['course_id']),
+    'course_roster': (_batch_course_roster, ['course_id'], []),
+    'add_professor': (_batch_add_professor, ['professor_id'], ['name', 'email', 'rank', 'course_id']),
+    'update_professor': (_batch_update_professor, ['professor_id'], ['name', 'rank', 'course_id']),
+    'delete_professor': (_batch_delete_professor, ['email'], []),
+    'professor_students': (_batch_professor_students, ['email'], []),
+    'orphans': (_batch_orphans, [], []),
+    'add_grade': (_batch_add_grade, ['grade_id', 'grade', 'marks_range'], []),
+    'update_grade': (_batch_update_grade, ['grade_id', 'grade', 'marks_range'], []),
+    'delete_grade': (_batch_delete_grade, ['grade_id'], []),
+    'grade_report': (_batch_grade_report, [], []),
+    'regrade': (_batch_regrade, [], []),
+    'register': (_batch_register, ['email', 'password', 'role'], []),
+    'login': (_batch_login, ['email', 'password'], []),
+    'logout': (_batch_logout, ['token'], []),
+    'change_password': (_batch_change_password, ['email', 'new_password'], ['password', 'token']),
+}
+# Operations whose handlers are password steps (see run_steps)
+PASSWORD_OPERATIONS = {'register', 'login', 'change_password'}
+# Operations that change no records, so they may use GET (login and logout stay POST-only: they carry
+# credentials that must not end up in URLs, and a login may upgrade its password hash)
+READ_OPERATIONS = {'get_student', 'class_rank', 'list_students', 'query', 'name_search', 'course_median',
+                   'course_statistics', 'course_roster', 'professor_students', 'orphans', 'grade_report'}
+
+def _prepare_operation(op):
+    """Return (handler, args) for one operation dict, or (None, error result)"""
+    name = op.get('op')
+    if name not in BATCH_OPERATIONS:
+        return None, {'op': name, 'ok': False, 'error': f"unknown operation {name!r}"}
+    handler, required, optional = BATCH_OPERATIONS[name]
+    args = {k: '' if v is None else str(v) for k, v in op.items() if k != 'op'}
+    problems = [f"missing {a}" for a in required if not args.get(a)]
+    problems += [f"unexpected {a}" for a in sorted(set(args) - set(required) - set(optional))]
+    if problems:
+        return None, {'op': name, 'ok': False, 'error': ', '.join(problems)}
+    return handler, args
+
+def apply_operation(op):
+    """Apply one operation dict ({'op': name, ...arguments}) and return its result dict"""
+    handler, args = _prepare_operation(op)
+    if handler is None:
+        return args
+    try:
+        result = handler(args)
+        if op['op'] in PASSWORD_OPERATIONS:
+            result = run_steps(result)
+    except (ValueError, KeyError) as e:
+        result = {'ok': False, 'error': str(e)}
+    return dict({'op': op['op']}, **result)
+
+async def apply_operation_async(op):
+    """apply_operation for an event loop: password hashing runs in a worker thread, so other requests go on"""
+    if op.get('op') not in PASSWORD_OPERATIONS:
+        return apply_operation(op)
+    handler, args = _prepare_operation(op)
+    if handler is None:
+        return args
+    try:
+        result = await run_steps_async(handler(args))
+    except (ValueError, KeyError) as e:
+        result = {'ok': False, 'error': str(e)}
+    return dict({'op': op['op']}, **result)
+
+def _apply_lines(chunk):
+    """Apply a chunk of (line number, JSON text) operations in one transaction"""
+    results = []
+    with transaction():
+        for number, line in chunk:
+            try:
+                op = json.loads(line)
+                if not isinstance(op, dict):
+                    raise ValueError("expected a JSON object")
+            except ValueError as e:
+                result = {'op': None, 'ok': False, 'error': f"invalid JSON: {e}"}
+            else:
+                result = apply_operation(op)
+            result['line'] = number
+            results.append(result)
+    return results
+
+def run_batch(lines, output, flush_every=None):
+    """Apply JSON-lines operations against one in-memory copy of each table, committing every flush_every ops
+
+    Results are written to output as JSON lines once their chunk has been
+    committed; a chunk that loses a race with another process is re-run.
+    """
+    flush_every = BATCH_FLUSH_EVERY if flush_every is None else flush_every
+    summary = {'ops': 0, 'ok': 0, 'failed': 0, 'flushes': 0}
+    chunk = []
+
+    def flush():
+        results = retry_on_conflict(_apply_lines, chunk)
+        output.write(''.join(json.dumps(r) + '\n' for r in results))
+        output.flush()
+        summary['ops'] += len(results)
+        summary['ok'] += sum(1 for r in results if r['ok'])
+        summary['failed'] += sum(1 for r in results if not r['ok'])
+        summary['flushes'] += 1
+        chunk.clear()
+
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        chunk.append((number, line))
+        if flush_every and len(chunk) >= flush_every:
+            flush()
+    if chunk:
+        flush()
+    return summary
+
+# =================== HTTP Service ===================
+
+SERVER_FLUSH_INTERVAL = 0.05
+SERVER_FLUSH_MAX_OPS = 1000
+HTTP_STATUS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+               413: 'Payload Too Large', 500: 'Internal Server Error'}
+MAX_BODY_BYTES = 1024 * 1024
+
+class GradeServer:
+    """Small HTTP/1.1 JSON service over resident tables
+
+    GET  /api/<op>?arg=value   read-only operations (READ_OPERATIONS)
+    POST /api/<op>             any operation, arguments as a JSON object
+    GET  /health               cache, buffer and request counters
+
+    Writes are applied to the in-memory tables at once (later reads see
+    them) and acknowledged after the periodic flush that persists them,
+    so concurrent writers share one append per table.
+    """
+
+    def __init__(self, host='127.0.0.1', port=8000, flush_interval=SERVER_FLUSH_INTERVAL, flush_max_ops=SERVER_FLUSH_MAX_OPS):
+        self.host = host
+        self.port = port
+        self.flush_interval = flush_interval
+        self.flush_max_ops = flush_max_ops
+        self.buffer = WriteBuffer()
+        self.requests = 0
+        self._waiters = []
+        self._wake = None
+        self._server = None
+        self._flusher = None
+
+    async def start(self):
+        global _active_buffer
+        # Resident tables: no LRU eviction, and lookup indexes built before the first request
+        self._cache_max_bytes, table_cache.max_bytes = table_cache.max_bytes, sys.maxsize
+        for file_name in DATA_FILES:
+            table_cache.get(file_name)
+        students = table_cache.get(SHARD_DIRECTORY if students_sharded() else 'students.csv')
+        students.index('email')
+        students.index('student_id')
+        students_table().name_index(NAME_COLUMNS['students'])
+        _active_buffer = self.buffer
+        self._wake = asyncio.Event()
+        self._flusher = asyncio.ensure_future(self._flush_loop())
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def close(self):
+        global _active_buffer
+        self._server.close()
+        await self._server.wait_closed()
+        self._flusher.cancel()
+        try:
+            self._flush()
+        finally:
+            _active_buffer = None
+            table_cache.max_bytes = self._cache_max_bytes
+
+    async def serve_forever(self):
+        await self.start()
+        print(f"Serving on http://{self.host}:{self.port}", file=sys.stderr)
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.close()
+
+    def _flush(self):
+        """Persist buffered writes and release the requests that were waiting for them"""
+        waiters, self._waiters = self._waiters, []
+        try:
+            self.buffer.flush()
+        except Exception as e:
+            for waiter in waiters:
+                waiter.set_exception(e)
+            raise
+        for waiter in waiters:
+            waiter.set_result(None)
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if self._waiters or self.buffer.pending:
+                try:
+                    self._flush()
+                except Exception as e:
+                    print(f"Flush failed: {e}", file=sys.stderr)
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, version = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length') or 0)
+                if length > MAX_BODY_BYTES:
+                    status, payload = 413, {'ok': False, 'error': "request body too large"}
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length) if length else b''
+                    status, payload = await self.dispatch(method, target, body)
+                    keep_alive = headers.get('connection', '').lower() != 'close' and version.strip() == 'HTTP/1.1'
+                data = json.dumps(payload).encode()
+                head = f"HTTP/1.1 {status} {HTTP_STATUS[status]}\r\nContent-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                if not keep_alive:
+                    head += "Connection: close\r\n"
+                writer.write((head + "\r\n").encode() + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, method, target, body):
+        """Route one request; returns (HTTP status, JSON payload)"""
+        self.requests += 1
+        path, _, query = target.partition('?')
+        if path == '/health':
+            return 200, {'ok': True, 'requests': self.requests, 'pending_writes': self.buffer.pending,
+                         'flushes': self.buffer.flushes, 'cache': table_cache.stats()}
+        if not path.startswith('/api/'):
+            return 404, {'ok': False, 'error': f"no route {path}"}
+
+        name = path[len('/api/'):]
+        if name not in BATCH_OPERATIONS:
+            return 404, {'ok': False, 'error': f"unknown operation {name!r}"}
+        if method == 'GET':
+            if name not in READ_OPERATIONS:
+                return 405, {'ok': False, 'error': f"{name} changes data; use POST"}
+            op = dict(urllib.parse.parse_qsl(query))
+        elif method == 'POST':
+            try:
+                op = json.loads(body or b'{}')
+            except ValueError as e:
+                return 400, {'ok': False, 'error': f"invalid JSON: {e}"}
+            if not isinstance(op, dict):
+                return 400, {'ok': False, 'error': "expected a JSON object"}
+        else:
+            return 405, {'ok': False, 'error': f"method {method} not allowed"}
+
+        op['op'] = name
+        added = self.buffer.added
+        try:
+            result = await apply_operation_async(op)
+        except Exception as e:
+            return 500, {'op': name, 'ok': False, 'error': str(e)}
+        if self.buffer.added != added:
+            # Acknowledge a write only once it is on disk
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            if self.buffer.pending >= self.flush_max_ops:
+                self._wake.set()
+            try:
+                await waiter
+            except Exception as e:
+                return 500, {'op': name, 'ok': False, 'error': f"flush failed: {e}"}
+        return (200 if result['ok'] else 400), result
+
+def serve(host='127.0.0.1', port=8000, flush_interval=SERVER_FLUSH_INTERVAL):
+    """Run the HTTP service until interrupted"""
+    try:
+        asyncio.run(GradeServer(host, port, flush_interval).serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+# =================== Command Line ===================
+
+def build_parser():
+    """Argument parser: no command runs the interactive menu"""
+    parser = argparse.ArgumentParser(prog='checkmygrade.py', description="CheckMyGrade student records")
+    parser.add_argument('--metrics', metavar='FILE', help="record timings and I/O counters, written to FILE as JSON on exit")
+    parser.add_argument('--profile', metavar='FILE',
+                        help="save a cProfile capture of the command (or the first menu operation) to FILE")
+    parser.add_argument('--write-behind', action='store_true', default=WRITE_BEHIND,
+                        help="menu only: hold edits in memory and save changed files every few seconds, "
+                             "after many edits, on Save and on exit")
+    commands = parser.add_subparsers(dest='command', metavar='command')
+
+    batch = commands.add_parser('batch', help="apply a JSON-lines file of operations ('-' for stdin)")
+    batch.add_argument('file')
+    batch.add_argument('--flush-every', type=int, default=BATCH_FLUSH_EVERY, metavar='N',
+                       help="commit every N operations (default: once at the end)")
+    batch.add_argument('--output', default='-', help="where to write JSON-lines results (default: stdout)")
+
+    imports = commands.add_parser('import', help="bulk-add students, courses or professors from a CSV file")
+    imports.add_argument('entity', choices=['students', 'courses', 'professors'])
+    imports.add_argument('file')
+
+    commands.add_parser('compact', help="fold delta logs back into the CSV files")
+    cost = commands.add_parser('password-cost', help="time the password hash here and suggest a cost setting")
+    cost.add_argument('--target', type=float, default=PASSWORD_TARGET_SECONDS, metavar='SECONDS',
+                      help="how long one login's password check should take")
+    cost.add_argument('--scheme', choices=sorted(DEFAULT_PASSWORD_COSTS), default=PASSWORD_SCHEME)
+
+    commands.add_parser('shard', help=f"split students.csv into one file per course under {SHARD_DIR}")
+    commands.add_parser('unshard', help=f"merge the {SHARD_DIR} files back into students.csv")
+
+    server = commands.add_parser('serve', help="run the HTTP/JSON service")
+    server.add_argument('--host', default='127.0.0.1')
+    server.add_argument('--port', type=int, default=8000)
+    server.add_argument('--flush-interval', type=float, default=SERVER_FLUSH_INTERVAL, metavar='SECONDS',
+                        help="how often buffered writes are flushed to disk")
+
+    for name, (_, required, optional) in BATCH_OPERATIONS.items():
+        command = commands.add_parser(name, help=f"run a single {name} operation")
+        for argument in required + optional:
+            command.add_argument('--' + argument.replace('_', '-'), dest=argument, required=argument in required)
+    return parser
+
+@contextmanager
+def _open_stream(file_name, mode):
+    if file_name == '-':
+        yield sys.stdin if 'r' in mode else sys.stdout
+    else:
+        with open(file_name, mode=mode) as file:
+            yield file
+
+def run_command(args):
+    """Run a parsed non-interactive command; returns the process exit status"""
+    if args.command == 'batch':
+        with _open_stream(args.file, 'r') as lines, _open_stream(args.output, 'w') as output:
+            summary = run_batch(lines, output, args.flush_every)
+        print(json.dumps(summary), file=sys.stderr)
+        return 0 if summary['failed'] == 0 else 1
+
+    if args.command == 'import':
+        importers = {'students': Student, 'courses': Course, 'professors': Professor}
+        result = importers[args.entity].bulk_add(iter_csv(args.file))
+        for position, row, reason in result['rejected']:
+            print(f"Rejected row {position}: {reason} {row}", file=sys.stderr)
+        return 0
+
+    if args.command == 'serve':
+        serve(args.host, args.port, args.flush_interval)
+        return 0
+
+    if args.command == 'compact':
+        for file_name in table_files():
+            if compact_table(file_name):
+                print(f"Compacted {file_name}")
+        return 0
+
+    if args.command == 'password-cost':
+        cost = calibrate_password_cost(args.target, args.scheme)
+        print(f"{args.scheme} cost {cost} takes about {args.target}s per password check on this machine")
+        print(f"export CHECKMYGRADE_PASSWORD_SCHEME={args.scheme} CHECKMYGRADE_PASSWORD_COST={cost}")
+        return 0
+
+    if args.command in ('shard', 'unshard'):
+        try:
+            if args.command == 'shard':
+                print(f"Sharded students into {shard_students()} course files under {SHARD_DIR}")
+            else:
+                print(f"Merged {unshard_students()} students back into students.csv")
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            return 1
+        return 0
+
+    op = {k: v for k, v in vars(args).items() if k not in ('command', 'metrics', 'profile', 'write_behind') and v is not None}
+    result = apply_operation(dict(op, op=args.command))
+    print(json.dumps(result))
+    return 0 if result['ok'] else 1
 
 # =================== Main Function ===================
 
-def main():
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.metrics:
+        metrics.output = args.metrics
+        metrics.enable()
+    if args.command is not None:
+        if args.profile:
+            return profile_call(args.profile, run_command, args)
+        return run_command(args)
+    if args.profile:
+        metrics.profile_next(args.profile)
+    if args.write_behind:
+        write_behind.start()
+    try:
+        run_menu()
+    finally:
+        write_behind.stop()
+    return 0
+
+def run_menu():
     logged_in_user = None
 
     while True:
+        if write_behind.active:
+            write_behind.idle()
+            if write_behind.pending:
+                print(f"\n({write_behind.pending} unsaved changes in {', '.join(write_behind.dirty_files())})")
         print("\n===== CheckMyGrade Application =====")
         print("1. Student Management")
         print("2. Course Management")
@@ -380,7 +4179,11 @@ def main():
         print("4. Grade Management")
         print("5. User Login Management")
         print("6. Exit")
+        print("7. Data Maintenance")
+        print("8. Diagnostics")
+        print("9. Query Records")
         choice = input("Enter choice: ")
+        write_behind.busy = True
 
         if choice == '1':  # Student Management
             print("\n--- Student Management ---")
@@ -392,6 +4195,8 @@ def main():
             print("6. Sort Students by Marks or Email")
             print("7. Check Student Grades")
             print("8. Check Student Marks")
+            print("9. Class Rank / Percentile")
+            print("10. Search Students by Name")
             student_choice = input("Enter choice: ")
             
             #add new student
@@ -441,36 +4246,58 @@ def main():
                     print("Student not found!")
 
             elif student_choice == '6':  #Sort Students by Marks or Email
-                sort_by = input("Sort by (marks/email): ").strip().lower()
-                if sort_by in ["marks", "email"]:
-                    Student.display_sorted(by=sort_by)
+                sort_by = input("Sort by (marks/email, or keys like course_id,-marks): ").strip().lower()
+                order = input("Order (asc/desc, default asc): ").strip().lower()
+                limit = input("Show only the first N (leave blank for all): ").strip()
+                if not limit or limit.isdigit():
+                    Student.display_sorted(by=sort_by or "marks", descending=(order == "desc"), limit=int(limit) if limit else None)
                 else:
-                    print("Invalid sorting option! Choose 'marks' or 'email'.")
+                    print("Invalid number! Please enter a whole number.")
 
             elif student_choice == '7':  #Check Student Grades
                 email = input("Enter Student Email: ")
-                students = load_csv('students.csv')
-                student = next((s for s in students if s['email'] == email), None)
+                student = Student.search(email)
                 if student:
-                    print(f"Student {student['first_name']} {student['last_name']} has a grade of {student['grade']}.")
+                    student.check_my_grades()
                 else:
                     print("Student not found!")
 
             elif student_choice == '8':  #Check Student Marks
                 email = input("Enter Student Email: ")
-                students = load_csv('students.csv')
-                student = next((s for s in students if s['email'] == email), None)
+                student = Student.search(email)
                 if student:
-                    print(f"Student {student['first_name']} {student['last_name']} has {student['marks']} marks.")
+                    student.check_my_marks()
+                else:
+                    print("Student not found!")
+
+            elif student_choice == '9':  #Class Rank / Percentile
+                email = input("Enter Student Email: ")
+                student = Student.search(email)
+                standing = student.class_rank() if student else None
+                if standing:
+                    rank, size, percentile = standing
+                    print(f"Student {student.first_name} {student.last_name} ranks {rank} of {size} in {student.course_id} "
+                          f"(percentile {percentile:.1f}).")
+                elif student:
+                    print("Student has no numeric marks to rank.")
                 else:
                     print("Student not found!")
 
+            elif student_choice == '10':  #Search Students by Name
+                students = Student.search_by_name(input("Enter name or the start of it (e.g. Jon Smi): "))
+                if not students:
+                    print("No matching students found!")
+                for s in students:
+                    print(f"ID: {s['student_id']} | Name: {s['first_name']} {s['last_name']} | Email: {s['email']} | Course: {s['course_id']}")
+
         elif choice == '2':  # Course Management
             print("\n--- Course Management ---")
             print("1. Add New Course")
             print("2. Delete Course")
             print("3. Display All Courses")
             print("4. Median Score for a Course")
+            print("5. Statistics for All Courses")
+            print("6. Course Roster with Instructor")
             course_choice = input("Enter choice: ")
 
             if course_choice == '1':  # Add new course
@@ -496,6 +4323,12 @@ def main():
                  median_score = course.get_median_score()
                  print(f"Median Score for Course {course_id}: {median_score:.2f}")
 
+            elif course_choice == '5':
+                Course.display_statistics()
+
+            elif course_choice == '6':
+                Course.display_roster(input("Enter Course ID: "))
+
             else:
                print("Invalid choice! Please enter a valid option.")
 
@@ -506,6 +4339,8 @@ def main():
             print("3. Modify Professor Details")
             print("4. View All Professors")
             print("5. Show Courses Taught by a Professor")
+            print("6. Show Students of a Professor")
+            print("7. Search Professors by Name")
             prof_choice = input("Enter choice: ")
 
             if prof_choice == '1':  # Add new professor
@@ -542,6 +4377,16 @@ def main():
                 email = input("Enter Professor Email: ")
                 Professor.show_course_details_by_professor(email)
 
+            elif prof_choice == '6':  # Show students taught by a professor
+                Professor.display_students(input("Enter Professor Email: "))
+
+            elif prof_choice == '7':  # Search professors by name
+                professors = Professor.search_by_name(input("Enter name or the start of it: "))
+                if not professors:
+                    print("No matching professors found!")
+                for prof in professors:
+                    print(f"ID: {prof['professor_id']} | Name: {prof['name']} | Email: {prof['email']} | Course: {prof['course_id']}")
+
             else:
                 print("Invalid Choice! Please Try Again.")
 
@@ -552,6 +4397,8 @@ def main():
             print("2. Delete Grade")
             print("3. Modify Grade")
             print("4. Display Grade Report")
+            print("5. Validate Grade Ranges")
+            print("6. Regrade All Students from Marks")
             grade_choice = input("Enter choice: ")
 
             if grade_choice == '1':
@@ -560,8 +4407,8 @@ def main():
                     input("Grade: "),
                     input("Marks Range: ")
                 )
-                grade.add_grade()
-                print("Grade Added Successfully!")
+                if grade.add_grade():
+                    print("Grade Added Successfully!")
 
             elif grade_choice == '2':
                 grade_id = input("Enter Grade ID to delete: ")
@@ -574,12 +4421,28 @@ def main():
                 new_grade = input("Enter new Grade: ")
                 new_marks_range = input("Enter new Marks Range: ")
                 grade = Grade(grade_id, "", "")
-                grade.modify_grade(new_grade, new_marks_range)
-                print("Grade is modified successfully!")
+                regraded = grade.modify_grade(new_grade, new_marks_range)
+                if regraded is None:
+                    print("Grade not found!")
+                else:
+                    print("Grade is modified successfully!")
+                    print(f"Regraded {regraded['changed']} of {regraded['checked']} students in the affected ranges.")
 
             elif grade_choice == '4':
                 Grade.display_grade_report()
 
+            elif grade_choice == '5':
+                problems = Grade.scale().problems
+                for problem in problems:
+                    print(problem)
+                if not problems:
+                    print("Grade ranges have no overlaps or gaps.")
+
+            elif grade_choice == '6':
+                regraded = Grade.regrade_all()
+                print(f"Regraded {regraded['changed']} of {regraded['checked']} students "
+                      f"({regraded['ungraded']} have marks outside every grade range).")
+
         elif choice == '5':  # User Login Management
             print("\n--- User Login Management ---")
             print("1. Register New User")
@@ -621,8 +4484,140 @@ def main():
             print("Exiting")
             break
 
+        elif choice == '7':  # Data Maintenance
+            print("\n--- Data Maintenance ---")
+            print("1. Compact Data Files")
+            print("2. Bulk Import from CSV")
+            print("3. Migrate CSV Files to SQLite")
+            print("4. Find Orphan References")
+            print("5. Shard Students by Course" if not students_sharded() else "5. Merge Student Shards into students.csv")
+            print("6. Turn Write-Behind On/Off")
+            print(f"7. Save Pending Changes ({write_behind.pending})")
+            maintenance_choice = input("Enter choice: ")
+
+            if maintenance_choice == '1':
+                for file_name in table_files():
+                    if compact_table(file_name):
+                        print(f"Compacted {file_name}")
+                print("Data files are compact.")
+
+            elif maintenance_choice == '2':
+                entity = input("Import (students/courses/professors): ").strip().lower()
+                importers = {'students': Student, 'courses': Course, 'professors': Professor}
+                if entity not in importers:
+                    print("Invalid choice! Choose students, courses or professors.")
+                else:
+                    file_name = input("Input CSV file: ").strip()
+                    try:
+                        result = importers[entity].bulk_add(iter_csv(file_name))
+                    except FileNotFoundError:
+                        print(f"File {file_name} not found!")
+                    else:
+                        for position, row, reason in result['rejected'][:20]:
+                            print(f"Rejected row {position}: {reason} {row}")
+                        if len(result['rejected']) > 20:
+                            print(f"... and {len(result['rejected']) - 20} more rejected rows")
+
+            elif maintenance_choice == '3':
+                for file_name, counts in migrate_to_sqlite().items():
+                    print(f"Migrated {counts['rows']} rows from {file_name} ({counts['skipped']} duplicate keys skipped)")
+                print(f"Data copied to {SQLITE_DB_NAME}. Set CHECKMYGRADE_BACKEND=sqlite to use it.")
+
+            elif maintenance_choice == '4':
+                orphans = find_orphans()
+                for s in orphans['students']:
+                    print(f"Student {s['student_id']} ({s['email']}) is enrolled in missing course {s['course_id']}")
+                for p in orphans['professors']:
+                    print(f"Professor {p['professor_id']} ({p['email']}) teaches missing course {p['course_id']}")
+                print(f"{len(orphans['students'])} orphaned students, {len(orphans['professors'])} orphaned professors.")
+
+            elif maintenance_choice == '5':
+                try:
+                    if not students_sharded():
+                        print(f"Sharded students into {shard_students()} course files under {SHARD_DIR}.")
+                    else:
+                        print(f"Merged {unshard_students()} students back into students.csv.")
+                except ValueError as e:
+                    print(e)
+
+            elif maintenance_choice == '6':
+                if write_behind.active:
+                    saved = write_behind.stop()
+                    print(f"Write-behind is off. Saved {saved} pending changes.")
+                else:
+                    write_behind.start()
+                    print(f"Write-behind is on. Changes are saved every {write_behind.interval:g}s, "
+                          f"after {write_behind.max_ops} edits, with option 7 and on exit.")
+
+            elif maintenance_choice == '7':
+                files = write_behind.dirty_files()
+                saved = write_behind.save()
+                print(f"Saved {saved} pending changes" + (f" to {', '.join(files)}." if files else "."))
+
+            else:
+                print("Invalid choice! Please enter a valid option.")
+
+        elif choice == '8':  # Diagnostics
+            print("\n--- Diagnostics ---")
+            print("1. Show Timings and I/O Counters")
+            print("2. Turn Metrics On/Off")
+            print("3. Reset Metrics")
+            print("4. Profile the Next Operation")
+            print("5. Save Metrics to JSON")
+            diagnostics_choice = input("Enter choice: ")
+
+            if diagnostics_choice == '1':
+                print("\n".join(metrics.report()))
+
+            elif diagnostics_choice == '2':
+                metrics.enable(not metrics.enabled)
+                print(f"Metrics are {'on' if metrics.enabled else 'off'}." +
+                      (f" They are saved to {metrics.output} on exit." if metrics.enabled else ""))
+
+            elif diagnostics_choice == '3':
+                metrics.reset()
+                print("Metrics reset.")
+
+            elif diagnostics_choice == '4':
+                file_name = input(f"Profile output file (default {PROFILE_FILE}): ").strip() or PROFILE_FILE
+                metrics.profile_next(file_name)
+                print("The next operation you run will be profiled.")
+
+            elif diagnostics_choice == '5':
+                file_name = input(f"Output file (default {METRICS_DEFAULT_FILE}): ").strip() or METRICS_DEFAULT_FILE
+                metrics.dump(file_name)
+                print(f"Metrics saved to {file_name}")
+
+            else:
+                print("Invalid choice! Please enter a valid option.")
+
+        elif choice == '9':  # Query Records
+            print("\n--- Query Records ---")
+            print("Conditions are joined by 'and', e.g.: course_id = DATA200 and marks between 80 and 90 and grade in {A, B}")
+            print("Operators: = != < <= > >= between in prefix")
+            entity = input(f"Table ({'/'.join(QUERY_ENTITIES)}): ").strip().lower()
+            where = input("Conditions (leave blank for all rows): ")
+            fields = input("Fields to show, comma-separated (leave blank for all): ")
+            order = input("Sort by, e.g. -marks,email (leave blank for file order): ").strip()
+            page_size = input(f"Rows per page (default {QUERY_PAGE_ROWS}): ").strip()
+            try:
+                page_size = int(page_size) if page_size else QUERY_PAGE_ROWS
+                if page_size <= 0:
+                    raise ValueError("Rows per page must be a positive number")
+                rows = query(entity, where, fields, order or None)
+            except ValueError as e:
+                print(f"Invalid query: {e}")
+                continue
+            shown = 0
+            while True:
+                written = write_lines(format_fields(row) for row in itertools.islice(rows, page_size))
+                shown += written
+                if written < page_size or input("More? (y/n): ").strip().lower() != 'y':
+                    break
+            print(f"{shown} row(s) shown.")
+
         else:
             print("Invalid Choice, Try Again.")
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,185 @@
+import argparse
+import csv
+import io
+import itertools
+import os
+import random
+import sys
+import time
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+import checkmygrade
+
+STUDENT_FIELDS = ["student_id", "first_name", "last_name", "email", "course_id", "grade", "marks"]
+COURSE_FIELDS = ["course_id", "course_name", "credits", "description"]
+PROFESSOR_FIELDS = ["professor_id", "name", "email", "rank", "course_id"]
+GRADE_FIELDS = ["grade_id", "grade", "marks_range"]
+LOGIN_FIELDS = ["email", "password", "role"]
+
+CHUNK_ROWS = 100_000       # students generated per task; also bounds the memory of one in-flight chunk
+ZIPF_EXPONENT = 1.1        # course popularity falls off as 1 / rank ** ZIPF_EXPONENT with --distribution skewed
+PASSWORD_COST = 1          # hash cost of generated logins; logging in upgrades a row to the configured cost
+
+FIRST_NAMES = ["James", "Maria", "Wei", "Aarav", "Sofía", "José", "Zoë", "Łukasz", "Søren", "Chloé", "Björn", "Ngozi",
+               "Yuki", "Olumide", "François", "Ananya", "Mateo", "Leïla", "Dmitri", "Saoirse", "Jürgen", "Amélie",
+               "Hiroshi", "Fatima", "Ömer", "Priya", "Liam", "Ines", "Тимур", "Άννα", "美咲", "민준", "محمد", "Đức"]
+LAST_NAMES = ["Smith", "García", "Nguyễn", "Müller", "O'Brien", "Kowalski", "Østergaard", "Patel", "Dubois", "Rossi",
+              "Okafor", "Tanaka", "Ibáñez", "Schäfer", "Núñez", "Andersson", "Papadopoulos", "Çelik", "Kim", "Chen",
+              "Fernández", "Lefèvre", "Singh", "Håkansson", "Wójcik", "Иванов", "Παπαδάκης", "佐藤", "박", "Li"]
+SUBJECTS = [("DATA", "Data Science"), ("CMPE", "Computer Engineering"), ("MATH", "Mathematics"),
+            ("STAT", "Statistics"), ("PHYS", "Physics"), ("ECON", "Economics"), ("BUS", "Business"), ("ENGR", "Engineering")]
+TOPICS = ["Foundations", "Methods", "Systems", "Theory", "Applications", "Seminar", "Analysis", "Design", "Modeling", "Practice"]
+RANKS = ["Lecturer", "Assistant Professor", "Associate Professor", "Professor"]
+GRADE_SCALE = [("1", "A", "90-100"), ("2", "B", "80-90"), ("3", "C", "70-80"), ("4", "D", "60-70"), ("5", "F", "0-60")]
+
+# =================== Helpers ===================
+
+def _rng(seed, *parts):
+    """An independent generator for one table/chunk, so output does not depend on the worker count"""
+    return random.Random(":".join(str(p) for p in (seed,) + parts))
+
+def _slug(name):
+    """ASCII e-mail local part for a possibly non-Latin name ('' when nothing survives transliteration)"""
+    ascii_name = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode()
+    return "".join(c for c in ascii_name.lower() if c.isalnum())
+
+def _csv_text(rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+def course_ids(count):
+    """count distinct course ids spread over the subject prefixes (DATA200, CMPE200, ..., DATA201, ...)"""
+    return [f"{SUBJECTS[i % len(SUBJECTS)][0]}{200 + i // len(SUBJECTS)}" for i in range(count)]
+
+def course_weights(count, distribution):
+    """Cumulative enrolment weights per course for random.choices"""
+    if distribution == 'uniform':
+        weights = [1.0] * count
+    elif distribution == 'skewed':
+        weights = [1 / (rank + 1) ** ZIPF_EXPONENT for rank in range(count)]
+    else:
+        raise ValueError(f"Unknown distribution {distribution!r}")
+    return list(itertools.accumulate(weights))
+
+# =================== Small Tables ===================
+
+def generate_courses(seed, count):
+    rng = _rng(seed, 'courses')
+    rows = []
+    for i, course_id in enumerate(course_ids(count)):
+        subject = SUBJECTS[i % len(SUBJECTS)][1]
+        topic = rng.choice(TOPICS)
+        rows.append([course_id, f"{subject} {topic}", rng.randint(1, 4), f"{topic} in {subject.lower()}"])
+    return rows
+
+def generate_professors(seed, count, courses):
+    """Professors with at most one course each; courses are covered round-robin"""
+    rng = _rng(seed, 'professors')
+    rows = []
+    for i in range(count):
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        rows.append([f"P{100 + i}", name, f"{_slug(name) or 'professor'}.p{100 + i}@mycsu.edu",
+                     rng.choice(RANKS), courses[i % len(courses)]])
+    return rows
+
+def course_means(seed, courses):
+    """Mean marks per course, so some courses are harder than others"""
+    rng = _rng(seed, 'difficulty')
+    return [rng.uniform(55, 88) for _ in courses]
+
+# =================== Students ===================
+
+def _student_chunk(task):
+    """Generate one chunk of students and their logins as CSV text"""
+    seed, start, count, courses, cum_weights, means, decimals, spread, password_cost = task
+    rng = _rng(seed, 'students', start)
+    scale = checkmygrade.GradeScale([{'grade_id': g, 'grade': n, 'marks_range': r} for g, n, r in GRADE_SCALE])
+    positions = rng.choices(range(len(courses)), cum_weights=cum_weights, k=count)
+    students = []
+    logins = []
+    for student_id, position in zip(range(start, start + count), positions):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        email = f"{_slug(first) or 'student'}.{_slug(last) or 'student'}.{student_id}@mycsu.edu"
+        marks = min(100.0, max(0.0, rng.gauss(means[position], spread)))
+        marks = f"{marks:.{decimals}f}"
+        students.append([student_id, first, last, email, courses[position], scale.lookup(marks), marks])
+        password = checkmygrade.encrypt_password(f"pw{student_id}", password_cost, rng.randbytes(checkmygrade.PASSWORD_SALT_BYTES))
+        logins.append([email, password, "student"])
+    return _csv_text(students), _csv_text(logins)
+
+def _chunk_results(tasks, workers):
+    """Yield chunk results in order, keeping at most 2 * workers chunks in flight"""
+    if workers == 1:
+        yield from map(_student_chunk, tasks)
+        return
+    with ProcessPoolExecutor(workers) as executor:
+        pending = []
+        for task in tasks:
+            pending.append(executor.submit(_student_chunk, task))
+            if len(pending) >= 2 * workers:
+                yield pending.pop(0).result()
+        for future in pending:
+            yield future.result()
+
+# =================== Generator ===================
+
+def generate(directory, students, courses=None, professors=None, distribution='skewed', decimals=1,
+             spread=12.0, seed=0, workers=1, password_cost=PASSWORD_COST):
+    """Write a consistent students/courses/professors/grades/login data set of the given size to directory"""
+    courses = courses or max(10, min(students // 200, 5000))
+    professors = professors or courses
+    workers = workers or os.cpu_count() or 1
+    os.makedirs(directory, exist_ok=True)
+
+    course_rows = generate_courses(seed, courses)
+    professor_rows = generate_professors(seed, professors, [c[0] for c in course_rows])
+    with open(os.path.join(directory, 'courses.csv'), 'w', newline='', encoding='utf-8') as file:
+        file.write(_csv_text([COURSE_FIELDS] + course_rows))
+    with open(os.path.join(directory, 'professors.csv'), 'w', newline='', encoding='utf-8') as file:
+        file.write(_csv_text([PROFESSOR_FIELDS] + professor_rows))
+    with open(os.path.join(directory, 'grades.csv'), 'w', newline='', encoding='utf-8') as file:
+        file.write(_csv_text([GRADE_FIELDS] + [list(g) for g in GRADE_SCALE]))
+
+    ids = [c[0] for c in course_rows]
+    cum_weights = course_weights(courses, distribution)
+    means = course_means(seed, ids)
+    tasks = ((seed, start, min(CHUNK_ROWS, students - start), ids, cum_weights, means, decimals, spread, password_cost)
+             for start in range(0, students, CHUNK_ROWS))
+    with open(os.path.join(directory, 'students.csv'), 'w', newline='', encoding='utf-8') as student_file, \
+            open(os.path.join(directory, 'login.csv'), 'w', newline='', encoding='utf-8') as login_file:
+        student_file.write(_csv_text([STUDENT_FIELDS]))
+        login_file.write(_csv_text([LOGIN_FIELDS]))
+        salts = _rng(seed, 'salts')
+        login_file.write(_csv_text([[p[2], checkmygrade.encrypt_password(f"pw{p[0]}", password_cost, salts.randbytes(checkmygrade.PASSWORD_SALT_BYTES)),
+                                     "professor"] for p in professor_rows]))
+        for student_text, login_text in _chunk_results(tasks, workers):
+            student_file.write(student_text)
+            login_file.write(login_text)
+    return {'students': students, 'courses': courses, 'professors': professors}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a seeded synthetic CheckMyGrade data set")
+    parser.add_argument('directory', help="output directory (data files there are overwritten)")
+    parser.add_argument('--students', type=int, default=100_000)
+    parser.add_argument('--courses', type=int, default=None, help="default: students / 200, between 10 and 5000")
+    parser.add_argument('--professors', type=int, default=None, help="default: one per course")
+    parser.add_argument('--distribution', choices=['skewed', 'uniform'], default='skewed', help="course size distribution")
+    parser.add_argument('--decimals', type=int, default=1, help="decimal places in marks")
+    parser.add_argument('--spread', type=float, default=12.0, help="standard deviation of marks within a course")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=0, help="processes (0 = all CPUs)")
+    parser.add_argument('--password-cost', type=int, default=PASSWORD_COST,
+                        help="password hash cost of the generated logins (default 1: cheap to generate, upgraded on login)")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    counts = generate(args.directory, args.students, args.courses, args.professors, args.distribution,
+                      args.decimals, args.spread, args.seed, args.workers, args.password_cost)
+    elapsed = time.perf_counter() - start
+    print(f"Generated {counts['students']:,} students, {counts['courses']:,} courses and "
+          f"{counts['professors']:,} professors in {args.directory} ({elapsed:.1f}s)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+import benchcheckmygrade
+
+# =================== HTTP Client ===================
+
+class Connection:
+    """One keep-alive HTTP/1.1 connection to the CheckMyGrade service"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def open(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        return self
+
+    async def request(self, method, path, payload=None):
+        """Send one request and return (status, decoded JSON body)"""
+        body = json.dumps(payload).encode() if payload is not None else b''
+        self.writer.write(f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Type: application/json\r\n"
+                          f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+        await self.writer.drain()
+        status = int((await self.reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            if name.strip().lower() == 'content-length':
+                length = int(value)
+        return status, json.loads(await self.reader.readexactly(length))
+
+    def close(self):
+        self.writer.close()
+
+# =================== Load Generation ===================
+
+def percentile(samples, p):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+async def client(host, port, students, write_ratio, deadline, latencies, errors):
+    """Issue reads (student lookups) and writes (marks updates) back to back until the deadline"""
+    connection = await Connection(host, port).open()
+    try:
+        while time.perf_counter() < deadline:
+            i = random.randrange(students)
+            if random.random() < write_ratio:
+                kind = 'write'
+                method, path, payload = 'POST', '/api/update_student', {'student_id': str(i), 'marks': str(random.randrange(101))}
+            else:
+                kind = 'read'
+                method, path, payload = 'GET', '/api/get_student?' + urllib.parse.urlencode({'email': f"student{i}@yahoo.com"}), None
+            start = time.perf_counter()
+            status, result = await connection.request(method, path, payload)
+            latencies[kind].append(time.perf_counter() - start)
+            if status != 200 or not result.get('ok'):
+                errors.append(result)
+    finally:
+        connection.close()
+
+async def run_load(host, port, students, concurrency, duration, write_ratio):
+    latencies = {'read': [], 'write': []}
+    errors = []
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(*(client(host, port, students, write_ratio, deadline, latencies, errors) for _ in range(concurrency)))
+    return latencies, errors
+
+def report(latencies, errors, duration):
+    total = sum(len(samples) for samples in latencies.values())
+    print(f"{total:,} requests in {duration:.0f}s ({total / duration:,.0f} req/s), {len(errors)} errors")
+    for kind, samples in latencies.items():
+        if samples:
+            print(f"  {kind:<5} n={len(samples):<8,} p50={percentile(samples, 50) * 1000:7.2f}ms  "
+                  f"p95={percentile(samples, 95) * 1000:7.2f}ms  p99={percentile(samples, 99) * 1000:7.2f}ms  "
+                  f"max={max(samples) * 1000:7.2f}ms")
+    return percentile(latencies['read'], 99) * 1000
+
+# =================== Server ===================
+
+def spawn_server(directory, students):
+    """Generate a students table of the given size and start the service on a free port"""
+    benchcheckmygrade.write_students(os.path.join(directory, 'students.csv'), students)
+    here = os.path.dirname(os.path.abspath(__file__))
+    for file_name in ('courses.csv', 'professors.csv', 'grades.csv', 'login.csv'):
+        shutil.copy(os.path.join(here, file_name), directory)
+    process = subprocess.Popen([sys.executable, os.path.join(here, 'checkmygrade.py'), 'serve', '--port', '0'],
+                               cwd=directory, stderr=subprocess.PIPE, text=True)
+    line = process.stderr.readline()
+    if not line.startswith('Serving on'):
+        process.kill()
+        raise RuntimeError(f"server did not start: {line}{process.stderr.read()}")
+    return process, int(line.rsplit(':', 1)[1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator for the CheckMyGrade HTTP service")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--spawn', action='store_true', help="generate data and start a server in a temp directory")
+    parser.add_argument('--students', type=int, default=1_000_000, help="students in the table (generated with --spawn)")
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--write-ratio', type=float, default=0.05)
+    parser.add_argument('--max-read-p99-ms', type=float, default=5.0)
+    args = parser.parse_args()
+
+    process = directory = None
+    if args.spawn:
+        directory = tempfile.mkdtemp()
+        print(f"Generating {args.students:,} students and starting the server...")
+        process, args.port = spawn_server(directory, args.students)
+    try:
+        latencies, errors = asyncio.run(run_load(args.host, args.port, args.students, args.concurrency,
+                                                 args.duration, args.write_ratio))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+            shutil.rmtree(directory)
+
+    read_p99 = report(latencies, errors, args.duration)
+    if read_p99 > args.max_read_p99_ms:
+        print(f"FAIL: read p99 {read_p99:.2f}ms exceeds {args.max_read_p99_ms}ms")
+        sys.exit(1)
+    print(f"OK: read p99 {read_p99:.2f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,26 @@
+import asyncio
+import collections
+import contextlib
+import hashlib
+import io
+import json
+import mmap
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import statistics
+import tempfile
 import unittest
 import time
-from checkmygrade import Student, Course, Professor, load_csv, write_csv
+import tracemalloc
+import benchcheckmygrade
+import checkmygrade
+import gencheckmygrade
+from checkmygrade import ConcurrentUpdateError, Student, Course, Professor, Grade, LoginUser, Table, TableCache, compact_table, course_statistics, iter_csv, load_csv, migrate_to_sqlite, retry_on_conflict, transaction, use_storage, write_csv, table_cache
+
+STUDENT_FIELDS = ["student_id", "first_name", "last_name", "email", "course_id", "grade", "marks"]
+STUDENTS = [Student(str(i), f"S{i}", f"T{i}", f"s{i}@yahoo.com", "DATA200", "A", str(80 + i)) for i in range(5)]
 
 
 class TestStudentManagement(unittest.TestCase):
@@ -40,29 +60,83 @@ class TestStudentSearch(unittest.TestCase):
 
     def test_search_student(self):
         """Test searching for a student and measure search time"""
-        students = load_csv("students.csv") 
         email_to_search = "student500@yahoo.com"
 
-        start_time = time.time()
-        student = next((s for s in students if s['email'] == email_to_search), None)
-        end_time = time.time()
+        start_time = time.perf_counter()
+        student = Student.search(email_to_search)
+        end_time = time.perf_counter()
 
         self.assertIsNotNone(student, "Student not found!")
         print(f"Search for {email_to_search} took {end_time - start_time:.6f} seconds")
 
+    def test_indexed_lookup_scales(self):
+        """Test that an email index lookup stays constant time at 1k, 100k and 1M rows"""
+        for size in (1000, 100000, 1000000):
+            rows = [{"student_id": str(i), "email": f"student{i}@yahoo.com", "course_id": "DATA200"} for i in range(size)]
+            index = Table("students.csv", rows, ["student_id", "email", "course_id"], None).index("email")
+            email_to_search = f"student{size // 2}@yahoo.com"
+
+            start_time = time.perf_counter()
+            for _ in range(1000):
+                student = index.get(email_to_search)
+            end_time = time.perf_counter()
+
+            self.assertEqual(student["student_id"], str(size // 2))
+            print(f"Indexed search over {size} rows took {(end_time - start_time) / 1000:.9f} seconds")
+
+class TestStudentIndexes(unittest.TestCase):
+
+    def setUp(self):
+        self.table = Table("students.csv", [
+            {"student_id": "1", "email": "a@yahoo.com", "course_id": "DATA200"},
+            {"student_id": "2", "email": "b@yahoo.com", "course_id": "DATA200"},
+            {"student_id": "3", "email": "c@yahoo.com", "course_id": "DATA300"},
+        ], ["student_id", "email", "course_id"], None)
+        self.by_email = self.table.index("email")
+        self.by_course = self.table.index("course_id", unique=False)
+
+    def test_insert_updates_indexes(self):
+        """Test that inserted rows are visible through every index"""
+        self.table.insert({"student_id": "4", "email": "d@yahoo.com", "course_id": "DATA300"})
+        self.assertEqual(self.by_email.get("d@yahoo.com")["student_id"], "4")
+        self.assertEqual(len(self.by_course.get_all("DATA300")), 2)
+
+    def test_update_moves_index_entries(self):
+        """Test that changing course_id moves the row between course buckets"""
+        self.table.update(self.by_email.get("a@yahoo.com"), {"course_id": "DATA300"})
+        self.assertEqual([s["student_id"] for s in self.by_course.get_all("DATA200")], ["2"])
+        self.assertEqual(len(self.by_course.get_all("DATA300")), 2)
+
+    def test_delete_removes_index_entries(self):
+        """Test that deleted rows disappear from every index"""
+        self.table.delete(self.by_email.get_all("c@yahoo.com"))
+        self.assertIsNone(self.by_email.get("c@yahoo.com"))
+        self.assertEqual(self.by_course.get_all("DATA300"), [])
+        self.assertEqual(len(self.table.rows), 2)
+
+    def test_duplicate_keys_survive_delete(self):
+        """Test that a unique index falls back to the remaining row sharing a key"""
+        duplicate = {"student_id": "5", "email": "a@yahoo.com", "course_id": "DATA200"}
+        self.table.insert(duplicate)
+        self.table.delete([self.table.rows[0]])
+        self.assertIs(self.by_email.get("a@yahoo.com"), duplicate)
+
 class TestStudentSorting(unittest.TestCase):
 
     def test_sort_students_by_marks(self):
-        start_time = time.time()
-        Student.display_sorted(by="marks")
-        end_time = time.time()
+        table_cache.get("students.csv").derived.clear()
+        start_time = time.perf_counter()
+        students = Student.sorted_records(by="marks")
+        end_time = time.perf_counter()
+        self.assertEqual([float(s["marks"]) for s in students], sorted(float(s["marks"]) for s in students))
         print(f"Sorting by marks has taken: {end_time - start_time:.6f} seconds")
 
     def test_sort_students_by_email(self):
-        start_time = time.time()
-        Student.display_sorted(by="email")
-        end_time = time.time()
-
+        table_cache.get("students.csv").derived.clear()
+        start_time = time.perf_counter()
+        students = Student.sorted_records(by="email")
+        end_time = time.perf_counter()
+        self.assertEqual([s["email"] for s in students], sorted(s["email"] for s in students))
         print(f"Sorting by email has taken: {end_time - start_time:.6f} seconds")
 
 
@@ -116,5 +190,1700 @@ class TestProfessorManagement(unittest.TestCase):
         modified_professor = next(p for p in professors if p["professor_id"] == "P100")
         self.assertEqual(modified_professor["rank"], "Professor Chan")
 
+def setUpModule():
+    """Run the suite against a SQLite copy of the checked-in CSVs when CHECKMYGRADE_BACKEND=sqlite"""
+    if checkmygrade.storage.name == "sqlite":
+        migrate_to_sqlite(".")
+
+class TempDirTestCase(unittest.TestCase):
+    backend = checkmygrade.storage.name
+
+    def setUp(self):
+        """Work on throwaway tables in a temp directory"""
+        self.old_cwd = os.getcwd()
+        self.tmp_dir = tempfile.mkdtemp()
+        os.chdir(self.tmp_dir)
+        self.old_backend = checkmygrade.storage.name
+        use_storage(self.backend)
+
+    def tearDown(self):
+        use_storage(self.old_backend)
+        os.chdir(self.old_cwd)
+        shutil.rmtree(self.tmp_dir)
+        table_cache.invalidate()
+
+class TestTableCache(TempDirTestCase):
+    backend = "csv"
+
+    def setUp(self):
+        super().setUp()
+        write_csv("students.csv", [{"student_id": "1", "email": "a@yahoo.com"}], ["student_id", "email"])
+
+    def test_repeated_reads_hit_cache(self):
+        """Test that an unchanged file is parsed only once"""
+        load_csv("students.csv")
+        hits, misses = table_cache.hits, table_cache.misses
+        load_csv("students.csv")
+        self.assertEqual(table_cache.hits, hits + 1)
+        self.assertEqual(table_cache.misses, misses)
+
+    def test_external_change_reloads(self):
+        """Test that a file changed behind our back is re-parsed"""
+        load_csv("students.csv")
+        with open("students.csv", "a", newline="") as file:
+            file.write("2,b@yahoo.com\n")
+        self.assertEqual([s["email"] for s in load_csv("students.csv")], ["a@yahoo.com", "b@yahoo.com"])
+
+    def test_returned_rows_are_copies(self):
+        """Test that mutating load_csv output does not corrupt the cache"""
+        load_csv("students.csv")[0]["email"] = "changed@yahoo.com"
+        self.assertEqual(load_csv("students.csv")[0]["email"], "a@yahoo.com")
+
+    def test_lru_eviction(self):
+        """Test that the least recently used table is evicted over the memory cap"""
+        cache = TableCache(max_bytes=1)
+        write_csv("courses.csv", [{"course_id": "DATA200"}], ["course_id"])
+        cache.get("students.csv")
+        cache.get("courses.csv")
+        self.assertEqual(cache.stats()["tables"], 1)
+        self.assertEqual(cache.evictions, 1)
+        cache.get("courses.csv")
+        self.assertEqual(cache.hits, 1)
+
+class TestAppendOnlyWrites(TempDirTestCase):
+    backend = "csv"
+
+    def setUp(self):
+        super().setUp()
+        write_csv("students.csv", [s.__dict__ for s in STUDENTS], STUDENT_FIELDS)
+
+    def reload(self):
+        table_cache.invalidate()
+        return load_csv("students.csv")
+
+    def test_insert_appends_one_line(self):
+        """Test that adding a student appends a row instead of rewriting the file"""
+        with open("students.csv") as file:
+            before = file.read()
+        Student("9", "New", "Student", "new@yahoo.com", "DATA300", "B", "85").add_new_student()
+        with open("students.csv") as file:
+            after = file.read()
+        self.assertTrue(after.startswith(before))
+        self.assertEqual(after[len(before):].strip(), "9,New,Student,new@yahoo.com,DATA300,B,85")
+
+    def test_replayed_delete_leaves_no_index_entry(self):
+        """Test that a row deleted by email stays gone from an index a later log record builds on another column"""
+        Student("", "", "", "s2@yahoo.com", "", "", "").delete_new_student()
+        Student("1", "", "", "", "", "", "").update_student_record(new_grade="C")
+        self.assertEqual([s["student_id"] for s in self.reload()], ["0", "1", "3", "4"])
+        table = table_cache.get("students.csv")
+        self.assertIsNone(table.index("student_id").get("2"))
+        self.assertIsNone(table.index("email").get("s2@yahoo.com"))
+        row = {"student_id": "2", "first_name": "Back", "last_name": "Again", "email": "s2@yahoo.com",
+               "course_id": "DATA200", "grade": "A", "marks": "82"}
+        self.assertIsNotNone(checkmygrade.insert_student(row))
+        self.assertEqual([s["student_id"] for s in self.reload()], ["0", "1", "3", "4", "2"])
+
+    def test_update_and_delete_go_to_log(self):
+        """Test that updates and deletes leave the CSV untouched and merge on read"""
+        with open("students.csv") as file:
+            before = file.read()
+        Student("1", "", "", "", "", "", "").update_student_record(new_grade="C")
+        Student("", "", "", "s2@yahoo.com", "", "", "").delete_new_student()
+        with open("students.csv") as file:
+            self.assertEqual(file.read(), before)
+        self.assertTrue(os.path.exists("students.csv.log"))
+
+        students = self.reload()
+        self.assertEqual(next(s for s in students if s["student_id"] == "1")["grade"], "C")
+        self.assertFalse(any(s["email"] == "s2@yahoo.com" for s in students))
+
+    def test_log_respects_insert_order(self):
+        """Test that a delete does not hide a row re-added after it"""
+        Student("", "", "", "s0@yahoo.com", "", "", "").delete_new_student()
+        Student("0", "Again", "Student", "s0@yahoo.com", "DATA200", "A", "99").add_new_student()
+        students = self.reload()
+        self.assertEqual([s["first_name"] for s in students if s["email"] == "s0@yahoo.com"], ["Again"])
+
+    def test_compaction_folds_log(self):
+        """Test that compaction rewrites the CSV and removes the log"""
+        Student("3", "", "", "", "", "", "").update_student_record(new_marks="42")
+        expected = self.reload()
+        self.assertTrue(compact_table("students.csv"))
+        self.assertFalse(os.path.exists("students.csv.log"))
+        self.assertEqual(self.reload(), expected)
+
+class TestTransactions(TempDirTestCase):
+    backend = "csv"
+
+    def setUp(self):
+        super().setUp()
+        write_csv("students.csv", [s.__dict__ for s in STUDENTS], STUDENT_FIELDS)
+        write_csv("professors.csv", [], ["professor_id", "name", "email", "rank", "course_id"])
+
+    def read(self, file_name):
+        with open(file_name) as file:
+            return file.read()
+
+    def test_commit_rewrites_each_file_once(self):
+        """Test that mutations across two tables land together at commit"""
+        before = self.read("students.csv")
+        with transaction():
+            for i in range(5):
+                Student(str(i), "", "", "", "", "", "").update_student_record(new_grade="B")
+            Professor("P1", "Dr. Chan", "chan@edu.com", "Senior", "DATA200").add_new_professor()
+            self.assertEqual(self.read("students.csv"), before)
+            self.assertEqual(load_csv("students.csv")[0]["grade"], "B")
+
+        self.assertFalse(os.path.exists("students.csv.log"))
+        table_cache.invalidate()
+        self.assertTrue(all(s["grade"] == "B" for s in load_csv("students.csv")))
+        self.assertEqual(load_csv("professors.csv")[0]["email"], "chan@edu.com")
+
+    def test_exception_rolls_back(self):
+        """Test that an error inside a transaction leaves files and reads unchanged"""
+        with self.assertRaises(RuntimeError):
+            with transaction():
+                Student("1", "", "", "", "", "", "").update_student_record(new_grade="F")
+                raise RuntimeError("abort")
+        self.assertEqual(load_csv("students.csv")[1]["grade"], "A")
+        self.assertFalse(os.path.exists("students.csv.log"))
+
+    def test_write_csv_joins_transaction(self):
+        """Test that a file rewrite inside a transaction is visible to it and undone with it"""
+        before = self.read("professors.csv")
+        with self.assertRaises(RuntimeError):
+            with transaction():
+                Student("1", "", "", "", "", "", "").update_student_record(new_grade="F")
+                write_csv("professors.csv", [{"professor_id": "P1"}], ["professor_id"])
+                self.assertEqual(self.read("professors.csv"), before)
+                self.assertEqual(load_csv("professors.csv"), [{"professor_id": "P1"}])
+                raise RuntimeError("abort")
+        self.assertEqual(self.read("professors.csv"), before)
+        self.assertEqual(load_csv("professors.csv"), [])
+        self.assertEqual(load_csv("students.csv")[1]["grade"], "A")
+
+        with transaction():
+            write_csv("professors.csv", [{"professor_id": "P1"}], ["professor_id"])
+        table_cache.invalidate()
+        self.assertEqual(load_csv("professors.csv"), [{"professor_id": "P1"}])
+
+    def test_failed_write_keeps_old_file(self):
+        """Test that a write failing midway leaves the original file and no temp files"""
+        before = self.read("students.csv")
+        with self.assertRaises(ValueError):
+            write_csv("students.csv", [{"student_id": "1", "unknown": "x"}], STUDENT_FIELDS)
+        self.assertEqual(self.read("students.csv"), before)
+        self.assertEqual(sorted(f for f in os.listdir(".") if not f.endswith(".lock")), ["professors.csv", "students.csv"])
+
+    def test_journal_rolls_forward(self):
+        """Test that a committed but unfinished transaction is completed on next access"""
+        with open(".students.csv.x.tmp", "w") as file:
+            file.write("student_id\n42\n")
+        with open(checkmygrade.JOURNAL_NAME, "w") as file:
+            json.dump({"renames": [[os.path.abspath(".students.csv.x.tmp"), os.path.abspath("students.csv")]],
+                       "logs": [os.path.abspath("students.csv")]}, file)
+        checkmygrade._recover_journal(os.getcwd(), force=True)
+        self.assertEqual(load_csv("students.csv"), [{"student_id": "42"}])
+        self.assertFalse(os.path.exists(checkmygrade.JOURNAL_NAME))
+
+class TestBulkImport(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        write_csv("students.csv", [s.__dict__ for s in STUDENTS], STUDENT_FIELDS)
+
+    def test_bulk_add_rejects_duplicates(self):
+        """Test that bulk_add rejects existing and in-batch duplicate IDs in one pass"""
+        new_students = [Student(str(i), "Bulk", "Student", f"bulk{i}@yahoo.com", "DATA300", "B", "85") for i in range(3, 1003)]
+        new_students.append({"student_id": "5", "email": "dupe@yahoo.com"})
+        result = Student.bulk_add(new_students)
+
+        self.assertEqual(result["added"], 998)
+        self.assertEqual([reason for _, _, reason in result["rejected"]], ["duplicate student_id"] * 3)
+        self.assertGreater(result["rows_per_second"], 0)
+        table_cache.invalidate()
+        self.assertEqual(len(load_csv("students.csv")), 1003)
+
+    def test_bulk_add_streams_from_csv(self):
+        """Test importing professors from an input CSV with a mixed-case header"""
+        with open("new_professors.csv", "w") as file:
+            file.write("Professor_ID,Name,Email,Rank,Course_ID\nP1,Dr. Chan,CHAN@edu.com,Senior,data200\n,No Id,x@edu.com,,\n")
+        result = Professor.bulk_add(iter_csv("new_professors.csv"))
+
+        self.assertEqual(result["added"], 1)
+        self.assertEqual(result["rejected"][0][2], "missing professor_id")
+        self.assertEqual(load_csv("professors.csv"), [{"professor_id": "P1", "name": "Dr. Chan", "email": "chan@edu.com", "rank": "Senior", "course_id": "DATA200"}])
+
+class TestBatchMode(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        write_csv("students.csv", [s.__dict__ for s in STUDENTS], STUDENT_FIELDS)
+        write_csv("grades.csv", [{"grade_id": "1", "grade": "A", "marks_range": "80-100"}], ["grade_id", "grade", "marks_range"])
+        self.old_password_cost = checkmygrade.PASSWORD_COST
+        checkmygrade.PASSWORD_COST = 1000
+
+    def tearDown(self):
+        checkmygrade.PASSWORD_COST = self.old_password_cost
+        super().tearDown()
+
+    def run_ops(self, ops, flush_every=0):
+        output = io.StringIO()
+        lines = [op if isinstance(op, str) else json.dumps(op) for op in ops]
+        summary = checkmygrade.run_batch(lines, output, flush_every)
+        return summary, [json.loads(line) for line in output.getvalue().splitlines()]
+
+    def test_results_per_operation(self):
+        """Test that every operation gets a JSON result in input order, failures included"""
+        summary, results = self.run_ops([
+            {"op": "add_student", "student_id": "9", "email": "new@yahoo.com", "marks": 70},
+            {"op": "add_student", "student_id": "9"},
+            {"op": "update_student", "student_id": "1", "grade": "C"},
+            {"op": "update_student", "student_id": "404", "grade": "C"},
+            {"op": "delete_student", "email": "s2@yahoo.com"},
+            {"op": "get_student", "email": "new@yahoo.com"},
+            "not json",
+            "",
+            {"op": "fly"},
+            {"op": "update_student", "grade": "C"},
+        ])
+        self.assertEqual(summary, {"ops": 9, "ok": 4, "failed": 5, "flushes": 1})
+        self.assertEqual([r["ok"] for r in results], [True, False, True, False, True, True, False, False, False])
+        self.assertEqual([r["line"] for r in results], [1, 2, 3, 4, 5, 6, 7, 9, 10])
+        self.assertEqual(results[1]["error"], "Student ID already exists")
+        self.assertEqual(results[5]["student"]["marks"], "70")
+        self.assertEqual(results[8]["error"], "missing student_id")
+
+        table_cache.invalidate()
+        students = {s["student_id"]: s for s in load_csv("students.csv")}
+        self.assertEqual(sorted(students), ["0", "1", "3", "4", "9"])
+        self.assertEqual(students["1"]["grade"], "C")
+
+    def test_one_write_per_flush(self):
+        """Test that operations are applied in memory and each touched table is written once per flush"""
+        writes = []
+        original = checkmygrade.storage.commit
+        checkmygrade.storage.commit = lambda tables: writes.append(len(tables)) or original(tables)
+        try:
+            ops = [{"op": "update_student", "student_id": str(i % 5), "marks": str(i % 100)} for i in range(1000)]
+            summary, _ = self.run_ops(ops, flush_every=300)
+        finally:
+            checkmygrade.storage.commit = original
+        self.assertEqual(summary["flushes"], 4)
+        self.assertEqual(writes, [1, 1, 1, 1])
+        table_cache.invalidate()
+        self.assertEqual(load_csv("students.csv")[4]["marks"], str(999 % 100))
+
+    def test_login_and_grades(self):
+        """Test login, password change and grade changes through batch operations"""
+        _, results = self.run_ops([
+            {"op": "register", "email": "Prof@Edu.com", "password": "secret", "role": "professor"},
+            {"op": "login", "email": "prof@edu.com", "password": "secret"},
+            {"op": "change_password", "email": "prof@edu.com", "password": "secret", "new_password": "s3cret"},
+            {"op": "login", "email": "prof@edu.com", "password": "secret"},
+            {"op": "update_grade", "grade_id": "1", "grade": "B", "marks_range": "80-100"},
+        ])
+        self.assertEqual([r["ok"] for r in results], [True, True, True, False, True])
+        self.assertEqual(results[4]["regraded"]["changed"], 5)
+
+    def test_command_line(self):
+        """Test the argparse subcommands for batch files and single operations"""
+        with open("ops.jsonl", "w") as file:
+            file.write(json.dumps({"op": "update_student", "student_id": "3", "marks": "99"}) + "\n")
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            self.assertEqual(checkmygrade.main(["batch", "ops.jsonl", "--flush-every", "10"]), 0)
+            self.assertEqual(checkmygrade.main(["delete_student", "--student-id", "404"]), 0)
+            self.assertEqual(checkmygrade.main(["add_course", "--course-id", "DATA200"]), 0)
+            self.assertEqual(checkmygrade.main(["add_course", "--course-id", "DATA200"]), 1)
+        results = [json.loads(line) for line in stdout.getvalue().splitlines()]
+        self.assertEqual([r["op"] for r in results], ["update_student", "delete_student", "add_course", "add_course"])
+        self.assertEqual(json.loads(stderr.getvalue())["ok"], 1)
+        table_cache.invalidate()
+        self.assertEqual(load_csv("students.csv")[3]["marks"], "99")
+
+
+class TestBenchmarkHarness(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.old_password_cost = checkmygrade.PASSWORD_COST
+        checkmygrade.PASSWORD_COST = 1000
+
+    def tearDown(self):
+        checkmygrade.PASSWORD_COST = self.old_password_cost
+        super().tearDown()
+
+    def test_operations_report(self):
+        """Test that every benchmark case runs and reports timings and peak memory"""
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = benchcheckmygrade.bench_operations([300], list(benchcheckmygrade.CASES), 1, 2, True, self.tmp_dir)
+        self.assertEqual([r["name"] for r in results], list(benchcheckmygrade.CASES))
+        for result in results:
+            self.assertEqual(result["runs"], 2)
+            self.assertLessEqual(result["min"], result["median"])
+            self.assertGreaterEqual(result["peak_bytes"], 0)
+        self.assertEqual(len(load_csv(os.path.join(self.tmp_dir, "ops-300", "students.csv"))), 300)
+
+    def test_compare_flags_regressions(self):
+        """Test that only cases slower than the baseline by more than the threshold are flagged"""
+        baseline = {"results": [{"name": "search", "rows": 1000, "median": 1.0},
+                                {"name": "sort", "rows": 1000, "median": 1.0}]}
+        results = [{"name": "search", "rows": 1000, "median": 1.05},
+                   {"name": "sort", "rows": 1000, "median": 1.5},
+                   {"name": "login", "rows": 1000, "median": 9.0}]
+        self.assertEqual(benchcheckmygrade.compare(results, baseline, 0.10), [("sort", 1000, 1.0, 1.5, 1.5)])
+
+
+class TestDataGenerator(TempDirTestCase):
+    backend = "csv"
+
+    def setUp(self):
+        super().setUp()
+        self.old_chunk_rows = gencheckmygrade.CHUNK_ROWS
+        gencheckmygrade.CHUNK_ROWS = 700
+
+    def tearDown(self):
+        gencheckmygrade.CHUNK_ROWS = self.old_chunk_rows
+        super().tearDown()
+
+    def generate(self, directory, **options):
+        return gencheckmygrade.generate(os.path.join(self.tmp_dir, directory), 3000, courses=20, **options)
+
+    def table(self, directory, file_name):
+        return load_csv(os.path.join(self.tmp_dir, directory, file_name))
+
+    def test_tables_are_consistent(self):
+        """Test that generated students reference real courses, carry the grade their marks earn and can log in"""
+        self.generate("data", decimals=2)
+        students = self.table("data", "students.csv")
+        courses = {c["course_id"] for c in self.table("data", "courses.csv")}
+        scale = checkmygrade.GradeScale(self.table("data", "grades.csv"))
+        self.assertEqual(len(students), 3000)
+        self.assertEqual(len({s["email"] for s in students}), 3000)
+        self.assertTrue(all(s["course_id"] in courses for s in students))
+        self.assertTrue(all(scale.lookup(s["marks"]) == s["grade"] for s in students))
+        self.assertTrue(all(len(s["marks"].split(".")[1]) == 2 for s in students))
+        self.assertTrue(any(not s["first_name"].isascii() for s in students))
+        self.assertTrue({p["course_id"] for p in self.table("data", "professors.csv")} <= courses)
+        logins = {u["email"]: u for u in self.table("data", "login.csv")}
+        self.assertEqual(len(logins), 3020)
+        self.assertTrue(checkmygrade.decrypt_password(logins[students[7]["email"]]["password"], "pw7"))
+        self.assertEqual(len({u["password"] for u in logins.values()}), 3020)
+
+    def test_output_does_not_depend_on_workers(self):
+        """Test that a seed produces the same files serially and across processes, and another seed does not"""
+        self.generate("serial", seed=3, workers=1)
+        self.generate("parallel", seed=3, workers=2)
+        self.generate("other", seed=4, workers=1)
+        for file_name in ("students.csv", "login.csv", "courses.csv", "professors.csv"):
+            with open(os.path.join(self.tmp_dir, "serial", file_name), "rb") as serial, \
+                    open(os.path.join(self.tmp_dir, "parallel", file_name), "rb") as parallel:
+                self.assertEqual(serial.read(), parallel.read(), file_name)
+        self.assertNotEqual(self.table("serial", "students.csv"), self.table("other", "students.csv"))
+
+    def test_course_size_distributions(self):
+        """Test that skewed enrolment concentrates on the first courses while uniform spreads evenly"""
+        self.generate("skewed", distribution="skewed")
+        self.generate("uniform", distribution="uniform")
+        for name, low, high in (("skewed", 0.2, 1.0), ("uniform", 0.0, 0.1)):
+            sizes = collections.Counter(s["course_id"] for s in self.table(name, "students.csv"))
+            share = sizes.most_common(1)[0][1] / 3000
+            self.assertTrue(low < share < high, (name, share))
+
+
+class TestInstrumentation(TempDirTestCase):
+    backend = "csv"
+
+    def setUp(self):
+        super().setUp()
+        write_csv("students.csv", [s.__dict__ for s in STUDENTS], STUDENT_FIELDS)
+        table_cache.invalidate()
+        checkmygrade.metrics.reset()
+
+    def tearDown(self):
+        checkmygrade.metrics.enable(False)
+        checkmygrade.metrics.profile_output = None
+        checkmygrade.metrics.reset()
+        super().tearDown()
+
+    def test_disabled_records_nothing(self):
+        """Test that instrumented calls leave no trace while metrics are off"""
+        load_csv("students.csv")
+        Student.search("s1@yahoo.com")
+        self.assertEqual(checkmygrade.metrics.calls, {})
+        self.assertEqual(sum(checkmygrade.metrics.counters.values()), 0)
+
+    def test_counts_calls_rows_and_bytes(self):
+        """Test that calls, histograms and rows/bytes read and written are recorded while metrics are on"""
+        checkmygrade.metrics.enable()
+        load_csv("students.csv")
+        load_csv("students.csv")
+        Student("9", "New", "Student", "new@yahoo.com", "DATA300", "B", "85").add_new_student()
+        Student("1", "", "", "", "", "", "").update_student_record(new_grade="C")
+        snapshot = checkmygrade.metrics.snapshot()
+        operations = snapshot["operations"]
+        self.assertEqual(operations["load_csv"]["calls"], 2)
+        self.assertEqual(operations["_parse_csv"]["calls"], 1)
+        self.assertEqual(operations["Student.add_new_student"]["calls"], 1)
+        self.assertEqual(sum(operations["load_csv"]["histogram_us"].values()), 2)
+        counters = snapshot["counters"]
+        self.assertEqual(counters["rows_parsed"], 5)
+        self.assertEqual(counters["bytes_read"], os.path.getsize("students.csv") - len("9,New,Student,new@yahoo.com,DATA300,B,85\r\n"))
+        self.assertEqual((counters["rows_written"], counters["log_records_written"]), (1, 1))
+        self.assertEqual(counters["bytes_written"], os.path.getsize("students.csv.log") + len("9,New,Student,new@yahoo.com,DATA300,B,85\r\n"))
+
+    def test_dump_writes_json(self):
+        """Test that the metrics dump is valid JSON including lock and cache statistics"""
+        checkmygrade.metrics.enable()
+        Student.search("s1@yahoo.com")
+        checkmygrade.metrics.dump("metrics.json")
+        with open("metrics.json") as file:
+            dumped = json.load(file)
+        self.assertEqual(dumped["operations"]["Student.search"]["calls"], 1)
+        self.assertIn("catch_ups", dumped["locks"])
+        self.assertIn("misses", dumped["cache"])
+
+    def test_profile_captures_one_operation(self):
+        """Test that profile_next captures only the next top-level operation"""
+        checkmygrade.metrics.profile_next("search.prof")
+        with contextlib.redirect_stderr(io.StringIO()) as report:
+            Student.search("s1@yahoo.com")
+        self.assertIn("search", report.getvalue())
+        self.assertTrue(os.path.exists("search.prof"))
+        self.assertFalse(checkmygrade.metrics.active)
+        os.remove("search.prof")
+        Student.search("s2@yahoo.com")
+        self.assertFalse(os.path.exists("search.prof"))
+
+
+class TestCompactRows(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        students = [dict(s.__dict__) for s in STUDENTS]
+        students[4]["marks"] = "absent"
+        write_csv("students.csv", students, STUDENT_FIELDS)
+        write_csv("courses.csv", [{"course_id": "DATA200", "course_name": "Python", "credits": "4", "description": ""},
+                                  {"course_id": "DATA300", "course_name": "SQL", "credits": "", "description": ""}],
+                  ["course_id", "course_name", "credits", "description"])
+        table_cache.invalidate()
+
+    def test_rows_share_keys_and_repeated_values(self):
+        """Test that parsed rows are plain dicts sharing interned course and grade strings"""
+        rows = table_cache.get("students.csv").rows
+        self.assertIs(type(rows[0]), dict)
+        self.assertIs(rows[0]["course_id"], rows[3]["course_id"])
+        self.assertIs(rows[0]["grade"], rows[3]["grade"])
+        self.assertEqual(load_csv("students.csv")[1], dict(STUDENTS[1].__dict__))
+
+    def test_compact_rows_use_less_memory(self):
+        """Test that key-sharing rows take measurably less memory than one dict per row"""
+        values = [[str(i), "First", "Last", f"s{i}@yahoo.com", "DATA200", "A", "90"] for i in range(20000)]
+        sizes = []
+        for build in (lambda: [dict(zip(STUDENT_FIELDS, v)) for v in values],
+                      lambda: checkmygrade.make_rows(STUDENT_FIELDS, [list(v) for v in values])):
+            tracemalloc.start()
+            rows = build()
+            sizes.append(tracemalloc.get_traced_memory()[0])
+            tracemalloc.stop()
+            del rows
+        self.assertLess(sizes[1], sizes[0] * 0.8)
+
+    def test_unusual_headers_fall_back_to_dicts(self):
+        """Test that headers that are not identifiers still produce ordinary rows"""
+        rows = checkmygrade.make_rows(["student id", "class", "marks"], [["1", "A"], ["2", "B", "70"]])
+        self.assertEqual(rows, [{"student id": "1", "class": "A", "marks": None}, {"student id": "2", "class": "B", "marks": "70"}])
+
+    def test_overlong_rows_are_rejected(self):
+        """Test that a row with more values than the header fails loudly instead of losing the extra values"""
+        with self.assertRaises(ValueError):
+            checkmygrade.make_rows(["student id", "class"], [["2", "B", "70"]])
+        if checkmygrade.storage.name != "csv":
+            return
+        with open("students.csv", "a") as file:
+            file.write("9,New,Student,new@yahoo.com,DATA300,B,85,extra\n")
+        table_cache.invalidate()
+        with self.assertRaisesRegex(ValueError, "students.csv: row 6 has 8 values"):
+            load_csv("students.csv")
+
+    def test_typed_records(self):
+        """Test that typed records convert marks and credits once and are rebuilt after a write"""
+        records = Student.records()
+        self.assertEqual(records[1].marks, 81.0)
+        self.assertIsNone(records[4].marks)
+        self.assertIs(Student.records(), records)
+        self.assertEqual(records[1].as_row(), STUDENTS[1].__dict__)
+        self.assertEqual([c.credits for c in Course.records()], [4, None])
+        Student("1", "", "", "", "", "", "").update_student_record(new_marks="92.5")
+        self.assertEqual(Student.records()[1].marks, 92.5)
+        with self.assertRaises(AttributeError):
+            records[0].nickname = "x"
+
+
+class TestJoins(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        students = [dict(s.__dict__) for s in STUDENTS]
+        students[3]["course_id"] = "DATA300"
+        students[4]["course_id"] = "DATA999"
+        write_csv("students.csv", students, STUDENT_FIELDS)
+        write_csv("courses.csv", [{"course_id": "DATA200", "course_name": "Python", "credits": "4", "description": "Intro"},
+                                  {"course_id": "DATA300", "course_name": "SQL", "credits": "3", "description": "Databases"}],
+                  ["course_id", "course_name", "credits", "description"])
+        write_csv("professors.csv", [{"professor_id": "P1", "name": "Ada", "email": "ada@edu.com", "rank": "Professor", "course_id": "DATA200"},
+                                     {"professor_id": "P2", "name": "Ada", "email": "ada@edu.com", "rank": "Professor", "course_id": "DATA300"},
+                                     {"professor_id": "P3", "name": "Bob", "email": "bob@edu.com", "rank": "Lecturer", "course_id": "DATA200"},
+                                     {"professor_id": "P4", "name": "Cy", "email": "cy@edu.com", "rank": "Lecturer", "course_id": "DATA404"}],
+                  ["professor_id", "name", "email", "rank", "course_id"])
+
+    def test_professor_views(self):
+        """Test the courses and students of a professor teaching two courses"""
+        professor = Professor("", "", "ADA@edu.com", "", "")
+        self.assertEqual([c["course_id"] for c in professor.get_courses()], ["DATA200", "DATA300"])
+        self.assertEqual([s["student_id"] for s in professor.get_students()], ["0", "1", "2", "3"])
+        self.assertEqual(Professor("", "", "cy@edu.com", "", "").get_courses(), [])
+
+    def test_course_roster(self):
+        """Test that a roster lists the course, every instructor and every student"""
+        roster = checkmygrade.course_roster("DATA200")
+        self.assertEqual(roster["course"]["course_name"], "Python")
+        self.assertEqual([p["name"] for p in roster["professors"]], ["Ada", "Bob"])
+        self.assertEqual([s["student_id"] for s in roster["students"]], ["0", "1", "2"])
+        self.assertEqual([p["professor_id"] for p in Course("DATA300", "", "", "").get_professors()], ["P2"])
+
+    def test_views_follow_writes(self):
+        """Test that the join indexes stay current across inserts, updates and deletes"""
+        checkmygrade.course_roster("DATA200")
+        Student("9", "New", "Student", "new@yahoo.com", "DATA300", "B", "85").add_new_student()
+        Student("0", "", "", "", "", "", "").update_student_record(new_course_id="DATA300")
+        Professor("P3", "", "", "", "").modify_professor_details(new_course_id="DATA300")
+        self.assertEqual([s["student_id"] for s in checkmygrade.students_of_course("DATA300")], ["3", "9", "0"])
+        self.assertEqual([p["name"] for p in checkmygrade.professors_of_course("DATA200")], ["Ada"])
+
+    def test_orphans(self):
+        """Test that students and professors of missing courses are reported, including after a course is deleted"""
+        orphans = checkmygrade.find_orphans()
+        self.assertEqual([s["student_id"] for s in orphans["students"]], ["4"])
+        self.assertEqual([p["professor_id"] for p in orphans["professors"]], ["P4"])
+        Course("DATA300", "", "", "").delete_new_course()
+        orphans = checkmygrade.find_orphans()
+        self.assertEqual([s["student_id"] for s in orphans["students"]], ["3", "4"])
+        self.assertEqual([p["professor_id"] for p in orphans["professors"]], ["P2", "P4"])
+
+    def test_batch_operations(self):
+        """Test the roster, professor_students and orphans operations"""
+        roster = checkmygrade.apply_operation({"op": "course_roster", "course_id": "DATA300"})
+        self.assertEqual((roster["course"]["course_id"], len(roster["professors"]), len(roster["students"])), ("DATA300", 1, 1))
+        result = checkmygrade.apply_operation({"op": "professor_students", "email": "bob@edu.com"})
+        self.assertEqual(len(result["students"]), 3)
+        self.assertFalse(checkmygrade.apply_operation({"op": "professor_students", "email": "nobody@edu.com"})["ok"])
+        self.assertEqual(len(checkmygrade.apply_operation({"op": "orphans"})["students"]), 1)
+
+
+class TestQueries(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        students = [Student(str(i), f"S{i}", f"T{i}", f"{'jo' if i % 3 == 0 else 'al'}{i}@yahoo.com",
+                            "DATA200" if i % 2 else "DATA300", "ABCDF"[i % 5], str(50 + i)) for i in range(40)]
+        write_csv("students.csv", [s.__dict__ for s in students], STUDENT_FIELDS)
+
+    def ids(self, rows):
+        return [r["student_id"] for r in rows]
+
+    def test_predicates(self):
+        """Test equality, between, in and prefix predicates, alone and combined"""
+        self.assertEqual(len(list(checkmygrade.query("students", "course_id = DATA200"))), 20)
+        self.assertEqual(self.ids(checkmygrade.query("students", "marks between 60 and 62.5")), ["10", "11", "12"])
+        self.assertEqual(self.ids(checkmygrade.query("students", "marks >= 88 and grade != 'D'")), ["39"])
+        self.assertEqual(self.ids(checkmygrade.query("students", "GRADE IN {A, B} and email prefix jo and marks < 70")),
+                         ["0", "6", "15"])
+        self.assertEqual(self.ids(checkmygrade.query("students", "email ^= al1 and course_id in (DATA300)")),
+                         ["10", "14", "16"])
+
+    def test_id_ranges_compare_numerically(self):
+        """Test that <, >= and between on ID columns compare IDs as numbers, as order= sorts them"""
+        self.assertEqual(sorted(self.ids(checkmygrade.query("students", "student_id < 3")), key=int), ["0", "1", "2"])
+        self.assertEqual(sorted(self.ids(checkmygrade.query("students", "student_id between 5 and 10")), key=int),
+                         [str(i) for i in range(5, 11)])
+        self.assertEqual(self.ids(checkmygrade.query("students", "student_id >= 38", order="student_id")), ["38", "39"])
+        self.assertEqual(len(list(checkmygrade.query("students", "course_id >= DATA300"))), 20)
+
+    def test_short_rows_do_not_match(self):
+        """Test that a CSV row missing its trailing columns is skipped by string predicates instead of failing"""
+        if checkmygrade.storage.name != "csv":
+            self.skipTest("short rows only exist in CSV files")
+        with open("students.csv", "a") as file:
+            file.write("40,Short\n")
+        table_cache.invalidate()
+        self.assertEqual(self.ids(checkmygrade.query("students", "email prefix jo3")), ["3", "30", "33", "36", "39"])
+        self.assertEqual(self.ids(checkmygrade.query("students", "grade in {A} and course_id >= DATA300 and marks >= 80")),
+                         ["30"])
+        self.assertEqual(self.ids(checkmygrade.query("students", "first_name between R and T")), [str(i) for i in range(41)])
+
+    def test_projection_and_pages(self):
+        """Test that fields, order, limit and offset select one page of projected rows"""
+        rows = list(checkmygrade.query("students", "course_id = DATA300", "student_id, marks", "-marks", limit=2, offset=1))
+        self.assertEqual(rows, [{"student_id": "36", "marks": "86"}, {"student_id": "34", "marks": "84"}])
+        self.assertEqual(self.ids(checkmygrade.query("students", order="-marks", limit=3)), ["39", "38", "37"])
+        self.assertEqual(list(checkmygrade.query("students", "marks > 100")), [])
+
+    def test_indexes_answer_predicates(self):
+        """Test that existing hash and range indexes give the same rows as a full scan"""
+        scanned = self.ids(checkmygrade.query("students", "course_id = DATA200 and marks between 70 and 80"))
+        table = checkmygrade.students_table()
+        table.index("course_id", unique=False)
+        table.range_index("marks")
+        self.assertEqual(len(checkmygrade._indexed_rows(table, checkmygrade.parse_query("marks between 70 and 80 and course_id = DATA200",
+                                                                                       STUDENT_FIELDS))), 11)
+        self.assertEqual(self.ids(checkmygrade.query("students", "course_id = DATA200 and marks between 70 and 80")), scanned)
+        self.assertEqual(self.ids(checkmygrade.query("students", "course_id in {DATA200, DATA999} and marks between 70 and 80")), scanned)
+
+    def test_invalid_queries(self):
+        """Test that malformed clauses, unknown fields and bad numbers are rejected before reading rows"""
+        for where in ["nickname = x", "marks between 1", "marks > abc", "grade in {A, B", "grade ~ A",
+                      "grade = A or grade = B", "grade = A and"]:
+            with self.assertRaises(ValueError, msg=where):
+                checkmygrade.query("students", where)
+        with self.assertRaises(ValueError):
+            checkmygrade.query("students", fields="nickname")
+        with self.assertRaises(ValueError):
+            checkmygrade.query("grades")
+
+    def test_batch_operation(self):
+        """Test the query operation and its errors"""
+        result = checkmygrade.apply_operation({"op": "query", "table": "courses", "where": "credits >= 3"})
+        self.assertEqual(result["rows"], [])
+        result = checkmygrade.apply_operation({"op": "query", "table": "students", "where": "marks > 87",
+                                               "fields": "email", "limit": "1"})
+        self.assertEqual(result["rows"], [{"email": "al38@yahoo.com"}])
+        self.assertFalse(checkmygrade.apply_operation({"op": "query", "table": "students", "where": "marks >"})["ok"])
+
+    def test_buffered_output(self):
+        """Test that write_lines batches many lines into few writes"""
+        class CountingStream(io.StringIO):
+            writes = 0
+
+            def write(self, text):
+                CountingStream.writes += 1
+                return super().write(text)
+
+        stream = CountingStream()
+        self.assertEqual(checkmygrade.write_lines((f"line {i}" for i in range(2500)), stream), 2500)
+        self.assertEqual(CountingStream.writes, 3)
+        self.assertEqual(stream.getvalue().count("\n"), 2500)
+
+
+class TestNameSearch(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        names = [("Jon", "Smith"), ("Jonathan", "Smithers"), ("John", "Smith"), ("Zoë", "O'Brien"),
+                 ("Joan", "Smit"), ("Amy", "Jonas"), ("Jon", "Smith")]
+        write_csv("students.csv", [Student(str(i), first, last, f"s{i}@yahoo.com", "DATA200", "A", "90").__dict__
+                                   for i, (first, last) in enumerate(names)], STUDENT_FIELDS)
+        write_csv("professors.csv", [{"professor_id": "P1", "name": "Ada Lovelace", "email": "ada@edu.com", "rank": "Professor", "course_id": "DATA200"},
+                                     {"professor_id": "P2", "name": "Alan Turing", "email": "alan@edu.com", "rank": "Lecturer", "course_id": "DATA200"}],
+                  ["professor_id", "name", "email", "rank", "course_id"])
+
+    def ids(self, text, limit=10):
+        return [s["student_id"] for s in Student.search_by_name(text, limit)]
+
+    def test_prefix_ranking(self):
+        """Test that exact words rank above prefixes, closer completions first, ties in table order"""
+        self.assertEqual(self.ids("Jon Smi", limit=3), ["0", "6", "1"])
+        self.assertEqual(self.ids("smith jon", limit=3), ["0", "6", "1"])
+        self.assertEqual(self.ids("jo"), ["0", "6", "2", "4", "5", "1"])
+        self.assertEqual(self.ids("jo", limit=2), ["0", "6"])
+
+    def test_accents_and_typos(self):
+        """Test accent-free matching and typo tolerance when too few names match by prefix"""
+        self.assertEqual(self.ids("ZOE o brien"), ["3"])
+        self.assertEqual(self.ids("zoe obrien"), ["3"])
+        self.assertEqual(self.ids("Jhon Smith"), ["2", "0", "6"])
+        self.assertEqual(sorted(self.ids("Smiht")), ["0", "2", "4", "6"])
+        # Near misses fill the results after every exact and prefix match
+        self.assertEqual(self.ids("Jon Smi"), ["0", "6", "1", "4", "2"])
+        self.assertEqual(self.ids("Xavier"), [])
+        self.assertEqual(self.ids("  "), [])
+
+    def test_index_follows_writes(self):
+        """Test that adds, name changes and deletes update the index in place"""
+        self.assertEqual(self.ids("zoe"), ["3"])
+        table = checkmygrade.students_table()
+        index = table.name_index(checkmygrade.NAME_COLUMNS["students"])
+        Student("7", "Zoey", "Park", "zoey@yahoo.com", "DATA200", "A", "90").add_new_student()
+        Student("3", "", "", "", "", "", "").update_student_record(new_first_name="Chloé")
+        Student("", "", "", "s0@yahoo.com", "", "", "").delete_new_student()
+        self.assertIs(checkmygrade.students_table().name_index(checkmygrade.NAME_COLUMNS["students"]), index)
+        self.assertEqual(self.ids("zoe"), ["7"])
+        self.assertEqual(self.ids("chloe"), ["3"])
+        self.assertEqual(self.ids("jon smith", limit=2), ["6", "1"])
+
+    def test_professors_and_batch(self):
+        """Test professor name search and the name_search operation"""
+        self.assertEqual([p["professor_id"] for p in Professor.search_by_name("a")], ["P1", "P2"])
+        result = checkmygrade.apply_operation({"op": "name_search", "table": "professors", "name": "lovelace", "limit": "1"})
+        self.assertEqual([(r["professor_id"], r["score"]) for r in result["rows"]], [("P1", 3.0)])
+        self.assertFalse(checkmygrade.apply_operation({"op": "name_search", "table": "courses", "name": "x"})["ok"])
+
+
+class TestAuthentication(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.old_settings = checkmygrade.PASSWORD_COST, checkmygrade.PASSWORD_SCHEME, checkmygrade.sessions
+        checkmygrade.PASSWORD_COST = 1000
+        checkmygrade.sessions = checkmygrade.SessionCache()
+        legacy = hashlib.sha256(b"old-secret").hexdigest()
+        write_csv("login.csv", [{"email": "old@edu.com", "password": legacy, "role": "admin"}], ["email", "password", "role"])
+
+    def tearDown(self):
+        checkmygrade.PASSWORD_COST, checkmygrade.PASSWORD_SCHEME, checkmygrade.sessions = self.old_settings
+        super().tearDown()
+
+    def stored(self, email):
+        table_cache.invalidate()
+        return checkmygrade.credential(email)["password"]
+
+    def test_salted_hashes(self):
+        """Test that hashes are salted, self-describing and verified against the right password only"""
+        first, second = checkmygrade.encrypt_password("pw"), checkmygrade.encrypt_password("pw")
+        self.assertNotEqual(first, second)
+        self.assertTrue(first.startswith("pbkdf2_sha256$1000$"))
+        self.assertTrue(checkmygrade.decrypt_password(first, "pw"))
+        self.assertFalse(checkmygrade.decrypt_password(first, "pw2"))
+        self.assertFalse(checkmygrade.decrypt_password("pbkdf2_sha256$x$00$00", "pw"))
+        checkmygrade.PASSWORD_SCHEME = "scrypt"
+        checkmygrade.PASSWORD_COST = 2 ** 10
+        self.assertTrue(checkmygrade.decrypt_password(checkmygrade.encrypt_password("pw"), "pw"))
+        self.assertTrue(checkmygrade.decrypt_password(first, "pw"))
+        self.assertTrue(checkmygrade.needs_rehash(first))
+
+    def test_register_and_login(self):
+        """Test that a registered user can log in with the password they chose (not its hash)"""
+        with contextlib.redirect_stdout(io.StringIO()):
+            LoginUser("New@Edu.com", "secret", "student").register_user()
+            self.assertTrue(LoginUser("new@edu.com", "secret", "").login())
+            self.assertFalse(LoginUser("new@edu.com", "wrong", "").login())
+            self.assertFalse(LoginUser("nobody@edu.com", "secret", "").login())
+        self.assertFalse(checkmygrade.needs_rehash(self.stored("new@edu.com")))
+
+    def test_legacy_and_weak_hashes_upgrade_on_login(self):
+        """Test that a legacy SHA-256 row, then a row below the current cost, is re-hashed by a successful login"""
+        self.assertIsNone(checkmygrade.authenticate("old@edu.com", "wrong"))
+        self.assertEqual(len(self.stored("old@edu.com")), 64)
+        self.assertEqual(checkmygrade.authenticate("OLD@edu.com", "old-secret")["role"], "admin")
+        self.assertTrue(self.stored("old@edu.com").startswith("pbkdf2_sha256$1000$"))
+        checkmygrade.PASSWORD_COST = 2000
+        self.assertIsNotNone(checkmygrade.authenticate("old@edu.com", "old-secret"))
+        self.assertTrue(self.stored("old@edu.com").startswith("pbkdf2_sha256$2000$"))
+
+    def test_login_reads_one_credential(self):
+        """Test that a cold login looks its email up without loading login.csv"""
+        checkmygrade.authenticate("old@edu.com", "old-secret")
+        table_cache.invalidate()
+        old_enabled, checkmygrade.OFFSET_INDEX_ENABLED = checkmygrade.OFFSET_INDEX_ENABLED, True
+        try:
+            self.assertIsNotNone(checkmygrade.authenticate("old@edu.com", "old-secret"))
+            self.assertIsNone(checkmygrade.authenticate("nobody@edu.com", "old-secret"))
+        finally:
+            checkmygrade.OFFSET_INDEX_ENABLED = old_enabled
+        self.assertIsNone(table_cache.peek("login.csv"))
+
+    def test_sessions(self):
+        """Test that session tokens authorize password changes and that a change ends the user's other sessions"""
+        first = checkmygrade.apply_operation({"op": "login", "email": "old@edu.com", "password": "old-secret"})["token"]
+        second = checkmygrade.login_session("old@edu.com", "old-secret")
+        self.assertEqual(checkmygrade.sessions.check(first), ("old@edu.com", "admin"))
+        result = checkmygrade.apply_operation({"op": "change_password", "email": "old@edu.com", "token": first, "new_password": "n3w"})
+        self.assertTrue(result["ok"])
+        self.assertIsNotNone(checkmygrade.sessions.check(first))
+        self.assertIsNone(checkmygrade.sessions.check(second))
+        self.assertFalse(checkmygrade.apply_operation({"op": "change_password", "email": "other@edu.com", "token": first,
+                                                       "new_password": "x"})["ok"])
+        self.assertIsNotNone(checkmygrade.authenticate("old@edu.com", "n3w"))
+        checkmygrade.apply_operation({"op": "logout", "token": first})
+        self.assertIsNone(checkmygrade.sessions.check(first))
+
+    def test_session_expiry_and_bound(self):
+        """Test that idle sessions expire and the least recently used are dropped past the limit"""
+        cache = checkmygrade.SessionCache(ttl=-1)
+        self.assertIsNone(cache.check(cache.open("a@edu.com", "student")))
+        cache = checkmygrade.SessionCache(max_sessions=2)
+        tokens = [cache.open(f"{i}@edu.com", "student") for i in range(3)]
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.check(tokens[0]))
+        self.assertEqual(cache.check(tokens[2]), ("2@edu.com", "student"))
+
+    def test_calibration(self):
+        """Test that calibration never suggests less than the scheme's minimum cost"""
+        self.assertEqual(checkmygrade.calibrate_password_cost(target=0.0), checkmygrade.MIN_PASSWORD_COSTS["pbkdf2_sha256"])
+
+
+class TestStudentShards(TempDirTestCase):
+    backend = "csv"
+
+    def setUp(self):
+        super().setUp()
+        students = [dict(s.__dict__) for s in STUDENTS]
+        students[3]["course_id"] = "DATA300"
+        students[4]["course_id"] = "DATA 404/x"
+        write_csv("students.csv", students, STUDENT_FIELDS)
+        write_csv("courses.csv", [{"course_id": "DATA200", "course_name": "Python", "credits": "4", "description": ""},
+                                  {"course_id": "DATA300", "course_name": "SQL", "credits": "3", "description": ""}],
+                  ["course_id", "course_name", "credits", "description"])
+        self.assertEqual(checkmygrade.shard_students(), 3)
+
+    def test_migration_round_trip(self):
+        """Test that sharding replaces students.csv with one file per course and unsharding restores it"""
+        self.assertFalse(os.path.exists("students.csv"))
+        self.assertEqual(len(checkmygrade.shard_files()), 3)
+        self.assertEqual(len(load_csv(checkmygrade.shard_file("DATA200"))), 3)
+        with self.assertRaises(ValueError):
+            checkmygrade.shard_students()
+        self.assertEqual(checkmygrade.unshard_students(), 5)
+        self.assertFalse(os.path.exists(checkmygrade.SHARD_DIR))
+        self.assertEqual(sorted(s["student_id"] for s in load_csv("students.csv")), ["0", "1", "2", "3", "4"])
+
+    def test_course_reads_touch_one_shard(self):
+        """Test that course-scoped reads load only that course's shard"""
+        checkmygrade.table_cache.invalidate()
+        self.assertEqual(Course("DATA300", "", "", "").get_median_score(), 83.0)
+        self.assertEqual([s["student_id"] for s in checkmygrade.students_of_course("DATA300")], ["3"])
+        loaded = {os.path.basename(path) for path in checkmygrade.table_cache._tables}
+        self.assertEqual(loaded, {"course-DATA300.csv"})
+
+    def test_update_moves_between_shards(self):
+        """Test that changing course_id moves the row to the new shard and repoints the directory"""
+        Student("0", "", "", "", "", "", "").update_student_record(new_course_id="DATA300", new_marks="99")
+        self.assertEqual([s["student_id"] for s in load_csv(checkmygrade.shard_file("DATA200"))], ["1", "2"])
+        self.assertEqual([(s["student_id"], s["marks"]) for s in load_csv(checkmygrade.shard_file("DATA300"))],
+                         [("3", "83"), ("0", "99")])
+        self.assertEqual(Student.search("s0@yahoo.com").course_id, "DATA300")
+        self.assertEqual(Student.search("s1@yahoo.com").course_id, "DATA200")
+
+    def test_failed_move_leaves_one_copy(self):
+        """Test that a move failing after the copy into the new shard is undone as a whole"""
+        delete_rows = checkmygrade.delete_rows
+
+        def fail(*args):
+            raise OSError("crash")
+        checkmygrade.delete_rows = fail
+        try:
+            with self.assertRaises(OSError):
+                Student("0", "", "", "", "", "", "").update_student_record(new_course_id="DATA300")
+        finally:
+            checkmygrade.delete_rows = delete_rows
+        table_cache.invalidate()
+        self.assertEqual(sorted(s["student_id"] for s in checkmygrade.students_table().rows), ["0", "1", "2", "3", "4"])
+        self.assertEqual(Student.search("s0@yahoo.com").course_id, "DATA200")
+
+    def test_add_delete_and_search(self):
+        """Test that adds claim the student_id in the directory and deletes go through it"""
+        Student("9", "New", "Student", "new@yahoo.com", "DATA500", "B", "85").add_new_student()
+        Student("9", "Dup", "Student", "dup@yahoo.com", "DATA200", "B", "85").add_new_student()
+        self.assertEqual(Student.search("new@yahoo.com").course_id, "DATA500")
+        self.assertIsNone(Student.search("dup@yahoo.com"))
+        Student("", "", "", "s3@yahoo.com", "", "", "").delete_new_student()
+        self.assertIsNone(Student.search("s3@yahoo.com"))
+        self.assertEqual(load_csv(checkmygrade.shard_file("DATA300")), [])
+        result = checkmygrade.bulk_insert_students([{"student_id": "10", "email": "a@x.com", "course_id": "DATA300"},
+                                                    {"student_id": "1", "email": "b@x.com", "course_id": "DATA300"}])
+        self.assertEqual((result["added"], len(result["rejected"])), (1, 1))
+
+    def test_whole_table_views(self):
+        """Test that orphans, statistics and sorting see every shard and follow writes"""
+        self.assertEqual([s["student_id"] for s in checkmygrade.find_orphans()["students"]], ["4"])
+        self.assertEqual(Course.statistics()["DATA200"]["count"], 3)
+        Student("1", "", "", "", "", "", "").update_student_record(new_course_id="DATA999")
+        self.assertEqual([s["student_id"] for s in checkmygrade.find_orphans()["students"]], ["4", "1"])
+        self.assertEqual([s["student_id"] for s in Student.sorted_records("marks", descending=True)], ["4", "3", "2", "1", "0"])
+
+    def test_buffered_new_shard_is_in_views(self):
+        """Test that a student added to a course with no shard file yet shows up before the buffer flushes"""
+        with checkmygrade.buffered_writes():
+            Student("9", "New", "Student", "new@yahoo.com", "DATA999", "B", "85").add_new_student()
+            self.assertFalse(os.path.exists(checkmygrade.shard_file("DATA999")))
+            self.assertIn("9", [s["student_id"] for s in checkmygrade.students_table().rows])
+            self.assertEqual([r["student_id"] for r in checkmygrade.query("students", "course_id = DATA999")], ["9"])
+            self.assertEqual(Course.statistics()["DATA999"]["count"], 1)
+        self.assertTrue(os.path.exists(checkmygrade.shard_file("DATA999")))
+        self.assertEqual(len(checkmygrade.students_table().rows), 6)
+
+
+class TestWriteBuffer(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        write_csv("students.csv", [s.__dict__ for s in STUDENTS], STUDENT_FIELDS)
+
+    def test_writes_are_held_until_flush(self):
+        """Test that buffered writes are visible to reads at once and reach storage together on flush"""
+        with checkmygrade.buffered_writes() as buffer:
+            Student("9", "New", "Student", "new@yahoo.com", "DATA300", "B", "85").add_new_student()
+            Student("1", "", "", "", "", "", "").update_student_record(new_grade="C")
+            Student("", "", "", "s2@yahoo.com", "", "", "").delete_new_student()
+            self.assertEqual(buffer.pending, 3)
+            self.assertEqual(Student.search("new@yahoo.com").grade, "B")
+        self.assertEqual(buffer.pending, 0)
+        table_cache.invalidate()
+        students = {s["student_id"]: s for s in load_csv("students.csv")}
+        self.assertEqual(sorted(students), ["0", "1", "3", "4", "9"])
+        self.assertEqual(students["1"]["grade"], "C")
+
+    def test_transaction_flushes_buffer_first(self):
+        """Test that a rolled-back transaction does not take earlier buffered writes with it"""
+        with checkmygrade.buffered_writes():
+            Student("1", "", "", "", "", "", "").update_student_record(new_grade="C")
+            with self.assertRaises(RuntimeError):
+                with transaction():
+                    Student("3", "", "", "", "", "", "").update_student_record(new_grade="F")
+                    raise RuntimeError("abort")
+        table_cache.invalidate()
+        students = load_csv("students.csv")
+        self.assertEqual((students[1]["grade"], students[3]["grade"]), ("C", "A"))
+
+
+class TestCsvWriteBuffer(TempDirTestCase):
+    backend = "csv"
+
+    def setUp(self):
+        super().setUp()
+        write_csv("students.csv", [s.__dict__ for s in STUDENTS], STUDENT_FIELDS)
+
+    def test_failed_flush_retries_without_duplicates(self):
+        """Test that a flush failing after the row append writes each buffered change once on retry"""
+        append_records = checkmygrade._append_records
+        calls = []
+
+        def fail_once(path, records):
+            calls.append(path)
+            if len(calls) == 1:
+                raise OSError("disk full")
+            append_records(path, records)
+
+        buffer = checkmygrade.WriteBuffer()
+        with checkmygrade.buffered_writes(buffer):
+            Student("9", "New", "Student", "new@yahoo.com", "DATA300", "B", "85").add_new_student()
+            Student("1", "", "", "", "", "", "").update_student_record(new_grade="C")
+            checkmygrade._append_records = fail_once
+            try:
+                with self.assertRaises(OSError):
+                    buffer.flush()
+                self.assertEqual(buffer.pending, 2)
+                self.assertEqual(buffer.flush(), 2)
+            finally:
+                checkmygrade._append_records = append_records
+        with open("students.csv") as file:
+            self.assertEqual(sum(line.startswith("9,") for line in file), 1)
+        table_cache.invalidate()
+        students = {s["student_id"]: s for s in load_csv("students.csv")}
+        self.assertEqual(sorted(students), ["0", "1", "2", "3", "4", "9"])
+        self.assertEqual(students["1"]["grade"], "C")
+
+    def test_one_append_per_table(self):
+        """Test that many buffered updates land as a single log append"""
+        with checkmygrade.buffered_writes():
+            for i in range(50):
+                Student(str(i % 5), "", "", "", "", "", "").update_student_record(new_marks=str(i))
+            self.assertFalse(os.path.exists("students.csv.log"))
+            with open("students.csv") as file:
+                self.assertEqual(len(file.readlines()), 6)
+        with open("students.csv.log") as file:
+            self.assertEqual(len(file.readlines()), 50)
+        table_cache.invalidate()
+        self.assertEqual([s["marks"] for s in load_csv("students.csv")], ["45", "46", "47", "48", "49"])
+
+    def test_replays_on_top_of_other_writers(self):
+        """Test that a flush after another process wrote the table keeps both sets of changes"""
+        with checkmygrade.buffered_writes():
+            Student("8", "Mine", "Student", "mine@yahoo.com", "DATA300", "B", "85").add_new_student()
+            Student("1", "", "", "", "", "", "").update_student_record(new_grade="C")
+            context = multiprocessing.get_context("fork")
+            process = context.Process(target=_append_worker, args=(self.tmp_dir,))
+            process.start()
+            process.join(60)
+            self.assertEqual(process.exitcode, 0)
+        table_cache.invalidate()
+        students = {s["student_id"]: s for s in load_csv("students.csv")}
+        self.assertEqual(sorted(students), ["0", "1", "3", "4", "8", "9"])
+        self.assertEqual(students["1"]["grade"], "C")
+
+
+class WriteBehindTestCase(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        write_csv("students.csv", [s.__dict__ for s in STUDENTS], STUDENT_FIELDS)
+        write_csv("professors.csv", [{"professor_id": "P1", "name": "Dr. A", "email": "a@edu.com", "rank": "Lecturer",
+                                      "course_id": "DATA200"}], ["professor_id", "name", "email", "rank", "course_id"])
+        self.write_behind = None
+
+    def tearDown(self):
+        if self.write_behind is not None:
+            self.write_behind.stop()
+        super().tearDown()
+
+    def start(self, interval=3600, max_ops=100):
+        self.write_behind = checkmygrade.WriteBehind(interval, max_ops).start()
+        return self.write_behind
+
+    def stored_marks(self):
+        table_cache.invalidate()
+        return [s["marks"] for s in load_csv("students.csv")]
+
+class TestWriteBehind(WriteBehindTestCase):
+
+    def test_edits_wait_for_save(self):
+        """Test that edits are pending, visible to reads and only reach storage on save"""
+        write_behind = self.start()
+        Student("1", "", "", "", "", "", "").update_student_record(new_marks="11")
+        Student("2", "", "", "", "", "", "").update_student_record(new_marks="22")
+        self.assertEqual(write_behind.pending, 2)
+        self.assertEqual(write_behind.dirty_files(), ["students.csv"])
+        self.assertEqual(Student.search("s1@yahoo.com").marks, "11")
+        self.assertEqual(write_behind.save(), 2)
+        self.assertEqual((write_behind.pending, write_behind.dirty_files()), (0, []))
+        self.assertEqual(self.stored_marks(), ["80", "11", "22", "83", "84"])
+
+    def test_pending_edits_hold_no_database_lock(self):
+        """Test that another connection can write the database while edits are pending"""
+        if checkmygrade.storage.name != "sqlite":
+            self.skipTest("CSV appends take their lock only while saving")
+        write_behind = self.start()
+        Student("1", "", "", "", "", "", "").update_student_record(new_marks="11")
+        conn = sqlite3.connect(checkmygrade.SQLITE_DB_NAME, timeout=0.1)
+        try:
+            conn.execute("UPDATE students SET grade = 'D' WHERE student_id = '3'")
+            conn.commit()
+        finally:
+            conn.close()
+        self.assertEqual(write_behind.save(), 1)
+        table_cache.invalidate()
+        students = load_csv("students.csv")
+        self.assertEqual((students[1]["marks"], students[3]["grade"]), ("11", "D"))
+
+    def test_saves_after_max_ops(self):
+        """Test that the operation reaching max_ops buffered writes saves them"""
+        write_behind = self.start(max_ops=3)
+        for i in range(2):
+            Student(str(i), "", "", "", "", "", "").update_student_record(new_marks="50")
+        write_behind.idle()
+        self.assertEqual(write_behind.pending, 2)
+        Professor("P1", "", "", "", "").modify_professor_details(new_rank="Professor")
+        write_behind.idle()
+        self.assertEqual(write_behind.pending, 0)
+        self.assertEqual(self.stored_marks(), ["50", "50", "82", "83", "84"])
+
+    def test_saves_after_interval(self):
+        """Test that pending writes older than the interval are saved between operations"""
+        write_behind = self.start()
+        Student("1", "", "", "", "", "", "").update_student_record(new_marks="11")
+        write_behind.idle()
+        self.assertEqual(write_behind.pending, 1)
+        write_behind.last_save -= 3600
+        write_behind.idle()
+        self.assertEqual(write_behind.pending, 0)
+
+    @unittest.skipUnless(hasattr(checkmygrade.signal, "setitimer"), "needs setitimer")
+    def test_timer_saves_while_idle(self):
+        """Test that the timer saves pending writes, but not in the middle of an operation"""
+        write_behind = self.start(interval=0.02)
+        Student("1", "", "", "", "", "", "").update_student_record(new_marks="11")
+        write_behind.busy = True
+        time.sleep(0.1)
+        self.assertEqual(write_behind.pending, 1)
+        write_behind.busy = False
+        deadline = time.monotonic() + 5
+        while write_behind.pending and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(write_behind.pending, 0)
+        self.assertEqual(self.stored_marks()[1], "11")
+
+    def test_stop_saves_and_restores_signals(self):
+        """Test that stopping saves, leaves write-behind mode and can be repeated"""
+        handler = checkmygrade.signal.getsignal(checkmygrade.signal.SIGTERM)
+        write_behind = self.start()
+        Student("1", "", "", "", "", "", "").update_student_record(new_marks="11")
+        self.assertEqual(write_behind.stop(), 1)
+        self.assertEqual(write_behind.stop(), 0)
+        self.assertFalse(write_behind.active)
+        self.assertIs(checkmygrade.signal.getsignal(checkmygrade.signal.SIGTERM), handler)
+        Student("2", "", "", "", "", "", "").update_student_record(new_marks="22")
+        self.assertEqual(self.stored_marks(), ["80", "11", "22", "83", "84"])
+
+    def test_sigterm_exits_cleanly(self):
+        """Test that SIGTERM unwinds with SystemExit, so pending writes are saved on the way out"""
+        write_behind = self.start()
+        Student("1", "", "", "", "", "", "").update_student_record(new_marks="11")
+        with self.assertRaises(SystemExit) as caught:
+            os.kill(os.getpid(), checkmygrade.signal.SIGTERM)
+            time.sleep(1)
+        self.assertEqual(caught.exception.code, 128 + checkmygrade.signal.SIGTERM)
+        write_behind.stop()
+        self.assertEqual(self.stored_marks()[1], "11")
+
+    def test_sigterm_waits_for_the_operation(self):
+        """Test that a SIGTERM during an operation exits only once the menu is back between operations"""
+        write_behind = self.start()
+        write_behind.busy = True
+        with contextlib.redirect_stderr(io.StringIO()):
+            os.kill(os.getpid(), checkmygrade.signal.SIGTERM)
+            Student("1", "", "", "", "", "", "").update_student_record(new_marks="11")
+        with self.assertRaises(SystemExit):
+            write_behind.idle()
+        self.assertEqual(write_behind.stop(), 1)
+        self.assertEqual(self.stored_marks()[1], "11")
+
+    def test_sigterm_during_save_exits_after_it(self):
+        """Test that a SIGTERM arriving mid-save lets the save finish and is not repeated by the exit-time save"""
+        write_behind = self.start()
+        Student("9", "New", "Student", "new@yahoo.com", "DATA300", "B", "85").add_new_student()
+        flush = write_behind.buffer.flush
+
+        def interrupted_flush():
+            os.kill(os.getpid(), checkmygrade.signal.SIGTERM)
+            return flush()
+        write_behind.buffer.flush = interrupted_flush
+        with contextlib.redirect_stderr(io.StringIO()), self.assertRaises(SystemExit):
+            write_behind.save()
+        del write_behind.buffer.flush
+        self.assertEqual(write_behind.pending, 0)
+        self.assertEqual(write_behind.stop(), 0)
+        self.assertEqual(self.stored_marks().count("85"), 1)
+
+    def test_modify_grade_joins_pending_edits(self):
+        """Test that changing a grade and regrading its students are buffered like other edits"""
+        write_csv("grades.csv", [{"grade_id": "1", "grade": "A", "marks_range": "90-100"},
+                                 {"grade_id": "2", "grade": "A", "marks_range": "80-90"}], ["grade_id", "grade", "marks_range"])
+        before = os.stat(checkmygrade.SQLITE_DB_NAME if checkmygrade.storage.name == "sqlite" else "grades.csv").st_mtime_ns
+        write_behind = self.start()
+        result = Grade("2", "", "").modify_grade("B", "80-90")
+        self.assertEqual(result["changed"], 5)
+        self.assertEqual(write_behind.pending, 6)
+        self.assertEqual(sorted(write_behind.dirty_files()), ["grades.csv", "students.csv"])
+        self.assertEqual(os.stat(checkmygrade.SQLITE_DB_NAME if checkmygrade.storage.name == "sqlite" else "grades.csv").st_mtime_ns,
+                         before)
+        write_behind.save()
+        table_cache.invalidate()
+        self.assertEqual(load_csv("grades.csv")[1]["grade"], "B")
+        self.assertTrue(all(s["grade"] == "B" for s in load_csv("students.csv")))
+
+
+class TestCsvWriteBehind(WriteBehindTestCase):
+    backend = "csv"
+
+    def test_untouched_files_are_not_written(self):
+        """Test that nothing is written before a save and only changed files are written by it"""
+        write_behind = self.start()
+        for i in range(30):
+            Student(str(i % 5), "", "", "", "", "", "").update_student_record(new_marks=str(i))
+        professors = os.stat("professors.csv").st_mtime_ns
+        self.assertFalse(os.path.exists("students.csv.log"))
+        write_behind.save()
+        with open("students.csv.log") as file:
+            self.assertEqual(len(file.readlines()), 30)
+        self.assertEqual(os.stat("professors.csv").st_mtime_ns, professors)
+        self.assertFalse(os.path.exists("professors.csv.log"))
+
+
+class TestGradeServer(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        write_csv("students.csv", [s.__dict__ for s in STUDENTS], STUDENT_FIELDS)
+        write_csv("grades.csv", [{"grade_id": "1", "grade": "A", "marks_range": "80-100"}], ["grade_id", "grade", "marks_range"])
+
+    async def request(self, port, method, path, payload=None):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        body = json.dumps(payload).encode() if payload is not None else b""
+        writer.write(f"{method} {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+        response = await reader.read()
+        writer.close()
+        head, _, data = response.partition(b"\r\n\r\n")
+        return int(head.split()[1]), json.loads(data)
+
+    def test_reads_writes_and_batched_flush(self):
+        """Test that the service answers reads, acknowledges concurrent writes after one shared flush"""
+        async def scenario():
+            server = await checkmygrade.GradeServer(port=0, flush_interval=0.05).start()
+            try:
+                status, found = await self.request(server.port, "GET", "/api/get_student?email=s3%40yahoo.com")
+                self.assertEqual((status, found["student"]["marks"]), (200, "83"))
+                updates = [self.request(server.port, "POST", "/api/update_student", {"student_id": str(i), "grade": "B"})
+                           for i in range(5)]
+                results = await asyncio.gather(*updates)
+                self.assertEqual([status for status, _ in results], [200] * 5)
+                self.assertEqual(server.buffer.flushes, 1)
+                status, missing = await self.request(server.port, "POST", "/api/update_student", {"student_id": "404", "grade": "B"})
+                self.assertEqual((status, missing["error"]), (400, "Student not found"))
+                self.assertEqual((await self.request(server.port, "GET", "/api/update_student?student_id=1"))[0], 405)
+                self.assertEqual((await self.request(server.port, "GET", "/api/login?email=a%40b.com&password=x"))[0], 405)
+                self.assertEqual((await self.request(server.port, "GET", "/api/fly"))[0], 404)
+                self.assertEqual((await self.request(server.port, "POST", "/api/add_course", [1]))[0], 400)
+                status, rank = await self.request(server.port, "GET", "/api/class_rank?email=s4%40yahoo.com")
+                self.assertEqual(rank["rank"], 1)
+            finally:
+                await server.close()
+        asyncio.run(scenario())
+        table_cache.invalidate()
+        self.assertTrue(all(s["grade"] == "B" for s in load_csv("students.csv")))
+
+    def test_login_hashes_off_the_event_loop(self):
+        """Test that reads are answered while a login is still hashing its password"""
+        old_cost, checkmygrade.PASSWORD_COST = checkmygrade.PASSWORD_COST, 1000
+        decrypt_password = checkmygrade.decrypt_password
+
+        def slow_decrypt(encrypted, original):
+            time.sleep(0.5)
+            return decrypt_password(encrypted, original)
+
+        write_csv("login.csv", [{"email": "a@b.com", "password": checkmygrade.encrypt_password("pw"), "role": "student"}],
+                  ["email", "password", "role"])
+
+        async def scenario():
+            server = await checkmygrade.GradeServer(port=0, flush_interval=0.05).start()
+            try:
+                login = asyncio.ensure_future(self.request(server.port, "POST", "/api/login", {"email": "a@b.com", "password": "pw"}))
+                await asyncio.sleep(0.1)
+                status, found = await self.request(server.port, "GET", "/api/get_student?email=s3%40yahoo.com")
+                self.assertEqual(status, 200)
+                self.assertFalse(login.done())
+                status, result = await login
+                self.assertEqual((status, len(checkmygrade.sessions.check(result["token"]))), (200, 2))
+            finally:
+                await server.close()
+        checkmygrade.decrypt_password = slow_decrypt
+        try:
+            asyncio.run(scenario())
+        finally:
+            checkmygrade.decrypt_password = decrypt_password
+            checkmygrade.PASSWORD_COST = old_cost
+
+
+class TestCourseStatistics(TempDirTestCase):
+
+    def test_statistics_single_pass(self):
+        """Test per-course statistics, including decimal marks and junk values"""
+        students = [{"course_id": "DATA200", "marks": m} for m in ("90", "80.5", "70", "n/a")]
+        students.append({"course_id": "DATA300", "marks": "100"})
+        report = course_statistics(students)
+
+        self.assertEqual(sorted(report), ["DATA200", "DATA300"])
+        data200 = report["DATA200"]
+        self.assertEqual(data200["count"], 3)
+        self.assertEqual(data200["median"], 80.5)
+        self.assertAlmostEqual(data200["mean"], 80.1666666, places=5)
+        self.assertEqual((data200["min"], data200["max"]), (70, 90))
+        self.assertAlmostEqual(data200["stdev"], statistics.pstdev([90, 80.5, 70]))
+        self.assertEqual(data200["histogram"][7:], [1, 1, 1])
+        self.assertEqual(report["DATA300"]["histogram"][-1], 1)
+
+    def test_median_keeps_decimal_marks(self):
+        """Test that get_median_score no longer drops decimal marks"""
+        write_csv("students.csv", [{"student_id": "1", "course_id": "DATA200", "marks": "90.5"}], ["student_id", "course_id", "marks"])
+        self.assertEqual(Course("DATA200", "", "", "").get_median_score(), 90.5)
+
+class TestCourseRanking(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        write_csv("students.csv", [s.__dict__ for s in STUDENTS], STUDENT_FIELDS)
+
+    def test_median_and_percentile_follow_writes(self):
+        """Test that median and percentiles stay correct across add, update and delete"""
+        course = Course("DATA200", "", "", "")
+        self.assertEqual(course.get_median_score(), 82)
+        Student("5", "New", "Student", "s5@yahoo.com", "DATA200", "A", "100.5").add_new_student()
+        self.assertEqual(course.get_median_score(), 82.5)
+        Student("0", "", "", "", "", "", "").update_student_record(new_course_id="DATA300")
+        Student("", "", "", "s4@yahoo.com", "", "", "").delete_new_student()
+        self.assertEqual(course.get_median_score(), 82.5)
+        self.assertEqual(course.get_percentile(0), 81)
+        self.assertEqual(course.get_percentile(100), 100.5)
+        self.assertEqual(Course("DATA300", "", "", "").get_median_score(), 80)
+
+    def test_class_rank(self):
+        """Test a student's rank and percentile within their course"""
+        student = Student.search("s3@yahoo.com")
+        self.assertEqual(student.class_rank(), (2, 5, 80.0))
+        self.assertIsNone(Student("9", "", "", "", "DATA999", "", "90").class_rank())
+
+class TestTypedSorting(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        rows = [("1", "DATA300", "90"), ("2", "DATA200", "100"), ("3", "DATA200", "95.5"), ("10", "DATA300", "n/a"), ("4", "DATA200", "9")]
+        write_csv("students.csv", [{"student_id": i, "email": f"s{i}@yahoo.com", "course_id": c, "marks": m} for i, c, m in rows],
+                  STUDENT_FIELDS)
+
+    def ids(self, rows):
+        return [s["student_id"] for s in rows]
+
+    def test_marks_sort_numerically(self):
+        """Test that marks sort as numbers, not strings, with junk last"""
+        self.assertEqual(self.ids(Student.sorted_records("marks")), ["4", "1", "3", "2", "10"])
+        self.assertEqual(self.ids(Student.sorted_records("student_id")), ["1", "2", "3", "4", "10"])
+
+    def test_multi_key_mixed_direction(self):
+        """Test sorting by course_id ascending then marks descending"""
+        self.assertEqual(self.ids(Student.sorted_records("course_id,-marks")), ["2", "3", "4", "1", "10"])
+
+    def test_top_k_matches_full_sort(self):
+        """Test that a heap-selected top-k equals the head of the full sort"""
+        top = self.ids(Student.sorted_records("marks", descending=True, limit=2))
+        self.assertEqual(top, self.ids(Student.sorted_records("-marks"))[:2])
+
+    def test_cached_order_invalidated_on_write(self):
+        """Test that a cached sort order is dropped when the table changes"""
+        Student.sorted_records("email")
+        Student("5", "", "", "a@yahoo.com", "DATA200", "", "50").add_new_student()
+        self.assertEqual(Student.sorted_records("email")[0]["email"], "a@yahoo.com")
+
+    def test_cached_order_is_not_shared(self):
+        """Test that changing a returned order does not change what the next caller gets"""
+        for _ in range(2):
+            students = Student.sorted_records("marks")
+            students.reverse()
+            del students[0]
+        self.assertEqual(self.ids(Student.sorted_records("marks")), ["4", "1", "3", "2", "10"])
+
+    def test_invalid_key(self):
+        """Test that unknown sort keys are rejected"""
+        with self.assertRaises(ValueError):
+            Student.sorted_records("password")
+
+    def test_short_rows_sort_last(self):
+        """Test that a CSV row missing its trailing columns sorts as unparsable instead of failing"""
+        if checkmygrade.storage.name != "csv":
+            self.skipTest("short rows only exist in CSV files")
+        with open("students.csv", "a") as file:
+            file.write("11,Short\n")
+        table_cache.invalidate()
+        self.assertEqual(self.ids(Student.sorted_records("course_id,-marks")), ["11", "2", "3", "4", "1", "10"])
+        self.assertEqual(self.ids(Student.sorted_records("marks"))[-2:], ["11", "10"])
+
+class TestGradeScale(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        write_csv("grades.csv", [{"grade_id": "12", "grade": "B", "marks_range": "80-90"},
+                                 {"grade_id": "13", "grade": "C", "marks_range": "70-80"},
+                                 {"grade_id": "14", "grade": "A", "marks_range": "90-100"},
+                                 {"grade_id": "15", "grade": "D", "marks_range": "50-60"}], ["grade_id", "grade", "marks_range"])
+        write_csv("students.csv", [s.__dict__ for s in STUDENTS], STUDENT_FIELDS)
+
+    def test_lookup_uses_half_open_intervals(self):
+        """Test bisect lookup, shared bounds, the inclusive top bound and gaps"""
+        scale = Grade.scale()
+        self.assertEqual([scale.lookup(m) for m in ("80", "79.5", "100", "90", "65", "101", "x")],
+                         ["B", "C", "A", "A", None, None, None])
+
+    def test_validation_reports_gaps_and_overlaps(self):
+        """Test that gaps, overlaps and malformed ranges are reported"""
+        Grade("16", "E", "55-72").add_grade()
+        Grade("17", "F", "oops").add_grade()
+        problems = Grade.scale().problems
+        self.assertTrue(any("invalid marks range" in p for p in problems))
+        self.assertTrue(any("overlaps" in p for p in problems))
+
+    def test_regrade_all(self):
+        """Test that every student's grade is recomputed from marks in one pass"""
+        result = Grade.regrade_all()
+        self.assertEqual(result, {"checked": 5, "changed": 5, "ungraded": 0})
+        self.assertFalse(os.path.exists("students.csv.log"))
+        self.assertEqual({s["grade"] for s in load_csv("students.csv")}, {"B"})
+
+    def test_modify_grade_regrades_affected_rows_only(self):
+        """Test that modifying a range only regrades students in the old or new range"""
+        Student("1", "", "", "", "", "", "").update_student_record(new_grade="Z", new_marks="95")
+        result = Grade("12", "", "").modify_grade("B+", "80-83")
+        self.assertEqual(result["checked"], 4)
+        grades = {s["student_id"]: s["grade"] for s in load_csv("students.csv")}
+        self.assertEqual(grades, {"0": "B+", "1": "Z", "2": "B+", "3": "A", "4": "A"})
+
+class TestOffsetIndex(TempDirTestCase):
+    backend = "csv"
+
+    def setUp(self):
+        super().setUp()
+        self.old_enabled = checkmygrade.OFFSET_INDEX_ENABLED
+        checkmygrade.OFFSET_INDEX_ENABLED = True
+        rows = [s.__dict__ for s in STUDENTS] + [{"student_id": "7", "first_name": "Multi\nLine", "email": "m@yahoo.com"}]
+        write_csv("students.csv", rows, STUDENT_FIELDS)
+        table_cache.invalidate()
+
+    def tearDown(self):
+        checkmygrade.OFFSET_INDEX_ENABLED = self.old_enabled
+        super().tearDown()
+
+    def cold_search(self, email):
+        table_cache.invalidate()
+        misses = table_cache.misses
+        student = Student.search(email)
+        self.assertEqual(table_cache.misses, misses, "search loaded the whole table")
+        return student
+
+    def test_cold_lookup_reads_one_row(self):
+        """Test that a cold search uses the sidecar index instead of parsing the table"""
+        self.assertEqual(self.cold_search("s3@yahoo.com").marks, "83")
+        self.assertEqual(self.cold_search("m@yahoo.com").first_name, "Multi\nLine")
+        self.assertIsNone(self.cold_search("nobody@yahoo.com"))
+        self.assertTrue(os.path.exists("students.csv.idx"))
+
+    def test_index_extends_after_append(self):
+        """Test that appended rows are indexed without a rebuild of the earlier entries"""
+        self.cold_search("s0@yahoo.com")
+        Student("9", "New", "Student", "new@yahoo.com", "DATA300", "B", "85").add_new_student()
+        self.assertEqual(self.cold_search("new@yahoo.com").student_id, "9")
+        index = checkmygrade.OffsetIndex("students.csv.idx")
+        self.assertEqual(index.rows, 7)
+        index.close()
+
+    def test_delta_log_is_applied(self):
+        """Test that logged updates and deletes are folded into point lookups"""
+        self.cold_search("s0@yahoo.com")
+        Student("1", "", "", "", "", "", "").update_student_record(new_marks="55")
+        Student("", "", "", "s2@yahoo.com", "", "", "").delete_new_student()
+        self.assertEqual(self.cold_search("s1@yahoo.com").marks, "55")
+        self.assertIsNone(self.cold_search("s2@yahoo.com"))
+
+    def test_rewrite_rebuilds_index(self):
+        """Test that a full rewrite of the CSV invalidates the old offsets"""
+        self.cold_search("s0@yahoo.com")
+        write_csv("students.csv", [STUDENTS[4].__dict__], STUDENT_FIELDS)
+        self.assertEqual(self.cold_search("s4@yahoo.com").student_id, "4")
+        self.assertIsNone(self.cold_search("s0@yahoo.com"))
+
+class TestParallelParse(TempDirTestCase):
+    backend = "csv"
+
+    def setUp(self):
+        super().setUp()
+        self.old_min_bytes = checkmygrade.PARALLEL_PARSE_MIN_BYTES
+        checkmygrade.PARALLEL_PARSE_MIN_BYTES = 0
+        rows = [{"student_id": str(i), "first_name": f"First\n{i}" if i % 7 == 0 else f"F{i}",
+                 "last_name": 'O"Neil' if i % 5 == 0 else f"L{i}", "email": f"s{i}@yahoo.com",
+                 "course_id": "DATA200", "grade": "A", "marks": str(i % 100)} for i in range(500)]
+        write_csv("students.csv", rows, STUDENT_FIELDS)
+        with open("students.csv", "a") as file:
+            file.write("\n501,Short\n")
+        with open("students.csv") as file:
+            self.text = file.read()
+        with open("students.csv", "w") as file:
+            file.write(" Student_ID , First_Name," + self.text.split(",", 2)[2])
+
+    def tearDown(self):
+        checkmygrade.PARALLEL_PARSE_MIN_BYTES = self.old_min_bytes
+        super().tearDown()
+
+    def test_parallel_matches_serial(self):
+        """Test that chunked parsing across workers returns the same rows, in order, as a serial parse"""
+        rows, fieldnames = checkmygrade._parse_csv("students.csv", workers=1)
+        self.assertEqual(fieldnames, STUDENT_FIELDS)
+        self.assertEqual(rows[7]["first_name"], "First\n7")
+        self.assertEqual(rows[5]["last_name"], 'O"Neil')
+        self.assertEqual(rows[-1], {"student_id": "501", "first_name": "Short", "last_name": None,
+                                    "email": None, "course_id": None, "grade": None, "marks": None})
+        for workers in (2, 3):
+            self.assertEqual(checkmygrade.parse_csv_parallel("students.csv", workers), (rows, fieldnames))
+        self.assertEqual(checkmygrade._parse_csv("students.csv", workers=2), (rows, fieldnames))
+
+    def test_chunks_end_on_record_boundaries(self):
+        """Test that no chunk boundary falls inside a quoted field"""
+        with open("students.csv", "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            data = mm[:]
+            offsets = checkmygrade._split_offsets(mm, 0, 40)
+        self.assertEqual(offsets[-1], len(data))
+        for offset in offsets[1:-1]:
+            self.assertEqual(data[offset - 1:offset], b"\n")
+            self.assertEqual(data[:offset].count(b'"') % 2, 0)
+
+
+def _increment_marks(student_id):
+    """Read-modify-write that loses updates unless concurrent commits are detected"""
+    with transaction():
+        row = table_cache.get("students.csv").index("student_id").get(student_id)
+        checkmygrade.update_row("students.csv", "student_id", student_id, {"marks": str(int(row["marks"]) + 1)})
+
+def _stress_worker(directory, backend, worker, count):
+    os.chdir(directory)
+    use_storage(backend)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(count):
+            student_id = f"{worker}-{i}"
+            Student(student_id, f"W{worker}", f"N{i}", f"{student_id}@yahoo.com", "DATA200", "A", "50").add_new_student()
+            Student(student_id, "", "", "", "", "", "").update_student_record(new_marks="60")
+            retry_on_conflict(_increment_marks, "0", retries=500)
+
+def _append_worker(directory):
+    os.chdir(directory)
+    with contextlib.redirect_stdout(io.StringIO()):
+        Student("9", "New", "Student", "new@yahoo.com", "DATA300", "B", "85").add_new_student()
+        Student("1", "", "", "", "", "", "").update_student_record(new_grade="C")
+        Student("2", "", "", "s2@yahoo.com", "", "", "").delete_new_student()
+
+class ProcessTestCase(TempDirTestCase):
+
+    def run_processes(self, target, *argument_lists):
+        context = multiprocessing.get_context("fork")
+        processes = [context.Process(target=target, args=args) for args in argument_lists]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(120)
+        self.assertEqual([p.exitcode for p in processes], [0] * len(processes))
+
+class TestConcurrentAccess(ProcessTestCase):
+    workers = 4
+    count = 15
+
+    def setUp(self):
+        super().setUp()
+        self.old_compact_bytes = checkmygrade.LOG_COMPACT_BYTES
+        # Force compactions (whole-file rewrites) in the middle of the run
+        checkmygrade.LOG_COMPACT_BYTES = 2000
+        write_csv("students.csv", [s.__dict__ for s in STUDENTS], STUDENT_FIELDS)
+
+    def tearDown(self):
+        checkmygrade.LOG_COMPACT_BYTES = self.old_compact_bytes
+        super().tearDown()
+
+    def test_processes_do_not_lose_updates(self):
+        """Test that N processes adding, updating and incrementing students concurrently lose nothing"""
+        self.run_processes(_stress_worker, *[(self.tmp_dir, self.backend, w, self.count) for w in range(self.workers)])
+        table_cache.invalidate()
+        students = {s["student_id"]: s for s in load_csv("students.csv")}
+        self.assertEqual(len(students), len(STUDENTS) + self.workers * self.count)
+        added = [s for s in students.values() if "-" in s["student_id"]]
+        self.assertTrue(all(s["marks"] == "60" for s in added))
+        self.assertEqual(students["0"]["marks"], str(80 + self.workers * self.count))
+
+
+class TestCsvCatchUp(ProcessTestCase):
+    backend = "csv"
+
+    def setUp(self):
+        super().setUp()
+        write_csv("students.csv", [s.__dict__ for s in STUDENTS], STUDENT_FIELDS)
+
+    def test_stale_transaction_is_rejected(self):
+        """Test that a commit fails if another process wrote the table after this one read it"""
+        with self.assertRaises(ConcurrentUpdateError):
+            with transaction():
+                Student("0", "", "", "", "", "", "").update_student_record(new_grade="F")
+                self.run_processes(_append_worker, (self.tmp_dir,))
+        table_cache.invalidate()
+        self.assertEqual(load_csv("students.csv")[0]["grade"], "A")
+
+    def test_reader_folds_in_appends(self):
+        """Test that rows and log records appended by another process are applied without a reparse"""
+        table = table_cache.get("students.csv")
+        table.index("email")
+        catch_ups = checkmygrade.lock_stats["catch_ups"]
+        self.run_processes(_append_worker, (self.tmp_dir,))
+
+        self.assertIs(table_cache.get("students.csv"), table)
+        self.assertEqual(checkmygrade.lock_stats["catch_ups"], catch_ups + 1)
+        fresh = checkmygrade.storage.read(table.path, table.stamp)
+        self.assertEqual(table.rows, fresh.rows)
+        self.assertEqual(table.base_rows, fresh.base_rows)
+        self.assertIsNone(table.index("email").get("s2@yahoo.com"))
+        self.assertEqual(table.index("email").get("new@yahoo.com")["student_id"], "9")
+
+    def test_rewrite_forces_reparse(self):
+        """Test that a compacted (rewritten) file is parsed again rather than caught up"""
+        table = table_cache.get("students.csv")
+        self.run_processes(_append_worker, (self.tmp_dir,))
+        self.run_processes(compact_table, (os.path.join(self.tmp_dir, "students.csv"),))
+        self.assertFalse(os.path.exists("students.csv.log"))
+
+        reparsed = table_cache.get("students.csv")
+        self.assertIsNot(reparsed, table)
+        self.assertEqual([s["student_id"] for s in reparsed.rows], ["0", "1", "3", "4", "9"])
+        self.assertEqual(reparsed.rows[1]["grade"], "C")
+
+
+class TestSqliteStorage(TempDirTestCase):
+    backend = "sqlite"
+
+    def setUp(self):
+        super().setUp()
+        write_csv("students.csv", [s.__dict__ for s in STUDENTS], STUDENT_FIELDS)
+
+    def test_rows_persist_with_keys_and_indexes(self):
+        """Test that writes reach the database, which has a primary key and indexes"""
+        Student("9", "New", "Student", "new@yahoo.com", "DATA300", "B", "85").add_new_student()
+        Student("1", "", "", "", "", "", "").update_student_record(new_grade="C")
+        Student("", "", "", "s2@yahoo.com", "", "", "").delete_new_student()
+        table_cache.invalidate()
+
+        students = {s["student_id"]: s for s in load_csv("students.csv")}
+        self.assertEqual(sorted(students), ["0", "1", "3", "4", "9"])
+        self.assertEqual(students["1"]["grade"], "C")
+        conn = sqlite3.connect(checkmygrade.SQLITE_DB_NAME)
+        indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        conn.close()
+        self.assertTrue({"students_email", "students_course_id"} <= indexes)
+        self.assertFalse(os.path.exists("students.csv"))
+
+    def test_transaction_spans_tables(self):
+        """Test that a failed transaction rolls back statements on two tables"""
+        with self.assertRaises(RuntimeError):
+            with transaction():
+                Student("1", "", "", "", "", "", "").update_student_record(new_grade="F")
+                Professor("P1", "Dr. Chan", "chan@edu.com", "Senior", "DATA200").add_new_professor()
+                raise RuntimeError("abort")
+        self.assertEqual(load_csv("students.csv")[1]["grade"], "A")
+        self.assertEqual(load_csv("professors.csv"), [])
+
+    def test_replace_joins_transaction(self):
+        """Test that a table rewrite inside a transaction does not commit the statements before it"""
+        write_csv("grades.csv", [{"grade_id": "1", "grade": "A", "marks_range": "90-100"}], ["grade_id", "grade", "marks_range"])
+        with self.assertRaises(RuntimeError):
+            with transaction():
+                Student("1", "", "", "", "", "", "").update_student_record(new_grade="F")
+                write_csv("grades.csv", [], ["grade_id", "grade", "marks_range"])
+                raise RuntimeError("abort")
+        table_cache.invalidate()
+        self.assertEqual(load_csv("students.csv")[1]["grade"], "A")
+        self.assertEqual(len(load_csv("grades.csv")), 1)
+
+    def test_external_change_reloads(self):
+        """Test that a commit from another connection invalidates the cache"""
+        load_csv("students.csv")
+        conn = sqlite3.connect(checkmygrade.SQLITE_DB_NAME)
+        conn.execute("UPDATE students SET grade = 'D' WHERE student_id = '0'")
+        conn.commit()
+        conn.close()
+        self.assertEqual(load_csv("students.csv")[0]["grade"], "D")
+
+    def test_cold_search_uses_sql_index(self):
+        """Test that a search on a cold cache queries one row instead of loading the table"""
+        table_cache.invalidate()
+        misses = table_cache.misses
+        self.assertEqual(Student.search("s3@yahoo.com").student_id, "3")
+        self.assertEqual(table_cache.misses, misses)
+
+    def test_migrate_from_csv(self):
+        """Test migrating CSV files, with their delta logs folded in and duplicates skipped"""
+        use_storage("csv")
+        write_csv("students.csv", [s.__dict__ for s in STUDENTS] + [STUDENTS[0].__dict__], STUDENT_FIELDS)
+        Student("", "", "", "s4@yahoo.com", "", "", "").delete_new_student()
+        report = migrate_to_sqlite(".")
+        use_storage("sqlite")
+
+        self.assertEqual(report["students.csv"], {"rows": 4, "skipped": 1})
+        self.assertEqual([s["student_id"] for s in load_csv("students.csv")], ["0", "1", "2", "3"])
+
+# Run the backend-neutral test cases against SQLite as well
+for _case in (TestBatchMode, TestBulkImport, TestGradeServer, TestJoins, TestQueries, TestNameSearch, TestAuthentication, TestWriteBuffer, TestWriteBehind, TestCourseStatistics, TestCourseRanking, TestConcurrentAccess, TestGradeScale, TestTypedSorting):
+    if _case.backend != "sqlite":
+        globals()[_case.__name__ + "Sqlite"] = type(_case.__name__ + "Sqlite", (_case,), {"backend": "sqlite"})
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file